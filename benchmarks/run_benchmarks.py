@@ -0,0 +1,418 @@
+"""
+Scheduler and storage micro-benchmarks
+
+Run from the repository root:
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --output bench.json
+
+Every benchmark runs against synthetic guilds and reminders (see benchmarks/synthetic.py)
+inside a temporary directory, so the bot's own database is never touched. Results are
+printed as JSON for regression tracking.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from pytz import timezone
+from sqlalchemy import insert
+
+from benchmarks.synthetic import generate_setting, generate_settings
+from src.dispatcher import NotificationDispatcher
+from src.scheduler import create_scheduler
+from src.sqlalchemy_models import STORAGE_PROFILES, AsyncSQLAlchemyDatabase, Reminder, SQLAlchemyDatabase
+from src.utilities import compile_setting, create_embed_with_fields, format_setting, should_send_notification
+
+ALL_BENCHMARKS = [
+    "should_send_notification",
+    "scheduler",
+    "database",
+    "update_settings_cache",
+    "create_embed_with_fields",
+    "time_loop_minute",
+    "storage_profiles",
+    "write_burst",
+]
+
+# Busiest minute in the synthetic data: many reminders are on the hour
+BUSY_MINUTE = datetime(2025, 6, 2, 9, 0, 5)
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """
+    Summarize a list of latencies in seconds
+
+    Args:
+        durations: Measured durations
+
+    Returns:
+        Dict[str, float]: mean, p50, p95 and max latency
+    """
+    ordered = sorted(durations)
+    return {
+        "mean_seconds": statistics.fmean(ordered),
+        "p50_seconds": ordered[len(ordered) // 2],
+        "p95_seconds": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max_seconds": ordered[-1],
+    }
+
+def timed(func: Callable[[], Any]) -> float:
+    """
+    Run a function once and return the elapsed seconds
+
+    Args:
+        func: Function to run
+
+    Returns:
+        float: Elapsed seconds
+    """
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+def flatten(settings: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Return every setting of every guild as one list"""
+    return [setting for guild_settings in settings.values() for setting in guild_settings]
+
+def bench_should_send_notification(settings: Dict[str, List[Dict[str, Any]]], size: int) -> List[Dict[str, Any]]:
+    """Throughput of the string-based check and of precompiled ScheduleRule.matches"""
+    flat = flatten(settings)
+    now = timezone('Asia/Tokyo').localize(BUSY_MINUTE)
+
+    elapsed = timed(lambda: [should_send_notification(setting, now) for setting in flat])
+    results = [{"name": "should_send_notification", "size": size, "seconds": elapsed,
+                "ops_per_second": len(flat) / elapsed}]
+
+    compile_elapsed = timed(lambda: [compile_setting(setting) for setting in flat])
+    rules = [rule for rule in (compile_setting(setting) for setting in flat) if rule is not None]
+    match_elapsed = timed(lambda: [rule.matches(now) for rule in rules])
+    results.append({"name": "compile_setting", "size": size, "seconds": compile_elapsed,
+                    "ops_per_second": len(flat) / compile_elapsed})
+    results.append({"name": "ScheduleRule.matches", "size": size, "seconds": match_elapsed,
+                    "ops_per_second": len(rules) / match_elapsed})
+    return results
+
+def bench_scheduler(settings: Dict[str, List[Dict[str, Any]]], size: int, backends: List[str]) -> List[Dict[str, Any]]:
+    """Rebuild time and due-minute evaluation time for each scheduler backend"""
+    tz = timezone('Asia/Tokyo')
+    now = tz.localize(BUSY_MINUTE)
+    results = []
+    for backend in backends:
+        scheduler = create_scheduler(backend)
+        rebuild_elapsed = timed(lambda: scheduler.rebuild(settings, now.replace(second=0)))
+
+        # Take everything due in the busy minute, as a tick after a short stall would
+        due = []
+        pop_elapsed = timed(lambda: due.extend(scheduler.pop_due(now.replace(second=59))))
+
+        # A single second of a quiet minute right after the busy one shows the per-tick cost when almost nothing is due
+        quiet = now + timedelta(minutes=1, seconds=7)
+        quiet_elapsed = timed(lambda: scheduler.pop_due(quiet, quiet))
+
+        results.append({"name": "scheduler.rebuild", "backend": backend, "size": size, "seconds": rebuild_elapsed})
+        results.append({"name": "scheduler.pop_due", "backend": backend, "size": size, "seconds": pop_elapsed,
+                        "due": len(due)})
+        results.append({"name": "scheduler.pop_due_quiet", "backend": backend, "size": size, "seconds": quiet_elapsed})
+    return results
+
+def seed_database(db: SQLAlchemyDatabase, settings: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Bulk-insert the synthetic reminders into the reminders table"""
+    db.create_table()
+    rows = [
+        {**{key: value for key, value in setting.items() if key != "id"}, "guild_id": guild_id}
+        for guild_id, guild_settings in settings.items()
+        for setting in guild_settings
+    ]
+    with db.engine.begin() as conn:
+        for start in range(0, len(rows), 50000):
+            conn.execute(insert(Reminder), rows[start:start + 50000])
+
+def sample_guilds(settings: Dict[str, List[Dict[str, Any]]], count: int = 50) -> List[str]:
+    """Pick guilds of every size, from the largest to the smallest"""
+    guild_ids = sorted(settings, key=lambda guild_id: len(settings[guild_id]), reverse=True)
+    step = max(1, len(guild_ids) // count)
+    return guild_ids[::step][:count]
+
+def bench_database(settings: Dict[str, List[Dict[str, Any]]], size: int, app_name: str,
+                   samples: int) -> List[Dict[str, Any]]:
+    """Latency of get_all and set for the sync and async database handlers"""
+    rng = random.Random(size)
+    guild_ids = sample_guilds(settings)
+    results = []
+
+    new_settings = [
+        {key: value for key, value in generate_setting(rng, 0).items() if key != "id"}
+        for _ in range(samples)
+    ]
+
+    db = SQLAlchemyDatabase(app_name)
+    get_all = [timed(lambda: db.get_all(guild_id)) for guild_id in guild_ids]
+    set_latency = [timed(lambda: db.set(guild_id=guild_ids[0], **values)) for values in new_settings]
+    results.append({"name": "SQLAlchemyDatabase.get_all", "size": size, "calls": len(get_all), **summarize(get_all)})
+    results.append({"name": "SQLAlchemyDatabase.set", "size": size, "calls": len(set_latency), **summarize(set_latency)})
+    db.engine.dispose()
+
+    async def run_async() -> None:
+        async_db = AsyncSQLAlchemyDatabase(app_name)
+        get_all = []
+        for guild_id in guild_ids:
+            started = time.perf_counter()
+            await async_db.get_all(guild_id)
+            get_all.append(time.perf_counter() - started)
+        set_latency = []
+        for values in new_settings:
+            started = time.perf_counter()
+            await async_db.set(guild_id=guild_ids[0], **values)
+            set_latency.append(time.perf_counter() - started)
+        await async_db.close()
+        results.append({"name": "AsyncSQLAlchemyDatabase.get_all", "size": size, "calls": len(get_all), **summarize(get_all)})
+        results.append({"name": "AsyncSQLAlchemyDatabase.set", "size": size, "calls": len(set_latency), **summarize(set_latency)})
+
+    asyncio.run(run_async())
+    return results
+
+def bench_update_settings_cache(size: int, app_name: str, guild_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Full cache reload as done by update_settings_cache in src/discord_bot.py:
+    one get_all_by_guild query followed by a scheduler rebuild
+    """
+    tz = timezone('Asia/Tokyo')
+
+    async def reload() -> Dict[str, float]:
+        db = AsyncSQLAlchemyDatabase(app_name)
+        scheduler = create_scheduler("heap")
+        started = time.perf_counter()
+        cache = await db.get_all_by_guild(guild_ids)
+        loaded = time.perf_counter()
+        scheduler.rebuild(cache, datetime.now(tz).replace(second=0, microsecond=0))
+        finished = time.perf_counter()
+        await db.close()
+        return {"seconds": finished - started, "query_seconds": loaded - started,
+                "rebuild_seconds": finished - loaded}
+
+    return [{"name": "update_settings_cache", "size": size, **asyncio.run(reload())}]
+
+def bench_create_embed_with_fields(settings: Dict[str, List[Dict[str, Any]]], size: int) -> List[Dict[str, Any]]:
+    """Rendering time of the /get-settings listing for the largest guild"""
+    largest = max(settings.values(), key=len)
+    elapsed = timed(lambda: create_embed_with_fields(
+        color=0x0000ff, title="設定中の通知", fields=[format_setting(setting) for setting in largest]))
+    return [{"name": "create_embed_with_fields", "size": size, "guild_settings": len(largest), "seconds": elapsed}]
+
+def bench_time_loop_minute(settings: Dict[str, List[Dict[str, Any]]], size: int, app_name: str,
+                           backends: List[str]) -> List[Dict[str, Any]]:
+    """
+    One simulated time_loop minute, following the same steps as the real tick in src/discord_bot.py:
+    take the due reminders, enqueue them in the outbox (retiring one-time reminders), dispatch the
+    new entries to a no-op sender and record them as delivered
+    """
+    tz = timezone('Asia/Tokyo')
+    now = tz.localize(BUSY_MINUTE)
+    results = []
+
+    async def send(guild_id: str, setting: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        await asyncio.sleep(0)
+
+    for backend in backends:
+        scheduler = create_scheduler(backend)
+        scheduler.rebuild(settings, now.replace(second=0))
+
+        async def minute() -> Dict[str, Any]:
+            # A separate database per backend, since the outbox ignores occurrences that were already enqueued
+            db = AsyncSQLAlchemyDatabase(f"{app_name}-loop-{backend}")
+            await db.create_table()
+            started = time.perf_counter()
+            due = scheduler.pop_due(now.replace(second=59))
+            popped = time.perf_counter()
+            retired = [(guild_id, setting["id"]) for guild_id, setting, _ in due if setting["option"] == "oneday"]
+            notifications = [(guild_id, setting, fire_time.timestamp()) for guild_id, setting, fire_time in due]
+            entries = await db.enqueue_notifications("scheduler", notifications, retired)
+            enqueued = time.perf_counter()
+            await NotificationDispatcher(concurrency=10).dispatch(
+                [(entry["guild_id"], entry["setting"], entry) for entry in entries], send)
+            await db.complete_outbox(delivered=[entry["id"] for entry in entries])
+            finished = time.perf_counter()
+            await db.close()
+            return {"seconds": finished - started, "pop_seconds": popped - started,
+                    "enqueue_seconds": enqueued - popped, "deliver_seconds": finished - enqueued, "due": len(due)}
+
+        results.append({"name": "time_loop_minute", "backend": backend, "size": size, **asyncio.run(minute())})
+    return results
+
+def bench_storage_profiles(settings: Dict[str, List[Dict[str, Any]]], size: int, profiles: List[str],
+                           samples: int) -> List[Dict[str, Any]]:
+    """
+    Write and read throughput of each SQLite storage profile
+
+    Measures single-row commits, get_all reads, and get_all reads while another
+    thread keeps committing (where the rollback journal blocks readers and WAL does not).
+    """
+    rng = random.Random(size)
+    guild_ids = sample_guilds(settings)
+    new_settings = [
+        {key: value for key, value in generate_setting(rng, 0).items() if key != "id"}
+        for _ in range(samples)
+    ]
+    results = []
+
+    for profile in profiles:
+        app_name = f"Profile{size}-{profile}"
+        db = SQLAlchemyDatabase(app_name, storage_profile=profile)
+        seed_database(db, settings)
+
+        write_elapsed = timed(lambda: [db.set(guild_id=guild_ids[0], **values) for values in new_settings])
+        read_elapsed = timed(lambda: [db.get_all(guild_id) for guild_id in guild_ids])
+
+        # Keep a second connection committing while this thread reads
+        stop = threading.Event()
+        writer_db = SQLAlchemyDatabase(app_name, storage_profile=profile)
+
+        def write_continuously() -> None:
+            index = 0
+            while not stop.is_set():
+                writer_db.set(guild_id=guild_ids[-1], **new_settings[index % len(new_settings)])
+                index += 1
+
+        writer = threading.Thread(target=write_continuously)
+        writer.start()
+        try:
+            contended_elapsed = timed(lambda: [db.get_all(guild_id) for guild_id in guild_ids])
+        finally:
+            stop.set()
+            writer.join()
+
+        results.append({"name": "storage_profile.write", "profile": profile, "size": size, "seconds": write_elapsed,
+                        "ops_per_second": len(new_settings) / write_elapsed})
+        results.append({"name": "storage_profile.read", "profile": profile, "size": size, "seconds": read_elapsed,
+                        "ops_per_second": len(guild_ids) / read_elapsed})
+        results.append({"name": "storage_profile.read_during_write", "profile": profile, "size": size,
+                        "seconds": contended_elapsed, "ops_per_second": len(guild_ids) / contended_elapsed})
+        db.engine.dispose()
+        writer_db.engine.dispose()
+    return results
+
+def bench_write_burst(settings: Dict[str, List[Dict[str, Any]]], size: int, app_name: str,
+                      samples: int) -> List[Dict[str, Any]]:
+    """
+    Throughput of concurrent async set calls, as when many users run creation commands at once
+
+    Compares awaiting each call in turn (one commit per call) with issuing all calls
+    concurrently, where the write buffer groups them into a few transactions.
+    """
+    rng = random.Random(size)
+    guild_id = sample_guilds(settings)[0]
+    new_settings = [
+        {key: value for key, value in generate_setting(rng, 0).items() if key != "id"}
+        for _ in range(samples)
+    ]
+
+    async def run_async() -> List[Dict[str, Any]]:
+        db = AsyncSQLAlchemyDatabase(app_name)
+        await db.create_table()
+        started = time.perf_counter()
+        for values in new_settings:
+            await db.set(guild_id=guild_id, **values)
+        sequential = time.perf_counter() - started
+        started = time.perf_counter()
+        await asyncio.gather(*(db.set(guild_id=guild_id, **values) for values in new_settings))
+        concurrent = time.perf_counter() - started
+        await db.close()
+        return [
+            {"name": "write_burst.sequential", "size": size, "calls": samples, "seconds": sequential,
+             "ops_per_second": samples / sequential},
+            {"name": "write_burst.concurrent", "size": size, "calls": samples, "seconds": concurrent,
+             "ops_per_second": samples / concurrent},
+        ]
+
+    return asyncio.run(run_async())
+
+def run(sizes: List[int], benchmarks: List[str], backends: List[str], samples: int,
+        profiles: List[str]) -> Dict[str, Any]:
+    """
+    Run the selected benchmarks for every size
+
+    Args:
+        sizes: Numbers of reminders to generate
+        benchmarks: Names from ALL_BENCHMARKS
+        backends: Scheduler backends to compare
+        samples: Number of set calls per database benchmark
+        profiles: SQLite storage profiles to compare
+
+    Returns:
+        Dict[str, Any]: Environment information and the list of results
+    """
+    results = []
+    repository = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            for size in sizes:
+                print(f"Running benchmarks with {size} reminders...", file=sys.stderr)
+                settings = generate_settings(size, guild_count=max(1, size // 100), seed=size)
+                app_name = f"Bench{size}"
+
+                if "should_send_notification" in benchmarks:
+                    results.extend(bench_should_send_notification(settings, size))
+                if "scheduler" in benchmarks:
+                    results.extend(bench_scheduler(settings, size, backends))
+                if {"database", "update_settings_cache", "write_burst"} & set(benchmarks):
+                    seed_database(SQLAlchemyDatabase(app_name), settings)
+                if "database" in benchmarks:
+                    results.extend(bench_database(settings, size, app_name, samples))
+                if "update_settings_cache" in benchmarks:
+                    results.extend(bench_update_settings_cache(size, app_name, list(settings)))
+                if "create_embed_with_fields" in benchmarks:
+                    results.extend(bench_create_embed_with_fields(settings, size))
+                if "time_loop_minute" in benchmarks:
+                    results.extend(bench_time_loop_minute(settings, size, app_name, backends))
+                if "storage_profiles" in benchmarks:
+                    results.extend(bench_storage_profiles(settings, size, profiles, samples))
+                if "write_burst" in benchmarks:
+                    results.extend(bench_write_burst(settings, size, app_name, samples))
+        finally:
+            os.chdir(repository)
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run scheduler and storage micro-benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="Comma-separated numbers of reminders (default: 1000,10000,100000,1000000)")
+    parser.add_argument("--benchmarks", default=",".join(ALL_BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run (default: all of {', '.join(ALL_BENCHMARKS)})")
+    parser.add_argument("--backends", default="heap,numpy", help="Comma-separated scheduler backends (default: heap,numpy)")
+    parser.add_argument("--profiles", default=",".join(STORAGE_PROFILES),
+                        help=f"Comma-separated SQLite storage profiles (default: {','.join(STORAGE_PROFILES)})")
+    parser.add_argument("--samples", type=int, default=100, help="Number of set calls per database benchmark")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = run(
+        sizes=[int(size) for size in args.sizes.split(",")],
+        benchmarks=args.benchmarks.split(","),
+        backends=args.backends.split(","),
+        samples=args.samples,
+        profiles=args.profiles.split(","),
+    )
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
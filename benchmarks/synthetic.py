@@ -0,0 +1,84 @@
+import random
+from typing import Any, Dict, List
+
+from src.utilities import WEEKDAYS
+
+def generate_guild_ids(count: int, seed: int = 0) -> List[str]:
+    """
+    Generate snowflake-like guild IDs
+
+    Args:
+        count: Number of guilds
+        seed: Random seed
+
+    Returns:
+        List[str]: Guild IDs
+    """
+    rng = random.Random(seed)
+    return [str(rng.randrange(10 ** 17, 10 ** 19)) for _ in range(count)]
+
+def generate_setting(rng: random.Random, setting_id: int) -> Dict[str, Any]:
+    """
+    Generate one notification setting with a random schedule
+
+    The option mix is roughly 40% daily, 25% weekly, 20% monthly and 15% one-time,
+    and times cluster on the hour like real reminders do.
+
+    Args:
+        rng: Random generator
+        setting_id: ID of the setting
+
+    Returns:
+        Dict[str, Any]: Notification setting in the same format as Database.get
+    """
+    option = rng.choices(["day", "week", "month", "oneday"], weights=[40, 25, 20, 15])[0]
+    minute = rng.choice([0, 0, 0, 15, 30, 45, rng.randrange(60)])
+    call_time = f"{rng.randrange(24):02d}:{minute:02d}:{rng.choice([0, 0, rng.randrange(60)]):02d}"
+    day = "None"
+    week = "None"
+
+    if option == "week":
+        week = rng.choice(WEEKDAYS)
+    elif option == "month":
+        if rng.random() < 0.5:
+            day = str(rng.randint(1, 5))
+            week = rng.choice(WEEKDAYS)
+        else:
+            day = str(rng.randint(1, 31))
+    elif option == "oneday":
+        day = f"{rng.randint(1, 12)}/{rng.randint(1, 28)}"
+
+    return {
+        "id": setting_id,
+        "channel_id": str(rng.randrange(10 ** 17, 10 ** 19)),
+        "option": option,
+        "day": day,
+        "week": week,
+        "call_time": call_time,
+        "mention_ids": rng.choice(["None", str(rng.randrange(10 ** 17, 10 ** 19))]),
+        "title": "おしらせ",
+        "main_text": "時間です",
+        "img": "None"
+    }
+
+def generate_settings(count: int, guild_count: int, seed: int = 0) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Generate reminders spread over guilds in the same shape as the bot's settings cache
+
+    Guild sizes are skewed so that a few large guilds hold many reminders.
+
+    Args:
+        count: Total number of reminders
+        guild_count: Number of guilds
+        seed: Random seed
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Guild ID -> notification settings
+    """
+    rng = random.Random(seed)
+    guild_ids = generate_guild_ids(guild_count, seed)
+    weights = [1 / (rank + 1) for rank in range(guild_count)]
+    settings: Dict[str, List[Dict[str, Any]]] = {}
+    for setting_id, guild_id in enumerate(rng.choices(guild_ids, weights=weights, k=count), start=1):
+        settings.setdefault(guild_id, []).append(generate_setting(rng, setting_id))
+    return settings
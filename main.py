@@ -1,9 +1,16 @@
 # Discord Reminder Bot
 # This is the main entry point for the application
+import os
 
-# Import and start the web server
-from src.web_server import start_web_server
-start_web_server()
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The web server runs on the bot's event loop by default.
+# Set WEB_SERVER_MODE=flask to run the Flask server in a separate thread instead.
+if os.getenv('WEB_SERVER_MODE', 'async') == 'flask':
+    from src.web_server import start_web_server
+    start_web_server()
 
 # Import the Discord bot from the src directory
 import src.discord_bot
@@ -0,0 +1,63 @@
+import logging
+import os
+from typing import Callable, Optional, Tuple
+
+from aiohttp import web
+
+from src.metrics import REGISTRY
+
+logger = logging.getLogger('discord-bot')
+
+# ヘルスチェック関数: (正常かどうか, レスポンス本文) を返す
+HealthCheck = Callable[[], Tuple[bool, str]]
+
+class AsyncWebServer:
+    """
+    ボットと同じイベントループ上で動作するHTTPサーバー
+
+    Flaskの開発サーバーを別スレッドで動かす代わりに aiohttp でリクエストを処理するため、
+    ハンドラからロックなしでループやキャッシュの状態を参照できます。
+    """
+    def __init__(self, health_check: HealthCheck, port: Optional[int] = None, host: str = '0.0.0.0'):
+        """
+        Args:
+            health_check (HealthCheck): /health で呼び出すヘルスチェック関数
+            port (Optional[int]): 待ち受けるポート（省略時は環境変数PORT、既定は8080）
+            host (str): 待ち受けるアドレス
+        """
+        self.health_check = health_check
+        self.port = port if port is not None else int(os.environ.get('PORT', 8080))
+        self.host = host
+        self.runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/health', self.health)
+        self.app.router.add_get('/metrics', self.metrics)
+
+    async def home(self, request: web.Request) -> web.Response:
+        return web.Response(text="Discord Reminder Bot is running!")
+
+    async def health(self, request: web.Request) -> web.Response:
+        healthy, body = self.health_check()
+        return web.Response(text=body, status=200 if healthy else 503)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        response = web.Response(text=REGISTRY.render())
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return response
+
+    async def start(self) -> None:
+        """現在のイベントループ上でサーバーを起動します"""
+        if self.runner is not None:
+            return
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Webサーバーをポート {self.port} で起動しました")
+
+    async def stop(self) -> None:
+        """サーバーを停止します"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
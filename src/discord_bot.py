@@ -1,8 +1,14 @@
+import asyncio
 import os
 import sys
 import secrets
 import hashlib
+import socket
+import io
+import tempfile
+import time
 from datetime import datetime, timedelta
+from typing import List, Optional
 import logging
 
 import discord
@@ -12,37 +18,113 @@ from discord.ext import tasks
 from dotenv import load_dotenv
 from pytz import timezone
 
-from src.sqlalchemy_models import Database
+from src.async_web_server import AsyncWebServer
+from src.dispatcher import NotificationDispatcher, outbox_retry_delay
+from src.leader import LeaderElector
+from src.log_config import setup_logging, stop_logging
+from src.metrics import (
+    CACHE_CHANGES_APPLIED, CACHE_RELOAD_SECONDS, CACHE_SETTINGS, DELIVERY_LATENESS_SECONDS, DISPATCH_SECONDS, DUE_NOTIFICATIONS,
+    LATE_NOTIFICATIONS, MISSED_SECONDS, NOTIFICATIONS_SENT, OUTBOX_FAILED, OUTBOX_RETRIES, SEND_FAILURES, SEND_SECONDS,
+    TIME_LOOP_TICK_SECONDS
+)
+from src.payload_cache import PayloadCache
+from src.profiling import Profiler, parse_profile_targets
+from src.schedule_snapshot import load_snapshot, save_snapshot
+from src.scheduler import create_scheduler
+from src.sqlalchemy_models import AsyncDatabase
 from src.utilities import (
-    WEEK_CHOICES, create_embed, create_embed_with_fields,
-    format_time, format_setting, should_send_notification
+    WEEK_CHOICES, SettingsWriter, create_embed, create_embed_with_fields,
+    format_time, format_setting, load_settings_file, parse_shard_ids, shard_id_for_guild
 )
 
+# 環境変数の読み込み
+load_dotenv()
+
 # ロギングの設定
-# logsディレクトリが存在することを確認
-os.makedirs("logs", exist_ok=True)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('logs\\discord_bot.log', encoding='utf-8')
-    ]
+# 書き込みはバックグラウンドスレッドで行い、イベントループはレコードをキューに入れるだけにする
+log_listener = setup_logging(
+    log_dir=os.getenv('LOG_DIR', 'logs'),
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    log_format=os.getenv('LOG_FORMAT', 'text').lower(),
+    rotation=os.getenv('LOG_ROTATION', 'size').lower(),
+    max_bytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    backup_count=int(os.getenv('LOG_BACKUP_COUNT', '5')),
+    rate_limit_interval=float(os.getenv('LOG_RATE_LIMIT_SECONDS', '60')),
 )
 logger = logging.getLogger('discord-bot')
 
-# 環境変数の読み込み
-load_dotenv()
-
 # 環境変数の確認
 TOKEN = os.getenv('TOKEN')
 URL_SALT = os.getenv('URL_SALT', 'discord-at-code-reminder-salt-12345')
+# 設定キャッシュはデータベースの変更イベントで即時に更新されるため、全件再読み込みは整合性チェックとして低頻度で行う
+CACHE_RELOAD_INTERVAL = int(os.getenv('CACHE_RELOAD_INTERVAL', '3600'))
+# 他のプロセスによる変更を変更履歴から差分で取り込む間隔（秒）
+CHANGE_SYNC_INTERVAL = float(os.getenv('CHANGE_SYNC_INTERVAL', '5'))
+# 変更履歴を保持する期間（秒）。これより長く同期していないキャッシュは全件再読み込みになる
+CHANGE_LOG_RETENTION = float(os.getenv('CHANGE_LOG_RETENTION', '86400'))
+# /get-settings の1ページに表示する通知設定の件数と、ページを切り替えられる時間（秒）
+SETTINGS_PAGE_SIZE = int(os.getenv('SETTINGS_PAGE_SIZE', '10'))
+SETTINGS_PAGE_TIMEOUT = float(os.getenv('SETTINGS_PAGE_TIMEOUT', '300'))
+# /import-settings で一度に取り込める通知の件数とファイルサイズ（バイト）の上限
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '10000'))
+IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', str(5 * 1024 * 1024)))
+# /export-settings でデータベースから1回に読み込む件数
+EXPORT_PAGE_SIZE = 1000
+# 同時に送信する通知の最大数
+NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', '10'))
+# スケジューラのバックエンド (heap または numpy)
+SCHEDULER_BACKEND = os.getenv('SCHEDULER_BACKEND', 'heap')
+# Webサーバーの動作方式 (async: ボットのイベントループ上で動作, flask: main.py が別スレッドで起動)
+WEB_SERVER_MODE = os.getenv('WEB_SERVER_MODE', 'async')
+# 通知ループがこの秒数以上実行されていない場合、/health は異常を返す
+HEALTH_MAX_TICK_AGE = int(os.getenv('HEALTH_MAX_TICK_AGE', '30'))
+# 通知ループが停止していた場合に、さかのぼって送信する最大の分数
+CATCHUP_MAX_MINUTES = int(os.getenv('CATCHUP_MAX_MINUTES', '10'))
+# 通知ループの実行間隔（秒）。通知は設定された秒から最大でこの間隔だけ遅れて送信される
+TICK_INTERVAL = float(os.getenv('TICK_INTERVAL', '0.25'))
+# 送信時刻からこの秒数より遅れて取り出された通知を遅延として記録する
+LATE_THRESHOLD_SECONDS = 1
+# 複数のインスタンスを冗長構成で動かす場合に、リースを取得した1つのインスタンスだけが通知を送信する
+LEADER_ELECTION = os.getenv('LEADER_ELECTION', 'false').lower() in ('1', 'true', 'yes')
+# リースの有効期間と更新間隔（秒）。リーダーが停止すると、待機中のインスタンスが最大で LEASE_TTL + LEASE_RENEW_INTERVAL 秒後に引き継ぐ
+LEASE_TTL = float(os.getenv('LEASE_TTL', '10'))
+LEASE_RENEW_INTERVAL = float(os.getenv('LEASE_RENEW_INTERVAL', '3'))
+# 待機中のインスタンスがコマンドに再試行を促す応答を送るまでの待ち時間（秒）。Discordの応答期限の3秒より短くする
+STANDBY_REPLY_DELAY = 2.0
+# 送信に失敗した通知をアウトボックスから再送する最大の試行回数と、再送までの待ち時間（秒）の初期値と上限
+# 待ち時間は失敗するたびに2倍になり、Discordのレート制限（429）の場合は Retry-After 以上待つ
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', '2'))
+OUTBOX_RETRY_MAX = float(os.getenv('OUTBOX_RETRY_MAX', '300'))
+# アウトボックスの送信待ちの通知を確認する間隔（秒）と、1回に取り出す最大件数
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '1'))
+OUTBOX_BATCH_SIZE = 500
+# 送信結果をアウトボックスに記録できなかった場合にやり直す回数と、やり直すまでの待ち時間（秒）
+OUTBOX_RECORD_ATTEMPTS = 3
+OUTBOX_RECORD_RETRY_DELAY = 1.0
+# 送信済み・送信失敗の通知をアウトボックスに残す期間（秒）
+OUTBOX_RETENTION = float(os.getenv('OUTBOX_RETENTION', '86400'))
+# 計測結果（cProfile、スタックのサンプリング、tracemalloc）の出力先と、スタックを記録する間隔（秒）
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.001'))
+# 起動時に計測を開始する対象と回数（例: time_loop:100,get_settings:5）。通常は空にして /profile コマンドで開始する
+PROFILE_TARGETS = os.getenv('PROFILE_TARGETS', '')
+# リースの保持者として記録するインスタンスID
+INSTANCE_ID = os.getenv('INSTANCE_ID') or f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(4)}"
 
 if not TOKEN:
     logger.critical("Discord TOKENが設定されていません。.envファイルにTOKEN=your_token_hereを追加してください。")
     sys.exit(1)
 
+# シャーディングの設定。SHARD_COUNT を指定すると AutoShardedClient で起動し、
+# SHARD_IDS（例: 0-3,8）を指定するとそのシャードのギルドだけを担当する
+try:
+    SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+    SHARD_IDS = parse_shard_ids(os.getenv('SHARD_IDS', ''), SHARD_COUNT) if SHARD_COUNT > 0 else None
+except ValueError as e:
+    logger.critical(f"シャーディングの設定が正しくありません: {e}")
+    sys.exit(1)
+
 # Function to generate consistent server URL token
 def generate_server_token(server_id: str) -> str:
     """
@@ -62,16 +144,68 @@ def generate_server_token(server_id: str) -> str:
     return hash_obj.hexdigest()[:16]
 
 # グローバル変数の設定
-db = Database("Discord")
-settings_cache = {}
+db = AsyncDatabase("Discord")
+settings_cache = {}  # ギルドID -> {設定ID: 設定}
+scheduler = create_scheduler(SCHEDULER_BACKEND)
+dispatcher = NotificationDispatcher(concurrency=NOTIFY_CONCURRENCY)
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_INTERVAL)
+owner_ids = None  # /profile を実行できるユーザーのID（アプリケーションの所有者）
+cache_loaded = False
+pending_changes = None  # キャッシュ再読み込み中に受け取った変更イベント
+cache_version = 0  # キャッシュに取り込み済みの変更履歴の version
+last_change_sync = time.monotonic()
 last_cache_update = datetime.now(timezone('Asia/Tokyo'))
-last_checked_minute = -1
+last_checked_second = None  # 最後に通知をチェックした時刻（秒単位）
+last_tick = None  # 通知ループが最後に実行された時刻 (time.monotonic)
+completed_second = None  # 通知の送信まで完了した最後の秒
+outbox_in_flight = set()  # 送信中のアウトボックスの通知のID
+outbox_lock = asyncio.Lock()  # アウトボックスへの登録・取り出しと送信中の記録をまとめて行うためのロック
+
+# 担当するシャードの組み合わせごとのリース名（アウトボックスの通知もこの単位で送信する）
+lease_name = "scheduler" if SHARD_IDS is None else f"scheduler:{SHARD_COUNT}:{','.join(map(str, SHARD_IDS))}"
+
+# 設定キャッシュのスナップショットの保存先（空にすると無効）と保存する間隔（秒）
+# 起動時にスナップショットから復元し、READYを待たずに通知の送信を始める
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', "db/schedule-snapshot" + (
+    "" if SHARD_IDS is None else f"-{SHARD_COUNT}-{'-'.join(map(str, SHARD_IDS))}") + ".json.gz")
+SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', '300'))
+
+# リーダー選出（同じシャードを担当するインスタンス同士でリースを取り合う）
+elector = None
+if LEADER_ELECTION:
+    try:
+        elector = LeaderElector(db, lease_name, INSTANCE_ID, ttl=LEASE_TTL, renew_interval=LEASE_RENEW_INTERVAL)
+    except ValueError as e:
+        logger.critical(f"リーダー選出の設定が正しくありません: {e}")
+        sys.exit(1)
+prepared_token = None  # 引き継ぎの準備（キャッシュの再読み込み）が完了したリースのトークン
 
 # Discordクライアントの初期化
 try:
     discord_intents = discord.Intents.all()
-    client = discord.Client(intents=discord_intents, activity=discord.Game("稼働中"))
+    if SHARD_COUNT > 0:
+        client = discord.AutoShardedClient(intents=discord_intents, activity=discord.Game("稼働中"),
+                                           shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+        logger.info(f"シャード {SHARD_IDS if SHARD_IDS is not None else 'すべて'} / {SHARD_COUNT} を担当します。")
+    else:
+        client = discord.Client(intents=discord_intents, activity=discord.Game("稼働中"))
     tree = app_commands.CommandTree(client)
+
+    async def leader_interaction_check(interaction: discord.Interaction) -> bool:
+        if is_active_leader():
+            return True
+        # 冗長構成では同じコマンドをリーダーも受け取るため、待機中のインスタンスは設定を変更しない。
+        # リーダーの停止中で誰も応答しない場合に備え、少し待ってから再試行を促す（リーダーが応答済みなら送信に失敗する）
+        if interaction.type == discord.InteractionType.application_command:
+            await asyncio.sleep(STANDBY_REPLY_DELAY)
+            try:
+                await interaction.response.send_message(
+                    "通知を担当するインスタンスを切り替えています。しばらくしてから再度お試しください。", ephemeral=True)
+            except discord.HTTPException:
+                pass
+        return False
+
+    tree.interaction_check = leader_interaction_check
     week = WEEK_CHOICES
     logger.info("Discordクライアントの初期化に成功しました。")
 except Exception as e:
@@ -86,6 +220,7 @@ except Exception as e:
 @app_commands.describe(title="タイトル")
 @app_commands.describe(message="設定された時間に発する文章")
 @app_commands.describe(ico="左上にアイコンとして設定されます")
+@profiler.profile("onetime")
 async def onetime(ctx: discord.Interaction, time: str, day: str = None, mention: discord.Role = None, title: str = None, message: str = None, ico: str = None):
     """'onetime'コマンド (ハイフンなし) - 'one-time'コマンドのエイリアス"""
     try:
@@ -100,7 +235,7 @@ async def onetime(ctx: discord.Interaction, time: str, day: str = None, mention:
         elif not (1 <= int(day.split("/")[0]) <= 12 and 1 <= int(day.split("/")[1]) <= 31):
             raise ValueError
 
-        db.set(
+        await db.set(
             guild_id=str(ctx.guild.id),
             channel_id=str(ctx.channel.id),
             option="oneday",
@@ -123,7 +258,7 @@ async def onetime(ctx: discord.Interaction, time: str, day: str = None, mention:
 @tree.command(name='setup', description="初期設定をします")
 async def setup(ctx):
     try:
-        db.create_table(guild_id=str(ctx.guild.id))
+        await db.create_table(guild_id=str(ctx.guild.id))
         await ctx.response.send_message(embed=create_embed(color=0x00ff00, title="設定完了", message="設定が完了しました。\n\n通知を設定するには各種コマンド（`/day-time`, `/week-time`, `/month-time`, `/one-time`）を使用してください。"))
     except Exception as e:
         logger.error(f"Setup error: {e}")
@@ -136,6 +271,7 @@ async def setup(ctx):
 @app_commands.describe(title="タイトル")
 @app_commands.describe(message="設定された時間に発する文章")
 @app_commands.describe(ico="左上にアイコンとして設定されます")
+@profiler.profile("one_time")
 async def one_time(ctx: discord.Interaction, time: str, day: str = None, mention: discord.Role = None, title: str = None, message: str = None, ico: str = None):
     try:
         data_time = datetime.strptime(time, '%H:%M:%S').time()
@@ -149,7 +285,7 @@ async def one_time(ctx: discord.Interaction, time: str, day: str = None, mention
         elif not (1 <= int(day.split("/")[0]) <= 12 and 1 <= int(day.split("/")[1]) <= 31):
             raise ValueError
 
-        db.set(
+        await db.set(
             guild_id=str(ctx.guild.id),
             channel_id=str(ctx.channel.id),
             option="oneday",
@@ -178,6 +314,7 @@ async def one_time(ctx: discord.Interaction, time: str, day: str = None, mention
 @app_commands.describe(title="タイトル")
 @app_commands.describe(message="設定された時間に発する文章")
 @app_commands.describe(ico="左上にアイコンとして設定されます")
+@profiler.profile("month_time")
 async def month_time(ctx: discord.Interaction, day: int, time: str, week: Choice[str] = None, mention: discord.Role = None, title: str = None, message: str = None, ico: str = None):
     try:
         data_time = datetime.strptime(time, '%H:%M:%S').time()
@@ -193,7 +330,7 @@ async def month_time(ctx: discord.Interaction, day: int, time: str, week: Choice
             say_day = f"{day}日 {data_time}"
             week_value = "None"
 
-        db.set(
+        await db.set(
             guild_id=str(ctx.guild.id),
             channel_id=str(ctx.channel.id),
             option="month",
@@ -221,11 +358,12 @@ async def month_time(ctx: discord.Interaction, day: int, time: str, week: Choice
 @app_commands.describe(title="タイトル")
 @app_commands.describe(message="設定された時間に発する文章")
 @app_commands.describe(ico="左上にアイコンとして設定されます")
+@profiler.profile("week_time")
 async def week_time(ctx: discord.Interaction, week: Choice[str], time: str, mention: discord.Role = None, title: str = None, message: str = None, ico: str = None):
     try:
         data_time = datetime.strptime(time, '%H:%M:%S').time()
 
-        db.set(
+        await db.set(
             guild_id=str(ctx.guild.id),
             channel_id=str(ctx.channel.id),
             option="week",
@@ -251,11 +389,12 @@ async def week_time(ctx: discord.Interaction, week: Choice[str], time: str, ment
 @app_commands.describe(title="タイトル")
 @app_commands.describe(message="設定された時間に発する文章")
 @app_commands.describe(ico="左上にアイコンとして設定されます")
+@profiler.profile("day_time")
 async def day_time(ctx: discord.Interaction, time: str, mention: discord.Role = None, title: str = None, message: str = None, ico: str = None):
     try:
         data_time = datetime.strptime(time, '%H:%M:%S').time()
 
-        db.set(
+        await db.set(
             guild_id=str(ctx.guild.id),
             channel_id=str(ctx.channel.id),
             option="day",
@@ -277,47 +416,138 @@ async def day_time(ctx: discord.Interaction, time: str, mention: discord.Role =
 
 @tree.command(name='get-settings', description="現在設定されている通知を表示します")
 @app_commands.describe(setting_id="詳しい見た目が見れます")
+@profiler.profile("get_settings")
 async def get_settings(ctx: discord.Interaction, setting_id: str = None):
     try:
         if setting_id is None:
-            settings = db.get_all(guild_id=str(ctx.guild.id))
-            if settings is None or len(settings) == 0:
-                await ctx.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="現在設定されている通知はありません"))
-                return
-
-            await send_all_settings(ctx, settings)
+            await send_all_settings(ctx)
         else:
             await send_specific_setting(ctx, setting_id)
     except Exception as e:
         logger.error(f"Get-settings error: {e}")
         await ctx.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="通知の取得中にエラーが発生しました"))
 
-async def send_all_settings(ctx, settings):
-    formatted_settings = []
-    for setting in settings:
-        formatted_settings.append(format_setting(setting))
+class SettingsPageView(discord.ui.View):
+    """
+    通知設定の一覧を1ページずつ表示し、ボタンで同じメッセージを書き換えてページを切り替えるビュー
+
+    ページはレコードIDをキーにしてデータベースから1ページ分ずつ読み込むため、
+    ギルドの通知設定の件数に関わらず、1回の操作で読み込む件数と送信するメッセージは一定です。
+    """
+    def __init__(self, guild_id: str, user_id: int, total: int, page_size: int = SETTINGS_PAGE_SIZE):
+        """
+        Args:
+            guild_id (str): DiscordギルドID
+            user_id (int): コマンドを実行したユーザーのID（このユーザーだけがページを切り替えられる）
+            total (int): 通知設定の件数
+            page_size (int): 1ページに表示する件数
+        """
+        super().__init__(timeout=SETTINGS_PAGE_TIMEOUT)
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.total = total
+        self.page_size = page_size
+        self.page = 0
+        self.settings = []
+        self.has_next = False
+        self.message: Optional[discord.InteractionMessage] = None
+
+    async def load_next(self, after_id: Optional[int] = None) -> bool:
+        """
+        指定したIDより後の1ページを読み込みます
+
+        Returns:
+            bool: 読み込めた場合はTrue（後ろに通知設定がない場合はFalse）
+        """
+        settings = await db.get_page(self.guild_id, self.page_size + 1, after_id=after_id)
+        if not settings:
+            return False
+        self.settings = settings[:self.page_size]
+        self.has_next = len(settings) > self.page_size
+        return True
+
+    async def load_previous(self) -> bool:
+        """
+        表示中のページより前の1ページを読み込みます
+
+        Returns:
+            bool: 読み込めた場合はTrue（前に通知設定がない場合はFalse）
+        """
+        settings = await db.get_page(self.guild_id, self.page_size + 1, before_id=self.settings[0]["id"])
+        if not settings:
+            return False
+        # 表示中に前の通知設定が削除されていても、先頭に戻ったことがわかるようにする
+        self.page = max(1, self.page - 1) if len(settings) > self.page_size else 0
+        self.settings = settings[-self.page_size:]
+        self.has_next = True
+        return True
+
+    def embeds(self) -> list:
+        """表示中のページの埋め込みを作成します"""
+        embeds = create_embed_with_fields(color=0x0000ff, title="設定中の通知",
+                                          fields=[format_setting(setting) for setting in self.settings])
+
+        # 通知管理に関する情報を追加
+        management_info = "通知の削除には `/del-settings` コマンドを使用してください。"
+        if embeds[0].description:
+            embeds[0].description += f"\n\n{management_info}"
+        else:
+            embeds[0].description = management_info
+
+        pages = max(1, -(-self.total // self.page_size))
+        embeds[-1].set_footer(text=f"{self.page + 1} / {pages} ページ（全 {self.total} 件）")
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = not self.has_next
+        return embeds[:10]
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="ページを切り替えられるのはコマンドを実行したユーザーだけです"), ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="前へ", emoji="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not await self.load_previous():
+            self.page = 0
+            await self.load_next()
+        await interaction.response.edit_message(embeds=self.embeds(), view=self)
+
+    @discord.ui.button(label="次へ", emoji="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if await self.load_next(after_id=self.settings[-1]["id"]):
+            self.page += 1
+        else:
+            self.has_next = False
+        await interaction.response.edit_message(embeds=self.embeds(), view=self)
 
-    if not formatted_settings:
+    async def on_timeout(self) -> None:
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+async def send_all_settings(ctx):
+    guild_id = str(ctx.guild.id)
+    view = SettingsPageView(guild_id, ctx.user.id, await db.count(guild_id=guild_id))
+    if view.total == 0 or not await view.load_next():
         await ctx.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="現在設定されている通知はありません"))
         return
 
-    embeds = create_embed_with_fields(color=0x0000ff, title="設定中の通知", fields=formatted_settings)
-
-    # 通知管理に関する情報を追加
-    management_info = "通知の削除には `/del-settings` コマンドを使用してください。"
-    if embeds[0].description:
-        embeds[0].description += f"\n\n{management_info}"
-    else:
-        embeds[0].description = management_info
-
-    await ctx.response.send_message(embed=embeds[0])
+    if not view.has_next:
+        # 1ページに収まる場合はボタンを表示しない
+        await ctx.response.send_message(embeds=view.embeds())
+        view.stop()
+        return
 
-    # 埋め込みメッセージのフィールド数が多すぎる場合、分割して送信
-    for embed in embeds[1:]:
-        await ctx.channel.send(embed=embed)
+    await ctx.response.send_message(embeds=view.embeds(), view=view)
+    view.message = await ctx.original_response()
 
 async def send_specific_setting(ctx, setting_id):
-    setting = db.get(guild_id=str(ctx.guild.id), id=setting_id)
+    setting = await db.get(guild_id=str(ctx.guild.id), id=setting_id)
     if setting is None:
         await ctx.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="指定された ID の通知は存在しないか、現在設定されていません"))
         return
@@ -346,16 +576,92 @@ async def send_specific_setting(ctx, setting_id):
             img_url=setting["img"] if setting["img"] != "None" else None
         ))
 
+@tree.command(name='import-settings', description="CSVまたはJSONファイルから通知をまとめて追加します")
+@app_commands.describe(file="通知設定のファイル（/export-settings と同じ形式。channel_id を省略するとこのチャンネルに送信します）")
+@profiler.profile("import_settings")
+async def import_settings(ctx: discord.Interaction, file: discord.Attachment):
+    try:
+        if file.size > IMPORT_MAX_BYTES:
+            await ctx.response.send_message(embed=create_embed(color=0xff0000, title="失敗", message=f"ファイルが大きすぎます（{IMPORT_MAX_BYTES // 1024} KB まで）"))
+            return
+        await ctx.response.defer(thinking=True)
+
+        # すべての行を検証してから書き込むため、1件でも誤りがあれば何も追加しない
+        settings, errors = load_settings_file(await file.read(), file.filename, default_channel_id=str(ctx.channel.id),
+                                              max_rows=IMPORT_MAX_ROWS)
+        unknown_channels = sorted({setting["channel_id"] for setting in settings
+                                   if ctx.guild.get_channel(int(setting["channel_id"])) is None})
+        errors.extend(f"チャンネル {channel_id} はこのサーバーにありません" for channel_id in unknown_channels)
+        if errors:
+            shown = "\n".join(errors[:10]) + (f"\n…ほか {len(errors) - 10} 件" if len(errors) > 10 else "")
+            await ctx.followup.send(embed=create_embed(color=0xff0000, title="失敗", message=f"ファイルに誤りがあるため、通知は追加されませんでした。\n\n{shown}"))
+            return
+        if not settings:
+            await ctx.followup.send(embed=create_embed(color=0xff0000, title="失敗", message="ファイルに通知設定がありません"))
+            return
+
+        count = await db.set_many(guild_id=str(ctx.guild.id), settings=settings)
+        logger.info(f"ギルド {ctx.guild.id} に {count} 件の通知をインポートしました")
+        await ctx.followup.send(embed=create_embed(color=0x00ff00, title="インポート完了", message=f"{count} 件の通知を追加しました。\n\n通知の確認には `/get-settings` コマンドを使用してください。"))
+    except Exception as e:
+        logger.error(f"Import-settings error: {e}")
+        embed = create_embed(color=0xff0000, title="エラー", message="通知のインポート中にエラーが発生しました")
+        if ctx.response.is_done():
+            await ctx.followup.send(embed=embed)
+        else:
+            await ctx.response.send_message(embed=embed)
+
+@tree.command(name='export-settings', description="現在設定されている通知をファイルに書き出します")
+@app_commands.describe(file_format="ファイルの形式")
+@app_commands.choices(file_format=[Choice(name="CSV", value="csv"), Choice(name="JSON", value="json")])
+@profiler.profile("export_settings")
+async def export_settings(ctx: discord.Interaction, file_format: Choice[str] = None):
+    try:
+        await ctx.response.defer(thinking=True)
+        extension = file_format.value if file_format else "csv"
+        guild_id = str(ctx.guild.id)
+
+        # 1ページずつ読み込んで書き出すため、件数が多くても一度にすべてをメモリに読み込まない
+        buffer = tempfile.SpooledTemporaryFile(max_size=IMPORT_MAX_BYTES)
+        text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+        writer = SettingsWriter(text, extension)
+        after_id = None
+        while True:
+            settings = await db.get_page(guild_id, EXPORT_PAGE_SIZE, after_id=after_id)
+            writer.write(settings)
+            if len(settings) < EXPORT_PAGE_SIZE:
+                break
+            after_id = settings[-1]["id"]
+        writer.close()
+        text.flush()
+        text.detach()
+        buffer.seek(0)
+
+        if writer.count == 0:
+            buffer.close()
+            await ctx.followup.send(embed=create_embed(color=0xff0000, title="エラー", message="現在設定されている通知はありません"))
+            return
+        await ctx.followup.send(embed=create_embed(color=0x00ff00, title="エクスポート完了", message=f"{writer.count} 件の通知を書き出しました。\n\n`/import-settings` で別のサーバーに取り込むこともできます。"),
+                                file=discord.File(buffer, filename=f"reminders-{guild_id}.{extension}"))
+    except Exception as e:
+        logger.error(f"Export-settings error: {e}")
+        embed = create_embed(color=0xff0000, title="エラー", message="通知のエクスポート中にエラーが発生しました")
+        if ctx.response.is_done():
+            await ctx.followup.send(embed=embed)
+        else:
+            await ctx.response.send_message(embed=embed)
+
 @tree.command(name='del-settings', description="現在設定されている通知を削除します")
 @app_commands.describe(setting_id="'/get-settings'で数字は確認してください")
+@profiler.profile("del_settings")
 async def del_settings(ctx: discord.Interaction, setting_id: str):
     try:
-        setting = db.get(guild_id=str(ctx.guild.id), id=setting_id)
+        setting = await db.get(guild_id=str(ctx.guild.id), id=setting_id)
         if setting is None:
             await ctx.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="指定された ID の通知は存在しないか、現在設定されていません"))
             return
 
-        db.delete(guild_id=str(ctx.guild.id), id=setting_id)
+        await db.delete(guild_id=str(ctx.guild.id), id=setting_id)
         await ctx.response.send_message(embed=create_embed(color=0x00ff00, title="削除完了", message="指定された ID の通知を削除しました。\n\n通知の確認には `/get-settings` コマンドを使用してください。"))
     except Exception as e:
         logger.error(f"Del-settings error: {e}")
@@ -364,15 +670,16 @@ async def del_settings(ctx: discord.Interaction, setting_id: str):
 @tree.command(name='channel-settings', description='設定したものを編集します')
 @app_commands.describe(setting_id="'/get-settings'で数字は確認してください")
 @app_commands.describe(channel="メッセージチャンネル")
+@profiler.profile("channel_settings")
 async def channel_settings(ctx: discord.Interaction, setting_id: str, channel: discord.TextChannel):
     try:
-        setting = db.get(guild_id=str(ctx.guild.id), id=setting_id)
+        setting = await db.get(guild_id=str(ctx.guild.id), id=setting_id)
         if setting is None:
             await ctx.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="指定された ID の通知は存在しないか、現在設定されていません"))
             return
 
         old_channel_id = setting["channel_id"]
-        db.update_setting_time(guild_id=str(ctx.guild.id), id=setting_id, channel_id=str(channel.id))
+        await db.update_setting_time(guild_id=str(ctx.guild.id), id=setting_id, channel_id=str(channel.id))
 
         await ctx.response.send_message(embed=create_embed(
             color=0x00ff00,
@@ -407,43 +714,141 @@ async def web_ui(ctx: discord.Interaction):
             # インタラクションがすでにタイムアウトしている場合は無視
             pass
 
+async def is_bot_owner(user: discord.abc.User) -> bool:
+    """
+    ユーザーがボットのアプリケーションの所有者（チームの場合はメンバー）かを判定します
+
+    Args:
+        user (discord.abc.User): 判定するユーザー
+
+    Returns:
+        bool: 所有者の場合はTrue
+    """
+    global owner_ids
+    if owner_ids is None:
+        info = await client.application_info()
+        owner_ids = {member.id for member in info.team.members} if info.team else {info.owner.id}
+    return user.id in owner_ids
+
+@tree.command(name='profile', description="通知ループやコマンドの処理を計測します（ボットの所有者のみ）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(action="操作")
+@app_commands.choices(action=[Choice(name="開始", value="start"), Choice(name="終了", value="stop"), Choice(name="状態", value="status")])
+@app_commands.describe(target="計測対象（time_loop またはコマンドの関数名）")
+@app_commands.describe(count="計測する回数")
+@app_commands.describe(allocations="メモリ確保も記録します（計測中の処理が遅くなります）")
+async def profile(ctx: discord.Interaction, action: Choice[str], target: str = "time_loop", count: int = 10, allocations: bool = True):
+    try:
+        if not await is_bot_owner(ctx.user):
+            await ctx.response.send_message(embed=create_embed(color=0xff0000, title="失敗", message="このコマンドはボットの所有者だけが実行できます"), ephemeral=True)
+            return
+
+        if action.value == "start":
+            profiler.start(target, count, allocations)
+            message = f"`{target}` の計測を開始しました（{count} 回）。\n結果はボットの `{PROFILE_DIR}` ディレクトリに書き出されます。"
+        elif action.value == "stop":
+            if profiler.stop(target):
+                message = f"`{target}` の計測を終了しました。\nそれまでの結果はボットの `{PROFILE_DIR}` ディレクトリに書き出されます。"
+            else:
+                message = f"`{target}` は計測していません"
+        else:
+            active = profiler.active()
+            message = "\n".join(f"`{name}`: 残り {remaining} 回" for name, remaining in active.items()) or "計測中の対象はありません"
+            message += f"\n\n計測できる対象: {', '.join(f'`{name}`' for name in profiler.targets)}"
+        await ctx.response.send_message(embed=create_embed(color=0x00ff00, title="計測", message=message), ephemeral=True)
+    except ValueError as e:
+        await ctx.response.send_message(embed=create_embed(color=0xff0000, title="失敗", message=str(e)), ephemeral=True)
+    except Exception as e:
+        logger.error(f"Profile error: {e}")
+        if not ctx.response.is_done():
+            await ctx.response.send_message(embed=create_embed(color=0xff0000, title="エラー", message="コマンド実行中にエラーが発生しました"), ephemeral=True)
+
+@profile.autocomplete('target')
+async def profile_target_autocomplete(ctx: discord.Interaction, current: str) -> List[Choice[str]]:
+    return [Choice(name=name, value=name) for name in profiler.targets if current in name][:25]
+
 # 通知ループ
-@tasks.loop(seconds=1)
+@tasks.loop(seconds=TICK_INTERVAL)
+@TIME_LOOP_TICK_SECONDS.time()
+@profiler.profile("time_loop")
 async def time_loop():
-    """毎秒、送信すべき通知があるか確認します（最適化版）"""
-    global last_cache_update, last_checked_minute, settings_cache
+    """TICK_INTERVAL 秒ごとに、送信時刻（秒単位）に達した通知があるか確認します"""
+    global last_cache_update, last_checked_second, last_tick, completed_second
 
+    last_tick = time.monotonic()
+    # 待機中のインスタンスは送信しない
+    if not is_active_leader():
+        return
+    lease = elector.lease if elector is not None else None
     try:
         current_time = datetime.now(timezone('Asia/Tokyo'))
-        current_minute = current_time.minute
+        current_second = current_time.replace(microsecond=0)
 
-        # 1分ごとにキャッシュを更新（または初回実行時）
-        if (current_time - last_cache_update).total_seconds() >= 60 or not settings_cache:
+        # 整合性チェックのため定期的にキャッシュを全件再読み込み（または初回実行時）
+        if not cache_loaded or (current_time - last_cache_update).total_seconds() >= CACHE_RELOAD_INTERVAL:
             await update_settings_cache()
             last_cache_update = current_time
-
-        # 同じ分をすでにチェック済みの場合はスキップ
-        if current_minute == last_checked_minute:
+            await db.prune_changes(CHANGE_LOG_RETENTION)
+            await db.prune_outbox(OUTBOX_RETENTION)
+        elif time.monotonic() - last_change_sync >= CHANGE_SYNC_INTERVAL:
+            # 他のプロセスによる変更を差分で取り込む
+            await sync_changes()
+
+        # 同じ秒をすでにチェック済みの場合はスキップ
+        if current_second == last_checked_second:
             return
 
-        last_checked_minute = current_minute
+        # ループの遅延や停止で飛ばした時間も含め、まだチェックしていない範囲をまとめて処理する
+        since = next_unchecked_second(current_second)
+        record_missed_window(since)
+        last_checked_second = current_second
 
-        # キャッシュされた設定を使用して通知をチェック
-        for guild_id, guild_settings in settings_cache.items():
+        # スケジューラから送信時刻に達した通知だけを送信時刻順に取り出す
+        due_notifications = []
+        for guild_id, setting, fire_time in scheduler.pop_due(current_second, since):
             try:
-                guild = client.get_guild(int(guild_id))
-                if not guild:
+                if not is_known_guild(guild_id):
                     continue
-
-                for setting in guild_settings:
-                    if should_send_notification(setting, current_time):
-                        await send_notification(guild, setting)
-
-                        # 一回限りの通知の場合、キャッシュから削除
-                        if setting["option"] == "oneday":
-                            settings_cache[guild_id] = [s for s in guild_settings if s["id"] != setting["id"]]
+                due_notifications.append((guild_id, setting, fire_time))
             except Exception as e:
                 logger.error(f"ギルド {guild_id} の処理中にエラーが発生しました: {e}")
+        if not due_notifications:
+            completed_second = current_second
+            return
+        DUE_NOTIFICATIONS.observe(len(due_notifications))
+
+        # 直前のループで処理できなかった通知は遅延として記録
+        late = sum(1 for _, _, fire_time in due_notifications
+                   if (current_second - fire_time).total_seconds() > LATE_THRESHOLD_SECONDS)
+        if late:
+            LATE_NOTIFICATIONS.inc(late)
+            logger.warning(f"通知 {late} 件を送信時刻より遅れて送信します")
+
+        # 送信する前にアウトボックスへ登録する。リーダーの場合は送信済みの時刻も記録し、リースが引き継がれていれば何も書き込まない
+        # 一回限りの通知はアウトボックスから送信・再送されるため、登録と同時に削除する（削除イベントでキャッシュからも取り除かれる）
+        retired = [(guild_id, setting["id"]) for guild_id, setting, _ in due_notifications if setting["option"] == "oneday"]
+        notifications = [(guild_id, setting, fire_time.timestamp()) for guild_id, setting, fire_time in due_notifications]
+        async with outbox_lock:
+            try:
+                entries = await db.enqueue_notifications(lease_name, notifications, retired, lease, current_second.timestamp())
+            except Exception as e:
+                # 登録できなかった通知も取りこぼさないよう、再送なしで1回だけ送信する
+                logger.error(f"アウトボックスへの登録に失敗したため、通知を再送なしで送信します: {e}")
+                entries = [{"id": None, "guild_id": guild_id, "setting_id": setting["id"], "fire_at": fire_at,
+                            "attempts": OUTBOX_MAX_ATTEMPTS, "setting": setting} for guild_id, setting, fire_at in notifications]
+            else:
+                retired = []
+            if entries is None:
+                elector.step_down("送信済みの時刻の記録がフェンシングトークンにより拒否されました")
+                return
+            entries = claim_outbox(entries)
+        completed_second = current_second
+
+        elapsed = await deliver_outbox(entries)
+        # 登録と同時に削除できなかった一回限りの通知は、送信後に削除する（残すと来年の同じ日に再び送信される）
+        await retire_onetime(retired)
+        DISPATCH_SECONDS.observe(elapsed)
+        logger.info(f"{current_time.strftime('%H:%M:%S')} の通知 {len(due_notifications)} 件の送信が {elapsed:.2f} 秒で完了しました")
     except Exception as e:
         logger.error(f"time_loop でエラーが発生しました: {e}")
 
@@ -466,84 +871,585 @@ async def time_loop_error(error):
             # 致命的なエラーの場合はボットを再起動
             await client.close()
 
-async def update_settings_cache():
-    """すべてのギルドの設定をキャッシュに読み込みます"""
-    global settings_cache
+@tasks.loop(seconds=OUTBOX_POLL_INTERVAL)
+async def outbox_loop():
+    """再送時刻に達した通知と、停止前に送信し終えなかった通知をアウトボックスから送信します"""
+    if not is_active_leader():
+        return
+    try:
+        async with outbox_lock:
+            entries = claim_outbox(await db.get_due_outbox(lease_name, time.time(), OUTBOX_BATCH_SIZE))
+        if entries:
+            elapsed = await deliver_outbox(entries)
+            logger.info(f"アウトボックスの通知 {len(entries)} 件の送信が {elapsed:.2f} 秒で完了しました")
+    except Exception as e:
+        logger.error(f"outbox_loop でエラーが発生しました: {e}")
+
+def claim_outbox(entries: list) -> list:
+    """
+    アウトボックスの通知のうち、送信中でないものを送信中として記録します
+
+    outbox_lock を保持したまま呼び出し、通知ループと outbox_loop が同じ通知を同時に送信しないようにします。
+
+    Returns:
+        list: 送信中として記録した通知（deliver_outbox で送信する）
+    """
+    entries = [entry for entry in entries if entry["id"] is None or entry["id"] not in outbox_in_flight]
+    outbox_in_flight.update(entry["id"] for entry in entries if entry["id"] is not None)
+    return entries
+
+async def deliver_outbox(entries: list) -> float:
+    """
+    claim_outbox で記録したアウトボックスの通知を並行して送信し、結果をアウトボックスに記録します
 
+    送信に成功した通知は delivered に、失敗した通知は待ち時間の後に再送するか、再送しても成功しない場合は failed にします。
+
+    Returns:
+        float: すべての送信が完了するまでにかかった秒数
+    """
+    if not entries:
+        return 0.0
+    delivered, retries, failures = [], [], []
+
+    async def send_entry(guild_id, setting, entry):
+        try:
+            await send_notification(guild_id, setting)
+        except Exception as e:
+            SEND_FAILURES.inc(reason=send_failure_reason(e))
+            attempts = entry["attempts"] + 1
+            delay = outbox_retry_delay(e, attempts, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX)
+            if entry["id"] is None:
+                # アウトボックスに登録できなかった通知は記録も再送もしない
+                logger.error(f"ギルド {entry['guild_id']} の通知 {entry['setting_id']} の送信に失敗しました: {e}")
+                return
+            if delay is None:
+                OUTBOX_FAILED.inc()
+                failures.append((entry["id"], str(e)))
+                logger.error(f"ギルド {entry['guild_id']} の通知 {entry['setting_id']} の送信に {attempts} 回失敗したため中止しました: {e}")
+            else:
+                OUTBOX_RETRIES.inc()
+                retries.append((entry["id"], time.time() + delay, str(e)))
+                logger.warning(f"ギルド {entry['guild_id']} の通知 {entry['setting_id']} の送信に失敗したため、{delay:.0f} 秒後に再送します: {e}")
+            return
+        if entry["id"] is not None:
+            delivered.append(entry["id"])
+        # 設定された送信時刻から実際に送信が完了するまでの遅れを記録
+        DELIVERY_LATENESS_SECONDS.observe(max(0.0, time.time() - entry["fire_at"]))
+
+    unrecorded = set()
     try:
-        settings_cache = {}
+        notifications = [(entry["guild_id"], entry["setting"], entry) for entry in entries]
+        elapsed = await dispatcher.dispatch(notifications, send_entry)
+        if not await record_outbox_results(delivered, retries, failures):
+            # 送信済みの通知は pending のまま残るため、このプロセスからは再送しないよう送信中のままにする
+            unrecorded.update(delivered)
+        return elapsed
+    finally:
+        outbox_in_flight.difference_update(
+            entry["id"] for entry in entries if entry["id"] is not None and entry["id"] not in unrecorded)
+
+async def record_outbox_results(delivered: list, retries: list, failures: list) -> bool:
+    """
+    送信結果をアウトボックスに記録します。失敗した場合は OUTBOX_RECORD_ATTEMPTS 回までやり直します
+
+    Returns:
+        bool: 記録できた場合はTrue
+    """
+    for attempt in range(1, OUTBOX_RECORD_ATTEMPTS + 1):
+        try:
+            await db.complete_outbox(delivered, retries, failures)
+            return True
+        except Exception as e:
+            if attempt == OUTBOX_RECORD_ATTEMPTS:
+                logger.error(f"送信結果をアウトボックスに記録できませんでした（送信済み {len(delivered)} 件）: {e}")
+                return False
+            logger.warning(f"送信結果をアウトボックスに記録できなかったため、やり直します（{attempt} 回目）: {e}")
+            await asyncio.sleep(OUTBOX_RECORD_RETRY_DELAY)
 
-        # ボットが参加しているすべてのギルドを取得
-        for guild in client.guilds:
-            guild_id = str(guild.id)
+async def retire_onetime(retired: list) -> None:
+    """
+    アウトボックスを経由せずに送信した一回限りの通知を削除します
 
-            try:
-                # テーブルが存在しない場合は作成
-                db.create_table(guild_id=guild_id)
+    Args:
+        retired (list): 削除する通知の (ギルドID, レコードID) のリスト
+    """
+    for guild_id, id in retired:
+        try:
+            await db.delete(guild_id, id)
+        except Exception as e:
+            logger.error(f"ギルド {guild_id} の一回限りの通知 {id} を削除できませんでした: {e}")
 
-                # このギルドのすべての設定を取得
-                settings = db.get_all(guild_id=guild_id)
-                if settings:
-                    settings_cache[guild_id] = settings
-            except Exception as e:
-                logger.error(f"ギルド {guild_id} の設定キャッシュ更新中にエラーが発生しました: {e}")
+def send_failure_reason(error: Exception) -> str:
+    """
+    送信に失敗した理由をメトリクスのラベルに変換します
+
+    Args:
+        error (Exception): 送信時に発生したエラー
+
+    Returns:
+        str: 失敗の理由
+    """
+    if isinstance(error, LookupError):
+        return "channel_not_found"
+    if isinstance(error, discord.RateLimited) or (isinstance(error, discord.HTTPException) and error.status == 429):
+        return "rate_limited"
+    if isinstance(error, discord.Forbidden):
+        return "forbidden"
+    if isinstance(error, discord.NotFound):
+        return "not_found"
+    return "error"
+
+def is_active_leader() -> bool:
+    """
+    このインスタンスが通知を送信してよいかを判定します
+
+    Returns:
+        bool: リーダー選出が無効、またはリーダーで引き継ぎの準備が完了している場合はTrue
+    """
+    if elector is None:
+        return True
+    return elector.is_leader and elector.token == prepared_token
+
+@tasks.loop(seconds=LEASE_RENEW_INTERVAL)
+async def lease_loop():
+    """リースを定期的に更新し、リーダーになった場合は送信を引き継ぎます"""
+    try:
+        checked_until = completed_second.timestamp() if completed_second is not None else None
+        if await elector.heartbeat(checked_until):
+            await take_over(elector.lease)
     except Exception as e:
-        logger.error(f"設定キャッシュの更新中にエラーが発生しました: {e}")
+        logger.error(f"lease_loop でエラーが発生しました: {e}")
+
+async def take_over(lease: dict) -> None:
+    """
+    リーダーになったときに、前のリーダーが送信し終えた時刻の次から送信を再開します
 
-async def send_notification(guild, setting):
-    """設定に基づいて通知を送信します"""
+    待機中は設定の変更を取り込んでいないため、設定キャッシュを読み込み済みの場合は変更履歴の差分を取り込み、
+    まだ読み込んでいない場合は全件読み込んでから送信を始めます。
+
+    Args:
+        lease (dict): 取得したリース
+    """
+    global last_checked_second, completed_second, last_cache_update, prepared_token
+
+    # 同じトークンのリースを取得し直した場合も、準備が終わるまで通知ループを止める
+    prepared_token = None
+    checked_until = lease["checked_until"]
+    if checked_until is not None:
+        # 取りこぼしがないよう前のリーダーの送信済みの時刻からさかのぼって送信する（CATCHUP_MAX_MINUTES まで）
+        last_checked_second = datetime.fromtimestamp(checked_until, timezone('Asia/Tokyo'))
+    else:
+        last_checked_second = None
+    completed_second = last_checked_second
+
+    if cache_loaded:
+        # 待機中に読み込んだときの送信時刻は古いため、送信を再開する時刻以降でスケジュールを作り直す
+        # （その時刻以降の送信時刻はそのまま使う）
+        scheduler.rebuild({guild_id: list(settings.values()) for guild_id, settings in settings_cache.items()},
+                          next_unchecked_second(), scheduler.fire_times())
+        await sync_changes()
+    else:
+        await update_settings_cache()
+    last_cache_update = datetime.now(timezone('Asia/Tokyo'))
+    prepared_token = lease["token"]
+    logger.info(f"通知の送信を引き継ぎました（{last_checked_second or '現在の分'} 以降）")
+
+def next_unchecked_second(current_second: Optional[datetime] = None) -> datetime:
+    """
+    まだ通知をチェックしていない最初の秒を取得します
+
+    Args:
+        current_second (Optional[datetime]): 現在時刻（秒未満は切り捨て。省略時は現在時刻から算出）
+
+    Returns:
+        datetime: 最後にチェックした秒の次の秒。ただし CATCHUP_MAX_MINUTES 分より前にはさかのぼらない。
+            起動直後は現在の分の開始時刻
+    """
+    if current_second is None:
+        current_second = datetime.now(timezone('Asia/Tokyo')).replace(microsecond=0)
+    if last_checked_second is None:
+        return current_second.replace(second=0)
+    return max(last_checked_second + timedelta(seconds=1),
+               current_second - timedelta(minutes=CATCHUP_MAX_MINUTES))
+
+def record_missed_window(since: datetime) -> None:
+    """
+    CATCHUP_MAX_MINUTES を超えてさかのぼれなかった時間を記録します
+
+    Args:
+        since (datetime): 今回チェックする最初の秒
+    """
+    if last_checked_second is None:
+        return
+    missed = (since - last_checked_second).total_seconds() - 1
+    if missed > 0:
+        MISSED_SECONDS.inc(missed)
+        logger.error(f"通知ループが停止していたため、{missed:.0f} 秒間の通知をさかのぼって送信できませんでした")
+
+def owns_guild(guild_id: str) -> bool:
+    """
+    ギルドがこのプロセスの担当するシャードに属しているかを判定します
+
+    Args:
+        guild_id (str): DiscordギルドID
+
+    Returns:
+        bool: 担当するギルドの場合はTrue（シャーディングしていない場合は常にTrue）
+    """
+    if SHARD_COUNT <= 0 or SHARD_IDS is None:
+        return True
+    return shard_id_for_guild(guild_id, SHARD_COUNT) in SHARD_IDS
+
+def is_known_guild(guild_id: str) -> bool:
+    """
+    ボットが参加しているギルドかを判定します
+
+    READY前はギルドの一覧がないため、スナップショットやデータベースにあるギルドをすべて参加しているものとして扱います。
+
+    Args:
+        guild_id (str): DiscordギルドID
+
+    Returns:
+        bool: 参加しているギルド、またはREADY前の場合はTrue
+    """
+    return not client.is_ready() or client.get_guild(int(guild_id)) is not None
+
+def on_setting_changed(event: str, guild_id: str, setting: dict) -> None:
+    """
+    データベースの変更イベントを受けて、設定キャッシュとスケジューラを即時に更新します
+
+    Args:
+        event (str): イベント名 (set, update, delete)
+        guild_id (str): DiscordギルドID
+        setting (dict): 変更後の設定（deleteの場合はidのみ）
+    """
+    # 他のプロセスが担当するシャードのギルドは読み込まない
+    if not owns_guild(guild_id):
+        return
+    # 再読み込み中の変更は読み込み済みのギルドに反映されないため、完了後に再適用する
+    if pending_changes is not None:
+        pending_changes.append((event, guild_id, setting))
+    apply_setting_change(event, guild_id, setting)
+
+def apply_setting_change(event: str, guild_id: str, setting: dict) -> None:
+    """
+    1件の変更を設定キャッシュ、スケジューラ、送信内容のキャッシュに反映します
+
+    Args:
+        event (str): イベント名 (set, update, delete)
+        guild_id (str): DiscordギルドID
+        setting (dict): 変更後の設定（deleteの場合はidのみ）
+    """
+    payload_cache.invalidate(guild_id, setting["id"])
+    if event == "delete":
+        scheduler.remove(guild_id, setting["id"])
+        guild_settings = settings_cache.get(guild_id)
+        if guild_settings is not None:
+            guild_settings.pop(setting["id"], None)
+            if not guild_settings:
+                del settings_cache[guild_id]
+    else:
+        settings_cache.setdefault(guild_id, {})[setting["id"]] = setting
+        scheduler.add(guild_id, setting, next_unchecked_second())
+
+db.add_listener(on_setting_changed)
+
+async def update_settings_cache():
+    """すべてのギルドの設定をキャッシュに読み込みます"""
+    global settings_cache, cache_loaded, pending_changes, cache_version, last_change_sync
+
+    started = time.perf_counter()
     try:
-        channel_id = int(setting["channel_id"])
-        channel = guild.get_channel(channel_id)
+        pending_changes = []
+
+        # 読み込み中の変更を取りこぼさないよう、先に変更履歴の version を取得する（重複して適用しても結果は変わらない）
+        version = await db.get_change_version()
+
+        # ボットが参加しているギルドのうち、このプロセスが担当するシャードのギルドの設定を1回のクエリで取得
+        if client.is_ready():
+            loaded = await db.get_all_by_guild(
+                str(guild.id) for guild in client.guilds if owns_guild(str(guild.id)))
+        elif SHARD_COUNT > 0 and SHARD_IDS is not None:
+            # READY前はギルドの一覧がないため担当するシャードのギルドをすべて読み込み、READY後の再読み込みで参加していないギルドを除く
+            loaded = await db.get_all_by_shards(SHARD_COUNT, SHARD_IDS)
+        else:
+            loaded = await db.get_all_by_guild()
+
+        # キャッシュを置き換えて次回送信時刻を計算し直し、読み込み中の変更を再適用
+        settings_cache = {
+            guild_id: {setting["id"]: setting for setting in settings}
+            for guild_id, settings in loaded.items()
+        }
+        scheduler.rebuild(loaded, next_unchecked_second())
+        payload_cache.clear()
+        for event, guild_id, setting in pending_changes:
+            apply_setting_change(event, guild_id, setting)
+        cache_loaded = True
+        cache_version = version
+        last_change_sync = time.monotonic()
+        CACHE_RELOAD_SECONDS.observe(time.perf_counter() - started)
+    except Exception as e:
+        logger.error(f"設定キャッシュの更新中にエラーが発生しました: {e}")
+    finally:
+        pending_changes = None
 
-        if not channel:
-            logger.warning(f"ギルド {guild.id} でチャンネル {channel_id} が見つかりません")
+async def sync_changes():
+    """変更履歴から、前回の同期以降に変更された設定だけをキャッシュに取り込みます"""
+    global cache_version, last_change_sync
+
+    last_change_sync = time.monotonic()
+    try:
+        result = await db.get_changes_since(cache_version)
+        if result is None:
+            logger.warning("必要な変更履歴が削除済みのため、設定キャッシュを全件再読み込みします")
+            await update_settings_cache()
             return
 
-        # メンションテキストを準備
-        mention_text = ""
-        if setting["mention_ids"] != "None":
-            mention_text = f"<@&{setting['mention_ids']}> "
-
-        # 通知を送信
-        await channel.send(
-            content=mention_text,
-            embed=create_embed(
-                color=0x0000ff,
-                title=setting["title"],
-                message=setting["main_text"],
-                img_url=setting["img"] if setting["img"] != "None" else None
-            )
-        )
+        version, events = result
+        applied = 0
+        for event, guild_id, setting in events:
+            # 担当外のギルドと、このプロセスの変更イベントで反映済みの設定は読み飛ばす
+            if not owns_guild(guild_id) or not is_known_guild(guild_id):
+                continue
+            if event != "delete" and settings_cache.get(guild_id, {}).get(setting["id"]) == setting:
+                continue
+            apply_setting_change(event, guild_id, setting)
+            applied += 1
+        cache_version = version
+        if applied:
+            CACHE_CHANGES_APPLIED.inc(applied)
+            logger.info(f"変更履歴から {applied} 件の変更を設定キャッシュに取り込みました")
+    except Exception as e:
+        logger.error(f"変更履歴の同期中にエラーが発生しました: {e}")
+
+def cached_settings_per_guild() -> dict:
+    """
+    /metrics の出力時に、ギルドごとのキャッシュ済み設定数を集計します
+
+    Returns:
+        dict: (ギルドID,) -> 設定数
+    """
+    # Webサーバーのスレッドから呼ばれるため、キャッシュのスナップショットを取ってから集計する
+    return {(guild_id,): len(settings) for guild_id, settings in list(settings_cache.items())}
+
+CACHE_SETTINGS.set_function(cached_settings_per_guild)
+
+def build_payload(setting: dict) -> tuple:
+    """
+    通知設定から送信内容を組み立てます
+
+    Args:
+        setting (dict): 通知設定
 
-        # 1回限りの通知の場合、送信後に削除
-        if setting["option"] == "oneday":
-            db.delete(guild_id=str(guild.id), id=str(setting["id"]))
+    Returns:
+        tuple: (メンションテキスト, 埋め込み)
+    """
+    # メンションテキストを準備
+    mention_text = ""
+    if setting["mention_ids"] != "None":
+        mention_text = f"<@&{setting['mention_ids']}> "
+
+    embed = create_embed(
+        color=0x0000ff,
+        title=setting["title"],
+        message=setting["main_text"],
+        img_url=setting["img"] if setting["img"] != "None" else None
+    )
+    return mention_text, embed
+
+payload_cache = PayloadCache(build_payload)
+
+async def send_notification(guild_id: str, setting: dict) -> None:
+    """
+    設定に基づいて通知を送信します
+
+    失敗した通知の再送と一回限りの通知の削除は、アウトボックスを通じて呼び出し側で行います。
+    READY前でギルドのキャッシュがない場合は、チャンネルIDだけを使ってHTTP APIから送信します。
+
+    Raises:
+        LookupError: チャンネルが見つからない場合
+        discord.HTTPException: 送信に失敗した場合
+    """
+    channel_id = int(setting["channel_id"])
+    guild = client.get_guild(int(guild_id))
+    channel = guild.get_channel(channel_id) if guild is not None else None
+    if not channel:
+        if client.is_ready():
+            raise LookupError(f"ギルド {guild_id} でチャンネル {channel_id} が見つかりません")
+        channel = client.get_partial_messageable(channel_id, guild_id=int(guild_id))
+
+    # 組み立て済みの送信内容を再利用して通知を送信
+    mention_text, embed = payload_cache.get(guild_id, setting)
+    started = time.perf_counter()
+    await channel.send(content=mention_text, embed=embed)
+    SEND_SECONDS.observe(time.perf_counter() - started)
+    NOTIFICATIONS_SENT.inc()
+
+def loop_health() -> tuple:
+    """
+    通知ループの稼働状況からヘルスチェックの結果を返します
+
+    Returns:
+        tuple: (正常かどうか, レスポンス本文)
+    """
+    if last_tick is None:
+        return False, "STARTING"
+    age = time.monotonic() - last_tick
+    if age > HEALTH_MAX_TICK_AGE:
+        return False, f"STALLED: 通知ループが {age:.0f} 秒間実行されていません"
+    return True, "OK"
+
+web_server = AsyncWebServer(loop_health)
+
+def snapshot_state() -> tuple:
+    """
+    スナップショットに保存する設定キャッシュの状態を取得します
+
+    設定の辞書は変更のたびに新しい辞書に置き換えられるため、リストを作るだけで別スレッドから安全に書き出せます。
+
+    Returns:
+        tuple: (ギルドIDごとの通知設定, 変更履歴の version, 送信まで完了した最後の時刻,
+            次回送信時刻, 次回送信時刻を計算した起点の時刻)
+    """
+    settings = {guild_id: list(guild_settings.values()) for guild_id, guild_settings in settings_cache.items()}
+    checked_until = completed_second.timestamp() if completed_second is not None else None
+    scheduled_from = (last_checked_second + timedelta(seconds=1)).timestamp() if last_checked_second is not None else None
+    return settings, cache_version, checked_until, scheduler.fire_times(), scheduled_from
+
+def warm_start() -> bool:
+    """
+    スナップショットから設定キャッシュとスケジューラを復元します
+
+    データベースとの差分は、最初の通知ループで変更履歴から取り込みます。
+
+    Returns:
+        bool: 復元できた場合はTrue
+    """
+    global settings_cache, cache_loaded, cache_version, last_change_sync, last_checked_second, completed_second
+
+    if not SNAPSHOT_PATH:
+        return False
+    started = time.perf_counter()
+    snapshot = load_snapshot(SNAPSHOT_PATH, lease_name)
+    if snapshot is None:
+        return False
+
+    loaded = {guild_id: settings for guild_id, settings in snapshot["settings"].items() if owns_guild(guild_id)}
+    settings_cache = {
+        guild_id: {setting["id"]: setting for setting in settings}
+        for guild_id, settings in loaded.items()
+    }
+    # 停止中に送信時刻を迎えた通知もさかのぼって送信する（送信済みの通知はアウトボックスで重複が除かれる）
+    # リーダー選出を使う場合は、リースに記録された時刻から再開する
+    if elector is None and snapshot["checked_until"] is not None:
+        last_checked_second = datetime.fromtimestamp(snapshot["checked_until"], timezone('Asia/Tokyo'))
+        completed_second = last_checked_second
+    # 保存した送信時刻は、それを計算した時刻以降から再開する場合にだけ使える（それより前から再開する場合は計算し直す）
+    after = next_unchecked_second()
+    scheduled_from = snapshot["scheduled_from"]
+    fire_times = snapshot["fire_times"] if scheduled_from is not None and after.timestamp() >= scheduled_from else None
+    scheduler.rebuild(loaded, after, fire_times)
+    cache_version = snapshot["change_version"]
+    cache_loaded = True
+    # 最初の通知ループで変更履歴の差分を取り込む
+    last_change_sync = time.monotonic() - CHANGE_SYNC_INTERVAL
+    count = sum(len(settings) for settings in loaded.values())
+    logger.info(f"スナップショットから {count} 件の通知設定を {time.perf_counter() - started:.3f} 秒で復元しました")
+    return True
+
+@tasks.loop(seconds=SNAPSHOT_INTERVAL)
+async def snapshot_loop():
+    """設定キャッシュのスナップショットを定期的に保存します"""
+    if not cache_loaded:
+        return
+    try:
+        # 書き込みはイベントループを止めないよう別スレッドで行う
+        await asyncio.to_thread(save_snapshot, SNAPSHOT_PATH, lease_name, *snapshot_state())
     except Exception as e:
-        logger.error(f"通知の送信中にエラーが発生しました: {e}")
+        logger.error(f"スナップショットの保存中にエラーが発生しました: {e}")
+
+def start_loops() -> None:
+    """リーダー選出、通知ループ、アウトボックスの送信、スナップショットの保存を開始します（実行中のものはそのまま）"""
+    if elector is not None and not lease_loop.is_running():
+        lease_loop.start()
+        logger.info(f"リーダー選出を開始しました（インスタンスID: {INSTANCE_ID}）")
+
+    if time_loop.is_running():
+        logger.info("通知ループは既に実行中です。")
+    else:
+        time_loop.start()
+        logger.info("通知ループを開始しました。")
+
+    # 再送待ちの通知と、前回の停止前に送信し終えなかった通知を送信する
+    if not outbox_loop.is_running():
+        outbox_loop.start()
+
+    if SNAPSHOT_PATH and not snapshot_loop.is_running():
+        snapshot_loop.start()
+
+async def check_legacy_tables() -> bool:
+    """
+    reminders テーブルへ移行していないギルド別テーブル（setting_time_<ギルドID>）が残っていないか確認します
+
+    移行せずに起動すると、それらのテーブルの通知設定は読み込まれず、通知が送信されなくなります。
+
+    Returns:
+        bool: 移行していないテーブルがある場合はTrue
+    """
+    legacy_tables = await db.get_legacy_tables()
+    if legacy_tables:
+        logger.critical(f"reminders テーブルへ移行していないギルド別テーブルが {len(legacy_tables)} 個あります"
+                        f"（{', '.join(sorted(legacy_tables))}）。ボットを停止した状態で "
+                        "python -m src.migrate_reminders を実行してから起動してください。")
+    return bool(legacy_tables)
 
 # イベントハンドラ
+@client.event
+async def setup_hook():
+    # 移行前のテーブルが残っている場合は、通知設定を読み込めないまま動かないよう起動を中止する
+    if await check_legacy_tables():
+        await client.close()
+        return
+
+    # READYを待たずに、ボットと同じイベントループ上でWebサーバーを起動
+    if WEB_SERVER_MODE == 'async':
+        try:
+            await web_server.start()
+        except Exception as e:
+            logger.error(f"Webサーバーの起動中にエラーが発生しました: {e}")
+
+    # PROFILE_TARGETS に指定した対象の計測を開始する
+    try:
+        for target, count in parse_profile_targets(PROFILE_TARGETS).items():
+            profiler.start(target, count)
+    except ValueError as e:
+        logger.error(f"PROFILE_TARGETS の指定が正しくありません: {e}")
+
+    # コマンドの同期やギルドの読み込みを待たずに、スナップショットから復元して通知の送信を始める
+    try:
+        warm_start()
+    except Exception as e:
+        logger.error(f"スナップショットからの復元中にエラーが発生しました: {e}")
+    start_loops()
+
 @client.event
 async def on_ready():
     try:
         logger.info('ログインしました: {0.user}'.format(client))
 
-        # コマンドツリーの同期
-        try:
-            await tree.sync()
-            logger.info("コマンドツリーの同期に成功しました。")
-        except Exception as e:
-            logger.error(f"コマンドツリーの同期中にエラーが発生しました: {e}")
-            # 致命的ではないので続行
+        # コマンドツリーの同期（グローバルコマンドのため、複数プロセスで動かす場合はシャード0の担当プロセスだけが行う）
+        if SHARD_IDS is None or 0 in SHARD_IDS:
+            try:
+                await tree.sync()
+                logger.info("コマンドツリーの同期に成功しました。")
+            except Exception as e:
+                logger.error(f"コマンドツリーの同期中にエラーが発生しました: {e}")
+                # 致命的ではないので続行
 
         # 通知ループの開始または再開
         try:
-            # ループが既に実行中かチェック
-            if time_loop.is_running():
-                logger.info("通知ループは既に実行中です。")
-            else:
-                time_loop.start()
-                logger.info("通知ループを開始しました。")
+            # ループが既に実行中かチェック（通常は setup_hook で開始済み）
+            start_loops()
 
             # 設定キャッシュを更新
             await update_settings_cache()
@@ -570,7 +1476,8 @@ async def on_resumed():
 try:
     logger.info("ボットを起動しています...")
     # reconnect=Trueを明示的に設定して、接続が切れた場合に自動的に再接続を試みるようにする
-    client.run(TOKEN, reconnect=True)
+    # discord.py のログもルートロガーのキューを経由させる
+    client.run(TOKEN, reconnect=True, log_handler=None)
 except discord.LoginFailure:
     logger.critical("ログインに失敗しました。TOKENが正しいか確認してください。")
     sys.exit(1)
@@ -582,3 +1489,10 @@ except Exception as e:
     sys.exit(1)
 finally:
     logger.info("ボットを終了しています...")
+    # 次回の起動で復元できるよう、終了時の設定キャッシュを保存する
+    if SNAPSHOT_PATH and cache_loaded:
+        try:
+            save_snapshot(SNAPSHOT_PATH, lease_name, *snapshot_state())
+        except Exception as e:
+            logger.error(f"スナップショットの保存中にエラーが発生しました: {e}")
+    stop_logging(log_listener)
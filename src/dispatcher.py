@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger('discord-bot')
+
+# 送信する通知: (ギルド, 設定, ...) の形式で、3番目以降の要素はそのまま送信関数に渡す
+Notification = Tuple[Any, ...]
+# 送信関数: 通知の各要素を引数として受け取って通知を送信する
+SendFunction = Callable[..., Awaitable[Any]]
+
+class NotificationDispatcher:
+    """
+    送信時刻に達した通知を同時実行数の上限付きで並行して送信するクラス
+
+    同じチャンネル宛ての通知は順番に送信し、チャンネル内の順序を保ちます。
+    """
+    def __init__(self, concurrency: int = 10):
+        """
+        Args:
+            concurrency (int): 同時に送信する通知の最大数
+        """
+        self.concurrency = max(1, concurrency)
+
+    async def dispatch(self, notifications: List[Notification], send: SendFunction) -> float:
+        """
+        通知をチャンネルごとにまとめて並行して送信します
+
+        Args:
+            notifications (List[Notification]): (ギルド, 設定, ...) のリスト
+            send (SendFunction): 1件の通知を送信するコルーチン関数
+
+        Returns:
+            float: すべての送信が完了するまでにかかった秒数
+        """
+        started = time.perf_counter()
+        if not notifications:
+            return 0.0
+
+        # チャンネルごとに送信順を保ったままグループ化
+        channels: Dict[str, List[Notification]] = {}
+        for notification in notifications:
+            channels.setdefault(str(notification[1]["channel_id"]), []).append(notification)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send_channel(items: List[Notification]) -> None:
+            for notification in items:
+                async with semaphore:
+                    try:
+                        await send(*notification)
+                    except Exception as e:
+                        logger.error(f"通知 {notification[1].get('id')} の送信中にエラーが発生しました: {e}")
+
+        await asyncio.gather(*(send_channel(items) for items in channels.values()))
+        return time.perf_counter() - started
+
+def outbox_retry_delay(error: Exception, attempts: int, max_attempts: int, base: float,
+                       max_delay: float) -> Optional[float]:
+    """
+    送信に失敗した通知を再送するまでの待ち時間を求めます
+
+    待ち時間は base 秒から失敗するたびに2倍になり、max_delay 秒で頭打ちになります。
+    レート制限の場合は Retry-After より早く再送しません。
+
+    Args:
+        error (Exception): 送信時に発生したエラー
+        attempts (int): 今回の失敗を含めた試行回数
+        max_attempts (int): 送信を試みる最大回数
+        base (float): 1回目の失敗後の待ち時間（秒）
+        max_delay (float): 待ち時間の上限（秒）
+
+    Returns:
+        Optional[float]: 待ち時間（秒）。再送しない場合はNone
+    """
+    # 権限がない場合やチャンネルが削除された場合は、再送しても成功しない
+    if attempts >= max_attempts or isinstance(error, (discord.Forbidden, discord.NotFound)):
+        return None
+
+    delay = min(max_delay, base * 2 ** (attempts - 1))
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None and isinstance(error, discord.HTTPException) and error.status == 429:
+        try:
+            retry_after = float(error.response.headers.get("Retry-After"))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = None
+    if retry_after is not None:
+        delay = max(delay, float(retry_after))
+    return delay
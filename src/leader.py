@@ -0,0 +1,96 @@
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from src.metrics import IS_LEADER, LEADERSHIP_CHANGES
+
+logger = logging.getLogger('discord-bot')
+
+class LeaderElector:
+    """
+    データベースのリースを使って、通知を送信するインスタンス（リーダー）を1つに限定するクラス
+
+    heartbeat を定期的に呼び出してリースを更新します。リーダーが停止してリースの有効期限が切れると、
+    待機中のインスタンスが次の heartbeat でリースを引き継ぎます。
+    リーダーは、データベース上の有効期限より renew_interval 秒早く自分のリーダー権を失効させるため、
+    引き継ぎ時に2つのインスタンスが同時に送信することはありません。
+    """
+    def __init__(self, db: Any, name: str, holder: str, ttl: float = 10.0, renew_interval: float = 3.0):
+        """
+        Args:
+            db (Any): acquire_lease を持つデータベースハンドラ
+            name (str): リース名（同じ名前のリースを取り合うインスタンスのうち1つがリーダーになる）
+            holder (str): このインスタンスのID
+            ttl (float): リースの有効期間（秒）
+            renew_interval (float): リースを更新する間隔（秒）
+        """
+        if renew_interval >= ttl:
+            raise ValueError("リースの更新間隔は有効期間より短くしてください")
+        self.db = db
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.lease: Optional[Dict[str, Any]] = None
+        self._valid_until = 0.0  # time.monotonic() でのリーダー権の期限
+
+    @property
+    def is_leader(self) -> bool:
+        """リースを保持していて、ローカルの期限内であればTrue"""
+        return self.lease is not None and time.monotonic() < self._valid_until
+
+    @property
+    def token(self) -> Optional[int]:
+        """保持しているリースのフェンシングトークン"""
+        return self.lease["token"] if self.lease is not None else None
+
+    async def heartbeat(self, checked_until: Optional[float] = None) -> bool:
+        """
+        リースを更新し、保持していない場合は取得を試みます
+
+        Args:
+            checked_until (Optional[float]): リーダーの場合に記録する送信済みの時刻（UNIX時刻）
+
+        Returns:
+            bool: 今回新しくリーダーになった場合はTrue
+        """
+        was_leader = self.is_leader
+        started = time.monotonic()
+        try:
+            lease = await self.db.acquire_lease(self.name, self.holder, self.ttl,
+                                                checked_until if was_leader else None)
+        except Exception as e:
+            # データベースに接続できない間も、ローカルの期限まではリーダーとして扱う
+            logger.error(f"リース {self.name} の更新中にエラーが発生しました: {e}")
+            if not self.is_leader and was_leader:
+                self.step_down("リースを更新できないまま期限が切れました")
+            return False
+
+        if lease is None:
+            if was_leader:
+                self.step_down("リースが他のインスタンスに引き継がれました")
+            self.lease = None
+            IS_LEADER.set(0)
+            return False
+
+        self.lease = lease
+        self._valid_until = started + self.ttl - self.renew_interval
+        IS_LEADER.set(1)
+        promoted = lease["acquired"] or not was_leader
+        if promoted:
+            LEADERSHIP_CHANGES.inc()
+            logger.info(f"リース {self.name} を取得し、リーダーになりました（トークン {lease['token']}）")
+        return promoted
+
+    def step_down(self, reason: str) -> None:
+        """
+        リーダー権を手放します
+
+        Args:
+            reason (str): ログに出力する理由
+        """
+        if self.lease is not None:
+            logger.warning(f"リース {self.name} のリーダー権を失いました: {reason}")
+        self.lease = None
+        self._valid_until = 0.0
+        IS_LEADER.set(0)
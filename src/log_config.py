@@ -0,0 +1,152 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# setup_logging が開始し、まだ停止していないリスナー（終了時と atexit の2回 stop_logging が呼ばれるため）
+_running_listeners = set()
+
+class JsonFormatter(logging.Formatter):
+    """ログレコードを1行のJSONとして出力するフォーマッタ"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        return json.dumps(entry, ensure_ascii=False)
+
+class RateLimitFilter(logging.Filter):
+    """
+    同じ内容の警告・エラーが繰り返し出力されるのを抑制するフィルタ
+
+    同じロガー・レベル・メッセージのレコードは interval 秒に1回だけ通し、
+    その間に抑制した件数を次に通すレコードに付記します。INFO以下のレコードは抑制しません。
+    """
+    def __init__(self, interval: float = 60.0, max_keys: int = 10000):
+        """
+        Args:
+            interval (float): 同じメッセージを再び出力するまでの間隔（秒）。0以下で無効
+            max_keys (int): 記録するメッセージの種類の上限（超えた場合は古いものから破棄する）
+        """
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self._seen: Dict[Tuple[str, int, str], Tuple[float, int]] = {}  # キー -> (最後に出力した時刻, 抑制した件数)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0 or record.levelno < logging.WARNING:
+            return True
+
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        seen = self._seen.get(key)
+        if seen is not None and now - seen[0] < self.interval:
+            self._seen[key] = (seen[0], seen[1] + 1)
+            return False
+
+        if seen is not None and seen[1]:
+            record.suppressed = seen[1]
+            record.msg = f"{record.getMessage()}（直近 {seen[1]} 件の同じログを省略しました）"
+            record.args = None
+        self._seen.pop(key, None)
+        self._seen[key] = (now, 0)
+        if len(self._seen) > self.max_keys:
+            self._prune(now)
+        return True
+
+    def _prune(self, now: float) -> None:
+        """間隔を過ぎたキーを破棄し、それでも上限を超える場合は古いものから破棄します"""
+        self._seen = {key: seen for key, seen in self._seen.items() if now - seen[0] < self.interval}
+        while len(self._seen) > self.max_keys:
+            del self._seen[next(iter(self._seen))]
+
+def create_file_handler(path: str, rotation: str = "size", max_bytes: int = 10 * 1024 * 1024,
+                        backup_count: int = 5) -> logging.Handler:
+    """
+    ローテーションするログファイルのハンドラを作成します
+
+    Args:
+        path (str): ログファイルのパス
+        rotation (str): "size"（max_bytes ごと）または "midnight" などの TimedRotatingFileHandler の when
+        max_bytes (int): rotation が "size" の場合の1ファイルの最大サイズ（バイト）
+        backup_count (int): 残す古いログファイルの数
+
+    Returns:
+        logging.Handler: ファイルハンドラ
+    """
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    return logging.handlers.TimedRotatingFileHandler(path, when=rotation, backupCount=backup_count, encoding='utf-8')
+
+def setup_logging(log_dir: str = "logs", level: str = "INFO", log_format: str = "text", rotation: str = "size",
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                  rate_limit_interval: float = 60.0) -> logging.handlers.QueueListener:
+    """
+    キューを使ったロギングを設定します
+
+    ルートロガーには QueueHandler だけを登録し、コンソールとファイルへの書き込みは
+    バックグラウンドスレッドの QueueListener が行います。イベントループのスレッドはレコードを
+    キューに入れるだけなので、ディスクの遅延が通知の送信を遅らせることはありません。
+
+    Args:
+        log_dir (str): ログファイルを保存するディレクトリ
+        level (str): ログレベル
+        log_format (str): ファイルの出力形式。"text" または "json"
+        rotation (str): ログファイルのローテーション方式（create_file_handler を参照）
+        max_bytes (int): rotation が "size" の場合の1ファイルの最大サイズ（バイト）
+        backup_count (int): 残す古いログファイルの数
+        rate_limit_interval (float): 同じ警告・エラーを再び出力するまでの間隔（秒）。0以下で無効
+
+    Returns:
+        logging.handlers.QueueListener: 起動済みのリスナー（終了時に stop を呼び出す）
+    """
+    if log_format not in ("text", "json"):
+        raise ValueError(f"ログの出力形式が不正です: {log_format}")
+    os.makedirs(log_dir, exist_ok=True)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(DEFAULT_FORMAT))
+    file_handler = create_file_handler(os.path.join(log_dir, 'discord_bot.log'), rotation, max_bytes, backup_count)
+    file_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(DEFAULT_FORMAT))
+
+    # 抑制するレコードはキューに入れる前に捨てる
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_limit_interval))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    _running_listeners.add(listener)
+    atexit.register(stop_logging, listener)
+    return listener
+
+def stop_logging(listener: Optional[logging.handlers.QueueListener]) -> None:
+    """
+    キューに残っているレコードを書き込んでリスナーを停止します
+
+    Args:
+        listener (Optional[logging.handlers.QueueListener]): setup_logging が返したリスナー
+    """
+    if listener in _running_listeners:
+        _running_listeners.discard(listener)
+        listener.stop()
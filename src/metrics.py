@@ -0,0 +1,285 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus の既定のバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape_label_value(value: str) -> str:
+    """ラベルの値に含まれるバックスラッシュ、ダブルクォート、改行をエスケープします"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """ラベルをPrometheusのテキスト形式に変換します"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    """数値をPrometheusのテキスト形式に変換します"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Metric:
+    """
+    メトリクスの基底クラス
+
+    通知ループ（イベントループのスレッド）から更新され、Webサーバーのスレッドから読み出されるため、
+    値の更新と読み出しはロックで保護します。
+    """
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Args:
+            name (str): メトリクス名
+            documentation (str): HELP行に出力する説明
+            labelnames (Sequence[str]): ラベル名
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """ラベルの辞書を値のタプルに変換します"""
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        """サンプル行のリストを返します"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """HELP行とTYPE行を含むテキスト形式で出力します"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """単調増加するカウンタ"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """
+        カウンタを増やします
+
+        Args:
+            amount (float): 増やす量
+            **labels: ラベルの値
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: Any) -> float:
+        """現在の値を取得します"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Gauge(Metric):
+    """増減する値。出力時に呼び出す関数で値を算出することもできます"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels: Any) -> None:
+        """
+        値を設定します
+
+        Args:
+            value (float): 設定する値
+            **labels: ラベルの値
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """
+        出力のたびに値を算出する関数を設定します
+
+        Args:
+            function (Callable): ラベルの値のタプル -> 値 の辞書を返す関数
+        """
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            values = list(self._function().items())
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Histogram(Metric):
+    """値の分布を累積バケットで集計するヒストグラム"""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}  # ラベル -> [各バケットの件数..., 合計, 件数]
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        値を記録します
+
+        Args:
+            value (float): 記録する値
+            **labels: ラベルの値
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def time(self, **labels: Any) -> Callable:
+        """
+        関数の実行時間を記録するデコレータを返します。コルーチン関数にも使用できます
+
+        Args:
+            **labels: ラベルの値
+        """
+        def decorator(func: Callable) -> Callable:
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.observe(time.perf_counter() - started, **labels)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(data)) for key, data in self._values.items()]
+        lines = []
+        for key, data in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {data[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {data[-1]}")
+        return lines
+
+class Registry:
+    """メトリクスを登録し、まとめてテキスト形式で出力するクラス"""
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        メトリクスを登録します
+
+        Args:
+            metric (Metric): 登録するメトリクス
+
+        Returns:
+            Metric: 登録したメトリクス
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        登録されたすべてのメトリクスをPrometheusのテキスト形式で出力します
+
+        Returns:
+            str: /metrics のレスポンス本文
+        """
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+REGISTRY = Registry()
+
+# 通知ループ
+TIME_LOOP_TICK_SECONDS = REGISTRY.register(Histogram(
+    "discord_reminder_time_loop_tick_seconds", "Duration of one time_loop tick"))
+DUE_NOTIFICATIONS = REGISTRY.register(Histogram(
+    "discord_reminder_due_notifications", "Number of notifications taken from the scheduler in one time_loop tick",
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)))
+DISPATCH_SECONDS = REGISTRY.register(Histogram(
+    "discord_reminder_dispatch_seconds", "Time to finish sending all notifications of one time_loop tick",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)))
+LATE_NOTIFICATIONS = REGISTRY.register(Counter(
+    "discord_reminder_late_notifications_total", "Notifications taken from the scheduler more than a second after their send time"))
+MISSED_SECONDS = REGISTRY.register(Counter(
+    "discord_reminder_missed_seconds_total", "Skipped time older than the catch-up window that was not processed"))
+DELIVERY_LATENESS_SECONDS = REGISTRY.register(Histogram(
+    "discord_reminder_delivery_lateness_seconds", "Delay from the configured send time to the completed send",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0)))
+
+# 通知の送信
+SEND_SECONDS = REGISTRY.register(Histogram(
+    "discord_reminder_send_seconds", "Latency of sending one notification to Discord"))
+NOTIFICATIONS_SENT = REGISTRY.register(Counter(
+    "discord_reminder_notifications_sent_total", "Notifications sent successfully"))
+OUTBOX_RETRIES = REGISTRY.register(Counter(
+    "discord_reminder_outbox_retries_total", "Failed notification sends scheduled for another attempt from the outbox"))
+OUTBOX_FAILED = REGISTRY.register(Counter(
+    "discord_reminder_outbox_failed_total", "Notifications given up after the last attempt or a permanent error"))
+SEND_FAILURES = REGISTRY.register(Counter(
+    "discord_reminder_send_failures_total", "Failed notification send attempts", ["reason"]))
+PAYLOAD_CACHE_REQUESTS = REGISTRY.register(Counter(
+    "discord_reminder_payload_cache_requests_total", "Lookups of prebuilt notification payloads", ["result"]))
+
+# 設定キャッシュ
+CACHE_RELOAD_SECONDS = REGISTRY.register(Histogram(
+    "discord_reminder_cache_reload_seconds", "Duration of a full settings cache reload"))
+CACHE_CHANGES_APPLIED = REGISTRY.register(Counter(
+    "discord_reminder_cache_changes_applied_total", "Changes from other processes applied to the settings cache from the change log"))
+CACHE_SETTINGS = REGISTRY.register(Gauge(
+    "discord_reminder_cache_settings", "Number of cached notification settings per guild", ["guild_id"]))
+
+# リーダー選出
+IS_LEADER = REGISTRY.register(Gauge(
+    "discord_reminder_is_leader", "1 if this instance holds the scheduler lease"))
+LEADERSHIP_CHANGES = REGISTRY.register(Counter(
+    "discord_reminder_leadership_acquired_total", "Times this instance acquired the scheduler lease"))
+
+# データベース
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "discord_reminder_db_query_seconds", "Latency of database handler methods", ["method"]))
+DB_WRITE_BATCH_SIZE = REGISTRY.register(Histogram(
+    "discord_reminder_db_write_batch_size", "Number of buffered writes committed in one transaction",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)))
@@ -0,0 +1,91 @@
+"""
+ギルドごとの setting_time_<guild_id> テーブルを reminders テーブルへ移行するオフラインツール
+
+ボットを停止した状態で実行してください:
+    python -m src.migrate_reminders --app-name Discord
+
+移行済みのテーブルは migrated_setting_time_<guild_id> に名前を変更して残すため、
+再実行しても重複してコピーされることはありません（--drop-legacy で削除も可能）。
+通知IDは振り直されるため、移行前のIDは使えなくなります。
+"""
+import argparse
+import logging
+from typing import Dict, List
+
+from sqlalchemy import MetaData, Table, insert, select, text
+
+from src.log_config import DEFAULT_FORMAT
+from src.sqlalchemy_models import Reminder, SQLAlchemyDatabase
+
+logger = logging.getLogger('discord-bot')
+
+# 移行時にコピーする列
+COPIED_COLUMNS = ["channel_id", "option", "day", "week", "call_time", "mention_ids", "title", "img", "main_text"]
+
+def find_legacy_tables(db: SQLAlchemyDatabase) -> Dict[str, str]:
+    """
+    移行対象のギルド別テーブルを検索します
+
+    Args:
+        db (SQLAlchemyDatabase): 移行先のデータベース
+
+    Returns:
+        Dict[str, str]: テーブル名 -> ギルドID
+    """
+    return db.get_legacy_tables()
+
+def migrate(db: SQLAlchemyDatabase, drop_legacy: bool = False) -> Dict[str, int]:
+    """
+    すべてのギルド別テーブルの行を1つのトランザクションで reminders テーブルへ一括コピーします
+
+    IDはテーブル全体で一意になるよう振り直されます。
+
+    Args:
+        db (SQLAlchemyDatabase): 移行先のデータベース
+        drop_legacy (bool): Trueの場合は移行済みのテーブルを削除し、Falseの場合は名前を変更して残します
+
+    Returns:
+        Dict[str, int]: ギルドIDごとの移行した行数
+    """
+    db.create_table()
+    legacy_tables = find_legacy_tables(db)
+    metadata = MetaData()
+    migrated = {}
+
+    with db.engine.begin() as conn:
+        for table_name, guild_id in sorted(legacy_tables.items()):
+            table = Table(table_name, metadata, autoload_with=conn)
+            rows: List[Dict[str, str]] = [
+                {"guild_id": guild_id, **{column: row[column] for column in COPIED_COLUMNS}}
+                for row in conn.execute(select(table).order_by(table.c.id)).mappings()
+            ]
+            if rows:
+                conn.execute(insert(Reminder), rows)
+            migrated[guild_id] = len(rows)
+
+            if drop_legacy:
+                conn.execute(text(f'DROP TABLE "{table_name}"'))
+            else:
+                conn.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "migrated_{table_name}"'))
+
+    return migrated
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="setting_time_<guild_id> テーブルを reminders テーブルへ移行します")
+    parser.add_argument("--app-name", default="Discord", help="データベースファイルのアプリケーション名プレフィックス")
+    parser.add_argument("--db-name", default="server-file", help="データベース名サフィックス")
+    parser.add_argument("--drop-legacy", action="store_true", help="移行済みのテーブルを削除します")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=DEFAULT_FORMAT)
+    db = SQLAlchemyDatabase(args.app_name, args.db_name)
+    migrated = migrate(db, drop_legacy=args.drop_legacy)
+
+    for guild_id, count in migrated.items():
+        logger.info(f"ギルド {guild_id}: {count} 件を移行しました")
+    logger.info(f"{len(migrated)} テーブル、合計 {sum(migrated.values())} 件を移行しました")
+    if migrated:
+        logger.warning("通知IDが振り直されました。通知を削除・編集する前に /get-settings で新しいIDを確認してください")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from typing import Any, Callable, Dict, Tuple
+
+from src.metrics import PAYLOAD_CACHE_REQUESTS
+
+# 送信内容: (メッセージ本文, 埋め込み)
+Payload = Tuple[str, Any]
+
+class PayloadCache:
+    """
+    通知ごとに組み立て済みの送信内容（メンション文字列と埋め込み）を保持するキャッシュ
+
+    送信のたびに埋め込みを作り直す代わりに、(ギルドID, 設定ID) ごとに一度だけ組み立てて再利用します。
+    設定の追加・変更のたびに設定キャッシュには新しい設定の辞書が登録されるため、組み立てに使った辞書を
+    バージョンとして保持し、異なる辞書で要求された場合は組み立て直します。
+    """
+    def __init__(self, build: Callable[[Dict[str, Any]], Payload]):
+        """
+        Args:
+            build (Callable[[Dict[str, Any]], Payload]): 設定から送信内容を組み立てる関数
+        """
+        self.build = build
+        self._payloads: Dict[Tuple[str, int], Tuple[Dict[str, Any], Payload]] = {}  # (ギルドID, 設定ID) -> (組み立てに使った設定, 送信内容)
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def get(self, guild_id: str, setting: Dict[str, Any]) -> Payload:
+        """
+        送信内容を取得します。キャッシュにない場合や設定が変更されている場合は組み立て直します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            setting (Dict[str, Any]): 通知設定
+
+        Returns:
+            Payload: (メッセージ本文, 埋め込み)
+        """
+        key = (guild_id, int(setting["id"]))
+        cached = self._payloads.get(key)
+        if cached is not None and cached[0] is setting:
+            PAYLOAD_CACHE_REQUESTS.inc(result="hit")
+            return cached[1]
+
+        PAYLOAD_CACHE_REQUESTS.inc(result="miss")
+        payload = self.build(setting)
+        self._payloads[key] = (setting, payload)
+        return payload
+
+    def invalidate(self, guild_id: str, setting_id: Any) -> None:
+        """
+        設定の変更・削除に合わせて送信内容を破棄します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            setting_id (Any): 設定ID
+        """
+        self._payloads.pop((guild_id, int(setting_id)), None)
+
+    def clear(self) -> None:
+        """すべての送信内容を破棄します（設定キャッシュの全件再読み込み時に使用）"""
+        self._payloads.clear()
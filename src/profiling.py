@@ -0,0 +1,262 @@
+import asyncio
+import cProfile
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('discord-bot')
+
+def parse_profile_targets(value: str, default_count: int = 10) -> Dict[str, int]:
+    """
+    計測対象の指定を解析します
+
+    Args:
+        value (str): 計測対象と回数のカンマ区切りのリスト（例: "time_loop:100,get_settings:5"）。回数は省略可能
+        default_count (int): 回数を省略した場合の回数
+
+    Returns:
+        Dict[str, int]: 計測対象ごとの回数
+
+    Raises:
+        ValueError: 回数が正の整数でない場合
+    """
+    targets = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        target, _, count = part.partition(":")
+        count = int(count) if count.strip() else default_count
+        if count < 1:
+            raise ValueError(f"計測する回数は1以上を指定してください: {part}")
+        targets[target.strip()] = count
+    return targets
+
+class StackSampler:
+    """
+    指定したスレッドのスタックを一定間隔で記録するサンプリングプロファイラ
+
+    記録したスタックは flamegraph.pl や speedscope で読み込める collapsed 形式（1行に1つのスタックと回数）で書き出します。
+    """
+    def __init__(self, interval: float = 0.001):
+        """
+        Args:
+            interval (float): スタックを記録する間隔（秒）
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._thread_id: Optional[int] = None  # 記録するスレッド（Noneの間は記録しない）
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """記録用のスレッドを開始します"""
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """記録用のスレッドを停止します"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def resume(self, thread_id: int) -> None:
+        """指定したスレッドのスタックの記録を始めます"""
+        self._thread_id = thread_id
+
+    def pause(self) -> None:
+        """スタックの記録を止めます"""
+        self._thread_id = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            thread_id = self._thread_id
+            if thread_id is None:
+                continue
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: str) -> None:
+        """
+        記録したスタックを collapsed 形式で書き出します
+
+        Args:
+            path (str): 書き出すファイルのパス
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class _Session:
+    """1つの計測対象の計測中の状態"""
+    def __init__(self, target: str, count: int, sample_interval: float):
+        self.target = target
+        self.remaining = count  # 残りの計測回数
+        self.captured = 0  # 計測した回数
+        self.elapsed = 0.0  # 計測した処理の合計時間（秒）
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(sample_interval)
+        self.baseline: Optional[tracemalloc.Snapshot] = None  # 計測開始時のメモリ確保のスナップショット
+
+class Profiler:
+    """
+    通知ループやコマンドの処理を必要なときだけ計測するプロファイラ
+
+    profile() で計測対象として登録した関数は、start() で計測を開始すると次の呼び出しから指定した回数だけ計測され、
+    cProfile の結果（.pstats）、スタックのサンプリング結果（.collapsed）、メモリ確保のスナップショット（.tracemalloc）と
+    計測中に増えたメモリ確保の上位（-allocations.txt）を出力先のディレクトリに書き出します。
+    計測していない間の負担は、計測中の対象があるかの確認1回だけです。
+
+    計測はイベントループのスレッド全体が対象のため、計測中の処理が await している間に実行された他の処理も含まれます。
+    同時に計測するのは1つの呼び出しだけで、計測中に重なった呼び出しは計測せず回数にも数えません。
+    """
+    def __init__(self, output_dir: str = "profiles", sample_interval: float = 0.001):
+        """
+        Args:
+            output_dir (str): 計測結果を書き出すディレクトリ
+            sample_interval (float): スタックを記録する間隔（秒）
+        """
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.targets: List[str] = []  # profile() で登録された計測対象
+        self._sessions: Dict[str, _Session] = {}
+        self._current: Optional[_Session] = None  # 計測中の呼び出しのセッション
+        self._started_tracing = False  # tracemalloc をこのプロファイラが開始したか
+
+    def profile(self, target: str) -> Callable:
+        """
+        コルーチン関数を計測対象として登録するデコレータを返します
+
+        Args:
+            target (str): 計測対象の名前
+        """
+        self.targets.append(target)
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                session = self._sessions.get(target) if self._sessions else None
+                if session is None or self._current is not None:
+                    return await func(*args, **kwargs)
+                return await self._capture(session, func, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    async def _capture(self, session: _Session, func: Callable, *args, **kwargs):
+        """関数を1回計測しながら実行します"""
+        self._current = session
+        session.sampler.resume(threading.get_ident())
+        started = time.perf_counter()
+        session.profile.enable()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            session.profile.disable()
+            session.elapsed += time.perf_counter() - started
+            session.sampler.pause()
+            self._current = None
+            session.captured += 1
+            session.remaining -= 1
+            if session.remaining <= 0:
+                if self._sessions.get(session.target) is session:
+                    del self._sessions[session.target]
+                self._finish(session)
+
+    def start(self, target: str, count: int, allocations: bool = True) -> None:
+        """
+        計測を開始します
+
+        Args:
+            target (str): 計測対象の名前
+            count (int): 計測する呼び出しの回数
+            allocations (bool): メモリ確保も記録する場合はTrue（tracemalloc により計測中の処理が遅くなります）
+
+        Raises:
+            ValueError: 計測対象が登録されていない、既に計測中、または回数が1未満の場合
+        """
+        if target not in self.targets:
+            raise ValueError(f"計測対象 {target} はありません（{', '.join(self.targets)}）")
+        if target in self._sessions:
+            raise ValueError(f"{target} は既に計測中です")
+        if count < 1:
+            raise ValueError("計測する回数は1以上を指定してください")
+
+        session = _Session(target, count, self.sample_interval)
+        if allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            session.baseline = tracemalloc.take_snapshot()
+        session.sampler.start()
+        self._sessions[target] = session
+        logger.info(f"{target} の計測を開始しました（{count} 回）")
+
+    def stop(self, target: str) -> bool:
+        """
+        計測を途中で終了し、それまでの結果を書き出します
+
+        Args:
+            target (str): 計測対象の名前
+
+        Returns:
+            bool: 計測中だった場合はTrue
+        """
+        session = self._sessions.pop(target, None)
+        if session is None:
+            return False
+        if self._current is session:
+            # 計測中の呼び出しが終わったときに書き出す
+            session.remaining = 0
+        else:
+            self._finish(session)
+        return True
+
+    def active(self) -> Dict[str, int]:
+        """
+        計測中の対象を取得します
+
+        Returns:
+            Dict[str, int]: 計測中の対象ごとの残りの回数
+        """
+        return {target: session.remaining for target, session in self._sessions.items()}
+
+    def _finish(self, session: _Session) -> None:
+        """計測を終えたセッションの結果を、イベントループを止めないよう別スレッドで書き出します"""
+        snapshot = tracemalloc.take_snapshot() if session.baseline is not None and tracemalloc.is_tracing() else None
+        if self._started_tracing and not any(s.baseline is not None for s in self._sessions.values()):
+            tracemalloc.stop()
+            self._started_tracing = False
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._write_results, session, snapshot)
+        except RuntimeError:
+            self._write_results(session, snapshot)
+
+    def _write_results(self, session: _Session, snapshot: Optional[tracemalloc.Snapshot]) -> None:
+        """計測結果をファイルに書き出します"""
+        try:
+            session.sampler.stop()
+            os.makedirs(self.output_dir, exist_ok=True)
+            base = os.path.join(self.output_dir, f"{session.target}-{time.strftime('%Y%m%d-%H%M%S')}")
+            session.profile.dump_stats(f"{base}.pstats")
+            session.sampler.write(f"{base}.collapsed")
+            if snapshot is not None:
+                snapshot.dump(f"{base}.tracemalloc")
+                with open(f"{base}-allocations.txt", "w", encoding="utf-8") as f:
+                    for stat in snapshot.compare_to(session.baseline, "lineno")[:50]:
+                        f.write(f"{stat}\n")
+            logger.info(f"{session.target} の計測結果を {base}.* に書き出しました"
+                        f"（{session.captured} 回、合計 {session.elapsed:.3f} 秒）")
+        except Exception as e:
+            logger.error(f"{session.target} の計測結果の書き出し中にエラーが発生しました: {e}")
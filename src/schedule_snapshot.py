@@ -0,0 +1,104 @@
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('discord-bot')
+
+# スナップショットの形式のバージョン。互換性のない変更をした場合は増やす
+SNAPSHOT_FORMAT = 1
+
+def save_snapshot(path: str, scope: str, settings: Dict[str, List[Dict[str, Any]]], change_version: int,
+                  checked_until: Optional[float] = None,
+                  fire_times: Optional[Dict[Tuple[str, int], float]] = None,
+                  scheduled_from: Optional[float] = None) -> None:
+    """
+    設定キャッシュとスケジューラのスナップショットをファイルに保存します
+
+    設定は列名のリストと値のリストに分けて保存し、各設定の次回送信時刻を同じ順に並べて保存します。
+    全体はgzipで圧縮します。
+    一時ファイルに書き込んでから置き換えるため、書き込み中に停止しても以前のスナップショットは壊れません。
+
+    Args:
+        path (str): 保存先のファイルパス
+        scope (str): 担当するシャードの組み合わせ（異なる設定で起動した場合は読み込まない）
+        settings (Dict[str, List[Dict[str, Any]]]): ギルドIDごとの通知設定
+        change_version (int): 設定キャッシュに取り込み済みの変更履歴の version
+        checked_until (Optional[float]): 通知の送信まで完了した最後の時刻（UNIX時刻）
+        fire_times (Optional[Dict[Tuple[str, int], float]]): (ギルドID, 設定ID) ごとの次回送信時刻（UNIX時刻）
+        scheduled_from (Optional[float]): fire_times を計算した起点の時刻（UNIX時刻）
+    """
+    fire_times = fire_times or {}
+    fields = next((list(items[0]) for items in settings.values() if items), [])
+    data = {
+        "format": SNAPSHOT_FORMAT,
+        "scope": scope,
+        "saved_at": time.time(),
+        "change_version": change_version,
+        "checked_until": checked_until,
+        "scheduled_from": scheduled_from,
+        "fields": fields,
+        "settings": {
+            guild_id: [[setting[field] for field in fields] for setting in items]
+            for guild_id, items in settings.items()
+        },
+        "fire_at": {
+            guild_id: [fire_times.get((guild_id, int(setting["id"]))) for setting in items]
+            for guild_id, items in settings.items()
+        },
+    }
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with gzip.open(temporary, "wt", encoding="utf-8", compresslevel=1) as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporary, path)
+
+def load_snapshot(path: str, scope: str) -> Optional[Dict[str, Any]]:
+    """
+    設定キャッシュとスケジューラのスナップショットを読み込みます
+
+    Args:
+        path (str): スナップショットのファイルパス
+        scope (str): 担当するシャードの組み合わせ
+
+    Returns:
+        Optional[Dict[str, Any]]: settings（ギルドIDごとの通知設定）、fire_times（(ギルドID, 設定ID) ごとの次回送信時刻）、
+            change_version、checked_until、scheduled_from、saved_at を持つ辞書。
+            ファイルがない場合、壊れている場合、形式やシャードの組み合わせが異なる場合はNone
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"スナップショット {path} を読み込めませんでした: {e}")
+        return None
+
+    if data.get("format") != SNAPSHOT_FORMAT or data.get("scope") != scope:
+        logger.warning(f"スナップショット {path} の形式または担当するシャードが異なるため使用しません")
+        return None
+
+    fields = data["fields"]
+    settings = {
+        guild_id: [dict(zip(fields, values)) for values in rows]
+        for guild_id, rows in data["settings"].items()
+    }
+    fire_times = {}
+    for guild_id, items in settings.items():
+        for setting, fire_ts in zip(items, data["fire_at"].get(guild_id, ())):
+            if fire_ts is not None:
+                fire_times[(guild_id, int(setting["id"]))] = fire_ts
+    return {
+        "settings": settings,
+        "fire_times": fire_times,
+        "change_version": data["change_version"],
+        "checked_until": data["checked_until"],
+        "scheduled_from": data["scheduled_from"],
+        "saved_at": data["saved_at"],
+    }
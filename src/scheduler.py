@@ -0,0 +1,179 @@
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utilities import ScheduleRule, compile_setting
+
+# ヒープ要素のインデックス
+_FIRE_TS = 0
+_GUILD_ID = 2
+_SETTING = 3
+_ACTIVE = 4
+_RULE = 5
+
+class NotificationScheduler:
+    """
+    通知設定を次回送信時刻の最小ヒープで管理するスケジューラ
+
+    毎分すべての設定を走査する代わりに、各設定の次回送信時刻を秒単位で計算してヒープに保持し、
+    送信時刻に達した設定だけを取り出します。削除された設定は遅延削除で読み飛ばします。
+    設定は追加時に一度だけ ScheduleRule にコンパイルし、再登録時はコンパイル済みのルールを使います。
+    """
+    def __init__(self):
+        self._heap = []  # [送信時刻のタイムスタンプ, 連番, ギルドID, 設定, 有効フラグ, ルール]
+        self._entries = {}  # (ギルドID, 設定ID) -> ヒープ要素
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _make_entry(self, guild_id: str, setting: Dict[str, Any], after: datetime,
+                    rule: Optional[ScheduleRule] = None) -> Optional[list]:
+        """次回送信時刻を計算してヒープ要素を作成します。送信されない設定の場合はNone"""
+        if rule is None:
+            rule = compile_setting(setting)
+        fire_time = rule.next_fire_time(after) if rule is not None else None
+        if fire_time is None:
+            return None
+        return [fire_time.timestamp(), next(self._counter), guild_id, setting, True, rule]
+
+    def rebuild(self, settings_cache: Dict[str, List[Dict[str, Any]]], after: datetime,
+                fire_times: Optional[Dict[Tuple[str, int], float]] = None) -> None:
+        """
+        設定キャッシュ全体からヒープを作り直します
+
+        fire_times に after 以降の送信時刻がある設定は、その時刻をそのまま使い、
+        ルールのコンパイルは最初に送信時刻を迎えたときまで遅らせます。
+
+        Args:
+            settings_cache (Dict[str, List[Dict[str, Any]]]): ギルドIDごとの通知設定
+            after (datetime): この時刻以降の送信時刻を計算します
+            fire_times (Optional[Dict[Tuple[str, int], float]]): fire_times() で取得した (ギルドID, 設定ID) ごとの送信時刻
+        """
+        self._heap = []
+        self._entries = {}
+        after_ts = after.timestamp()
+        for guild_id, settings in settings_cache.items():
+            for setting in settings:
+                fire_ts = fire_times.get((guild_id, int(setting["id"]))) if fire_times else None
+                if fire_ts is not None and fire_ts >= after_ts:
+                    entry = [fire_ts, next(self._counter), guild_id, setting, True, None]
+                else:
+                    entry = self._make_entry(guild_id, setting, after)
+                if entry:
+                    self._heap.append(entry)
+                    self._entries[(guild_id, int(setting["id"]))] = entry
+        heapq.heapify(self._heap)
+
+    def add(self, guild_id: str, setting: Dict[str, Any], after: datetime) -> None:
+        """
+        通知設定を追加します。同じIDの設定が既にある場合は置き換えます
+
+        Args:
+            guild_id (str): DiscordギルドID
+            setting (Dict[str, Any]): 通知設定
+            after (datetime): この時刻以降の送信時刻を計算します
+        """
+        self.remove(guild_id, setting["id"])
+        self._push(self._make_entry(guild_id, setting, after))
+
+    def _push(self, entry: Optional[list]) -> None:
+        """ヒープ要素を登録します"""
+        if entry:
+            heapq.heappush(self._heap, entry)
+            self._entries[(entry[_GUILD_ID], int(entry[_SETTING]["id"]))] = entry
+
+    def remove(self, guild_id: str, setting_id: Any) -> None:
+        """
+        通知設定を削除します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            setting_id (Any): 設定ID
+        """
+        entry = self._entries.pop((guild_id, int(setting_id)), None)
+        if entry:
+            entry[_ACTIVE] = False
+
+    def fire_times(self) -> Dict[Tuple[str, int], float]:
+        """
+        登録されている通知設定の次回送信時刻を取得します
+
+        Returns:
+            Dict[Tuple[str, int], float]: (ギルドID, 設定ID) ごとの送信時刻のタイムスタンプ
+        """
+        return {key: entry[_FIRE_TS] for key, entry in self._entries.items()}
+
+    def next_fire_time(self) -> Optional[float]:
+        """
+        最も早い送信時刻を取得します
+
+        Returns:
+            Optional[float]: 送信時刻のタイムスタンプ、設定がない場合はNone
+        """
+        while self._heap and not self._heap[0][_ACTIVE]:
+            heapq.heappop(self._heap)
+        return self._heap[0][_FIRE_TS] if self._heap else None
+
+    def pop_due(self, now: datetime, since: Optional[datetime] = None) -> List[Tuple[str, Dict[str, Any], datetime]]:
+        """
+        送信時刻が since 以上 now 以下の通知設定を取り出し、繰り返しの設定は次回分を登録し直します
+
+        since より前の送信時刻のまま残っている設定（ループの停止などで取りこぼした分）は送信せず、
+        次回分に登録し直します。
+
+        Args:
+            now (datetime): 現在時刻（秒未満は切り捨てます）
+            since (Optional[datetime]): 送信対象とする最も早い送信時刻（省略時は now の分の開始時刻）
+
+        Returns:
+            List[Tuple[str, Dict[str, Any], datetime]]: 送信時刻順の (ギルドID, 設定, 送信時刻) のリスト
+        """
+        now = now.replace(microsecond=0)
+        if since is None:
+            since = now.replace(second=0)
+        now_ts = now.timestamp()
+        since_ts = since.timestamp()
+        next_second = now + timedelta(seconds=1)
+        due = []
+        rescheduled = []
+
+        while self._heap and self._heap[0][_FIRE_TS] <= now_ts:
+            entry = heapq.heappop(self._heap)
+            if not entry[_ACTIVE]:
+                continue
+            guild_id, setting = entry[_GUILD_ID], entry[_SETTING]
+            del self._entries[(guild_id, int(setting["id"]))]
+
+            fired = entry[_FIRE_TS] >= since_ts
+            if fired:
+                due.append((guild_id, setting, datetime.fromtimestamp(entry[_FIRE_TS], now.tzinfo)))
+            # 1回限りの通知は送信後に削除されるため登録し直さない
+            if not (fired and setting["option"] == "oneday"):
+                rescheduled.append(entry)
+
+        for entry in rescheduled:
+            self._push(self._make_entry(entry[_GUILD_ID], entry[_SETTING], next_second, entry[_RULE]))
+
+        return due
+
+def create_scheduler(backend: str = "heap"):
+    """
+    バックエンド名に対応するスケジューラを作成します
+
+    Args:
+        backend (str): "heap"（次回送信時刻の最小ヒープ）または "numpy"（NumPy配列による一括判定）
+
+    Returns:
+        NotificationScheduler または VectorizedScheduler
+    """
+    if backend == "heap":
+        return NotificationScheduler()
+    elif backend == "numpy":
+        try:
+            from src.vector_scheduler import VectorizedScheduler
+        except ImportError as e:
+            raise ImportError("numpy バックエンドを使用するには numpy をインストールしてください: pip install numpy") from e
+        return VectorizedScheduler()
+    raise ValueError(f"不明なスケジューラのバックエンドです: {backend}")
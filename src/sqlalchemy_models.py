@@ -1,47 +1,200 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, MetaData, inspect
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from typing import Dict, List, Optional, Any, Type
+from sqlalchemy import (
+    create_engine, event, Column, Float, Index, Integer, String, Text, UniqueConstraint,
+    bindparam, cast, delete, func, insert, select, text, update
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterable, List, NamedTuple, Optional, Tuple
+import asyncio
+import functools
+import json
+import logging
 import os
+import re
+import time
 
-# 宣言的モデルのベースクラスを作成
-Base = declarative_base()
+from src.metrics import DB_QUERY_SECONDS, DB_WRITE_BATCH_SIZE
+
+logger = logging.getLogger('discord-bot')
+
+# 変更イベントのリスナー: (イベント名, ギルドID, 設定) を受け取る
+# イベント名は "set", "update", "delete" のいずれか。"delete" の設定は "id" のみを含む
+ChangeListener = Callable[[str, str, Dict[str, Any]], None]
 
-# 各ギルドのモデルクラスを動的に作成する関数を定義
-def create_setting_time_model(guild_id: str) -> Type[Base]:
+# SQLiteのストレージプロファイル: 接続ごとに実行するPRAGMAの設定
+# 環境変数 DB_STORAGE_PROFILE で選択します
+STORAGE_PROFILES: Dict[str, Dict[str, Any]] = {
+    # SQLiteの既定値（ロールバックジャーナル）
+    "default": {},
+    # WALで読み込みが書き込みを待たないようにしつつ、コミットごとに確実にディスクへ書き込む
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,  # 負の値はKiB単位（約16MB）
+    },
+    # WALのチェックポイント時のみfsyncし、mmapと大きめのキャッシュで読み書きの速度を優先する
+    # 電源断時に直近のコミットが失われる可能性がありますが、データベースが壊れることはありません
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,  # 約64MB
+        "mmap_size": 268435456,  # 256MB
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_STORAGE_PROFILE = "durable"
+
+def apply_storage_profile(engine: Engine, profile: Optional[str] = None) -> str:
     """
-    特定のギルドの設定テーブル用のモデルクラスを動的に作成します
+    エンジンの接続ごとにストレージプロファイルのPRAGMAを設定するようにします
 
     Args:
-        guild_id (str): DiscordギルドID
+        engine (Engine): 同期エンジン（非同期エンジンの場合は sync_engine を渡す）
+        profile (Optional[str]): プロファイル名、Noneの場合は環境変数 DB_STORAGE_PROFILE または既定値
 
     Returns:
-        Type[Base]: ギルド設定用のSQLAlchemyモデルクラス
-    """
-    class_name = f"SettingTime_{guild_id}"
-
-    # モデルクラスを動的に作成
-    return type(class_name, (Base,), {
-        '__tablename__': f'setting_time_{guild_id}',
-        'id': Column(Integer, primary_key=True, autoincrement=True),
-        'channel_id': Column(String(20), nullable=False),
-        'option': Column(String(10), nullable=False),
-        'day': Column(String(10), nullable=False),
-        'week': Column(String(10), nullable=False),
-        'call_time': Column(String(10), nullable=False),
-        'mention_ids': Column(Text, nullable=False),
-        'title': Column(Text, nullable=False),
-        'img': Column(Text, nullable=False),
-        'main_text': Column(Text, nullable=False)
-    })
-
-class SQLAlchemyDatabase:
+        str: 適用したプロファイル名
     """
-    元のDatabaseクラスを置き換える、SQLAlchemyを使用したデータベースハンドラクラス
+    profile = profile or os.getenv("DB_STORAGE_PROFILE", DEFAULT_STORAGE_PROFILE)
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"不明なストレージプロファイルです: {profile}（{', '.join(STORAGE_PROFILES)} から選択してください）")
+    pragmas = STORAGE_PROFILES[profile]
+
+    if pragmas:
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return profile
+
+# 1回のSQL文の IN 句に含める値の最大数（SQLiteのバインド変数の上限より小さくする）
+IN_CHUNK_SIZE = 500
+
+# 非同期ハンドラで1つのトランザクションにまとめる書き込みの最大数
+WRITE_BATCH_MAX_SIZE = 500
+
+# reminders テーブルへ移行する前の、ギルドごとの通知設定テーブルの名前
+LEGACY_TABLE_PATTERN = re.compile(r"^setting_time_(\d+)$")
+
+class ChangeEvent(NamedTuple):
+    """コミット後にリスナーへ通知する変更イベント"""
+    event: str  # set, update, delete
+    guild_id: str
+    setting: Dict[str, Any]
+
+# DatabaseBase の操作: 実行するSQL文と変更イベントを yield し、実行結果を受け取り、呼び出し元に返す値を return するジェネレータ
+Operation = Generator[Any, Any, Any]
+
+# バッファに入れた書き込み: 呼び出すたびに同じ操作を新しく作成する関数（やり直す場合に再度呼び出す）
+WriteOperation = Callable[[], Operation]
+
+# 宣言的モデルのベースクラスを作成
+Base = declarative_base()
+
+class Reminder(Base):
+    """
+    すべてのギルドの通知設定を保持するモデル
+
+    以前はギルドごとに setting_time_<guild_id> テーブルを作成していましたが、
+    guild_id 列を持つ1つのテーブルにまとめています。移行には src.migrate_reminders を使用します。
+    """
+    __tablename__ = "reminders"
+    __table_args__ = (
+        # ギルド単位の一覧取得と、ギルド横断での送信時刻の検索に使用
+        Index("ix_reminders_guild_option_call_time", "guild_id", "option", "call_time"),
+        Index("ix_reminders_option_call_time", "option", "call_time"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    guild_id = Column(String(20), nullable=False)
+    channel_id = Column(String(20), nullable=False)
+    option = Column(String(10), nullable=False)
+    day = Column(String(10), nullable=False)
+    week = Column(String(10), nullable=False)
+    call_time = Column(String(10), nullable=False)
+    mention_ids = Column(Text, nullable=False)
+    title = Column(Text, nullable=False)
+    img = Column(Text, nullable=False)
+    main_text = Column(Text, nullable=False)
+
+class ReminderChange(Base):
+    """
+    通知設定の変更履歴のモデル
+
+    設定の追加・更新・削除と同じトランザクションで追記され、version は単調に増加します。
+    他のプロセスのキャッシュも含め、最後に読み込んだ version より新しい履歴だけを読めば差分を同期できます。
+    """
+    __tablename__ = "reminder_changes"
+    # 削除された version が再利用されないよう AUTOINCREMENT を使用
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    version = Column(Integer, primary_key=True, autoincrement=True)
+    guild_id = Column(String(20), nullable=False)
+    setting_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)  # set, update, delete
+    created_at = Column(Float, nullable=False)  # UNIX時刻
+
+class SchedulerLease(Base):
     """
+    通知を送信するインスタンス（リーダー）を1つに限定するためのリースのモデル
+
+    リーダーは有効期限が切れる前にリースを更新し続け、期限が切れたリースは他のインスタンスが引き継ぎます。
+    引き継ぐたびに増えるトークンをフェンシングトークンとして使い、古いリーダーの書き込みを拒否します。
+    """
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(200), nullable=False)
+    token = Column(Integer, nullable=False)
+    expires_at = Column(Float, nullable=False)  # UNIX時刻
+    checked_until = Column(Float, nullable=True)  # リーダーが通知を送信し終えた時刻（UNIX時刻）
+
+class OutboxEntry(Base):
+    """
+    送信時刻に達した通知を1回分ずつ記録するアウトボックスのモデル
+
+    通知は送信する前にここへ書き込まれ、送信に成功すると delivered になります。失敗した通知は
+    next_attempt_at まで待って再送し、プロセスが途中で停止しても pending のまま残った通知は再起動後に送信されます。
+    (guild_id, setting_id, fire_at) は一意のため、同じ送信時刻の通知が二重に登録されることはありません。
+    """
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        UniqueConstraint("guild_id", "setting_id", "fire_at", name="uq_notification_outbox_occurrence"),
+        # 送信待ちの通知を再送時刻順に取り出すために使用
+        Index("ix_notification_outbox_scope_status_next_attempt", "scope", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    scope = Column(String(100), nullable=False)  # 送信を担当するプロセスの範囲（シャードの組み合わせ）
+    guild_id = Column(String(20), nullable=False)
+    setting_id = Column(Integer, nullable=False)
+    fire_at = Column(Float, nullable=False)  # 送信時刻（UNIX時刻）
+    setting = Column(Text, nullable=False)  # 登録時点の通知設定（JSON）。一回限りの通知は登録と同時に削除されるため保持する
+    status = Column(String(10), nullable=False)  # pending, delivered, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(Float, nullable=False)  # 次に送信を試みる時刻（UNIX時刻）
+    last_error = Column(Text, nullable=True)
+    created_at = Column(Float, nullable=False)
+    delivered_at = Column(Float, nullable=True)
+
+class DatabaseBase:
+    """
+    同期・非同期のデータベースハンドラに共通する処理をまとめた基底クラス
+    """
+    # set_many で追加する通知設定の列（guild_id と id を除く）
+    SETTING_COLUMNS = ("channel_id", "option", "day", "week", "call_time", "mention_ids", "title", "main_text", "img")
+
     def __init__(self, app_name: str, db_name: str = "server-file"):
         """
-        データベース接続を初期化します
+        データベースファイルの設定を初期化します
 
         Args:
             app_name (str): データベースファイルのアプリケーション名プレフィックス
@@ -52,9 +205,728 @@ class SQLAlchemyDatabase:
 
         self.db_name = db_name
         self.app_name = app_name
-        self.engine = create_engine(f"sqlite:///./db/{app_name}-{db_name}.db")
+        self.db_path = f"./db/{app_name}-{db_name}.db"
+        self.schema_ready = False  # remindersテーブルを作成済みかどうか
+        self.listeners: List[ChangeListener] = []  # 変更イベントのリスナー
+
+    def add_listener(self, listener: ChangeListener) -> None:
+        """
+        設定の追加・更新・削除がコミットされた後に呼び出されるリスナーを登録します
+
+        Args:
+            listener (ChangeListener): (イベント名, ギルドID, 設定) を受け取る関数
+        """
+        self.listeners.append(listener)
+
+    def _publish(self, event: str, guild_id: str, setting: Dict[str, Any]) -> None:
+        """
+        変更イベントをすべてのリスナーに通知します
+
+        Args:
+            event (str): イベント名 (set, update, delete)
+            guild_id (str): DiscordギルドID
+            setting (Dict[str, Any]): 変更後の設定
+        """
+        for listener in self.listeners:
+            try:
+                listener(event, guild_id, setting)
+            except Exception as e:
+                logger.error(f"変更イベント {event} の処理中にエラーが発生しました: {e}")
+
+    @staticmethod
+    def _to_dict(setting: Reminder) -> Dict[str, Any]:
+        """
+        モデルのインスタンスを設定の辞書に変換します
+
+        Args:
+            setting (Reminder): 通知設定モデルのインスタンス
+
+        Returns:
+            Dict[str, Any]: 通知設定の辞書
+        """
+        return {
+            "id": setting.id,
+            "channel_id": setting.channel_id,
+            "option": setting.option,
+            "day": setting.day,
+            "week": setting.week,
+            "call_time": setting.call_time,
+            "mention_ids": setting.mention_ids,
+            "title": setting.title,
+            "main_text": setting.main_text,
+            "img": setting.img
+        }
+
+    @staticmethod
+    def _select_one(guild_id: str, id: str):
+        """
+        ギルドIDとレコードIDで1件の通知設定を選択するクエリを作成します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            id (str): レコードID
+        """
+        return select(Reminder).where(Reminder.guild_id == guild_id, Reminder.id == id)
+
+    @staticmethod
+    def _delete_statements(settings: Iterable[Tuple[str, Any]]) -> List[Any]:
+        """
+        (ギルドID, レコードID) の組をギルドごとにまとめたDELETE文のリストを作成します
+
+        Args:
+            settings (Iterable[Tuple[str, Any]]): 削除する (ギルドID, レコードID) の組
+
+        Returns:
+            List[Any]: 実行するDELETE文
+        """
+        ids_by_guild: Dict[str, List[int]] = {}
+        for guild_id, id in settings:
+            ids_by_guild.setdefault(guild_id, []).append(int(id))
+
+        statements = []
+        for guild_id, ids in ids_by_guild.items():
+            for start in range(0, len(ids), IN_CHUNK_SIZE):
+                chunk = ids[start:start + IN_CHUNK_SIZE]
+                statements.append(delete(Reminder).where(Reminder.guild_id == guild_id, Reminder.id.in_(chunk)))
+        return statements
+
+    @staticmethod
+    def _change_log_statements(op: str, settings: Iterable[Tuple[str, Any]]) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+        """
+        変更履歴を追記するINSERT文と、そのパラメータのリストを作成します
+
+        行ごとのパラメータを executemany で渡すため、件数に関わらずINSERT文のコンパイルはキャッシュされた1回で済みます。
+
+        Args:
+            op (str): 変更の種類 (set, update, delete)
+            settings (Iterable[Tuple[str, Any]]): 変更した (ギルドID, レコードID) の組
+
+        Returns:
+            List[Tuple[Any, List[Dict[str, Any]]]]: 実行する (INSERT文, パラメータのリスト)。変更がない場合は空のリスト
+        """
+        now = time.time()
+        rows = [{"guild_id": guild_id, "setting_id": int(id), "op": op, "created_at": now} for guild_id, id in settings]
+        return [(insert(ReminderChange), rows)] if rows else []
+
+    @staticmethod
+    def _page_statement(guild_id: str, limit: int, after_id: Optional[int] = None, before_id: Optional[int] = None):
+        """
+        ギルドの通知設定を、レコードIDをキーにして1ページ分だけ選択するクエリを作成します
+
+        OFFSET を使わず前のページの端のIDから続きを読むため、何ページ目でも読み飛ばす行がありません。
+
+        Args:
+            guild_id (str): DiscordギルドID
+            limit (int): 取得する最大件数
+            after_id (Optional[int]): このIDより後を古い順に選択する
+            before_id (Optional[int]): このIDより前を新しい順に選択する（after_id より優先）
+        """
+        statement = select(Reminder).where(Reminder.guild_id == guild_id)
+        if before_id is not None:
+            return statement.where(Reminder.id < before_id).order_by(Reminder.id.desc()).limit(limit)
+        if after_id is not None:
+            statement = statement.where(Reminder.id > after_id)
+        return statement.order_by(Reminder.id).limit(limit)
+
+    @staticmethod
+    def _changes_since_statement(version: int):
+        """
+        指定した version より新しい変更履歴を古い順に選択するクエリを作成します
+
+        Args:
+            version (int): 最後に読み込んだ version
+        """
+        return select(ReminderChange).where(ReminderChange.version > version).order_by(ReminderChange.version)
+
+    @staticmethod
+    def _select_by_ids_statements(ids: List[int]) -> List[Any]:
+        """
+        レコードIDで通知設定を選択するクエリを、バインド変数の上限を超えないよう分割して作成します
+
+        Args:
+            ids (List[int]): レコードID
+        """
+        return [
+            select(Reminder).where(Reminder.id.in_(ids[start:start + IN_CHUNK_SIZE]))
+            for start in range(0, len(ids), IN_CHUNK_SIZE)
+        ]
+
+    @staticmethod
+    def _collapse_changes(changes: Iterable[ReminderChange]) -> Dict[Tuple[str, int], str]:
+        """
+        設定ごとに最後の変更だけを残します
+
+        Args:
+            changes (Iterable[ReminderChange]): 古い順の変更履歴
+
+        Returns:
+            Dict[Tuple[str, int], str]: (ギルドID, 設定ID) -> 最後の変更の種類（最後に変更された順）
+        """
+        latest: Dict[Tuple[str, int], str] = {}
+        for change in changes:
+            key = (change.guild_id, change.setting_id)
+            latest.pop(key, None)
+            latest[key] = change.op
+        return latest
+
+    @classmethod
+    def _change_events(cls, latest: Dict[Tuple[str, int], str],
+                       settings: Iterable[Reminder]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        変更履歴と現在の通知設定から、変更イベントのリストを作成します
+
+        Args:
+            latest (Dict[Tuple[str, int], str]): _collapse_changes の結果
+            settings (Iterable[Reminder]): 変更された設定の現在の行
+
+        Returns:
+            List[Tuple[str, str, Dict[str, Any]]]: (イベント名, ギルドID, 設定) のリスト。
+                現在の行が存在しない設定は delete になります
+        """
+        rows = {(setting.guild_id, setting.id): setting for setting in settings}
+        events = []
+        for (guild_id, setting_id), op in latest.items():
+            row = rows.get((guild_id, setting_id))
+            if op == "delete" or row is None:
+                events.append(("delete", guild_id, {"id": setting_id}))
+            else:
+                events.append((op, guild_id, cls._to_dict(row)))
+        return events
+
+    @staticmethod
+    def _lease_statements(name: str, holder: str, ttl: float, now: float,
+                          checked_until: Optional[float] = None) -> List[Tuple[Any, bool]]:
+        """
+        リースを取得するために順に試すSQL文を作成します
+
+        1. 自分が保持している有効なリースの更新
+        2. 有効期限が切れたリースの引き継ぎ（トークンを1増やす）
+        3. リースがまだ存在しない場合の作成
+
+        Args:
+            name (str): リース名
+            holder (str): インスタンスID
+            ttl (float): 有効期間（秒）
+            now (float): 現在のUNIX時刻
+            checked_until (Optional[float]): 更新時に記録する送信済みの時刻
+
+        Returns:
+            List[Tuple[Any, bool]]: (SQL文, 新しく取得したかどうか) のリスト
+        """
+        renew_values: Dict[str, Any] = {"expires_at": now + ttl}
+        if checked_until is not None:
+            renew_values["checked_until"] = checked_until
+        renew = update(SchedulerLease).where(
+            SchedulerLease.name == name, SchedulerLease.holder == holder, SchedulerLease.expires_at >= now
+        ).values(**renew_values)
+        take_over = update(SchedulerLease).where(
+            SchedulerLease.name == name, SchedulerLease.expires_at < now
+        ).values(holder=holder, token=SchedulerLease.token + 1, expires_at=now + ttl)
+        create = sqlite_insert(SchedulerLease).values(
+            name=name, holder=holder, token=1, expires_at=now + ttl
+        ).on_conflict_do_nothing(index_elements=["name"])
+        return [(renew, False), (take_over, True), (create, True)]
+
+    @staticmethod
+    def _fenced_lease_update(lease: Dict[str, Any], checked_until: float, now: float):
+        """
+        リースが同じトークンのまま有効な場合だけ送信済みの時刻を記録するUPDATE文を作成します
+
+        Args:
+            lease (Dict[str, Any]): acquire_lease で取得したリース
+            checked_until (float): 送信済みの時刻（UNIX時刻）
+            now (float): 現在のUNIX時刻
+        """
+        return update(SchedulerLease).where(
+            SchedulerLease.name == lease["name"], SchedulerLease.holder == lease["holder"],
+            SchedulerLease.token == lease["token"], SchedulerLease.expires_at >= now
+        ).values(checked_until=checked_until)
+
+    @staticmethod
+    def _outbox_insert(scope: str, notifications: List[Tuple[str, Dict[str, Any], float]]) -> Tuple[Any, List[Dict[str, Any]]]:
+        """
+        通知をアウトボックスに登録するINSERT文と、そのパラメータのリストを作成します
+
+        登録済みの送信時刻の通知は無視し、新しく登録した行だけを RETURNING で返します。
+
+        Args:
+            scope (str): 送信を担当するプロセスの範囲
+            notifications (List[Tuple[str, Dict[str, Any], float]]): (ギルドID, 設定, 送信時刻のUNIX時刻) のリスト
+        """
+        table = OutboxEntry.__table__
+        now = time.time()
+        rows = [{
+            "scope": scope, "guild_id": guild_id, "setting_id": int(setting["id"]), "fire_at": fire_at,
+            "setting": json.dumps(setting, ensure_ascii=False), "status": "pending", "attempts": 0,
+            "next_attempt_at": fire_at, "created_at": now,
+        } for guild_id, setting, fire_at in notifications]
+        statement = sqlite_insert(table).on_conflict_do_nothing(
+            index_elements=["guild_id", "setting_id", "fire_at"]
+        ).returning(table.c.id, table.c.guild_id, table.c.setting_id, table.c.fire_at, table.c.attempts)
+        return statement, rows
+
+    @staticmethod
+    def _outbox_entries(rows: Iterable[Any], settings: Optional[Dict[Tuple[str, int, float], Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        アウトボックスの行を送信する通知の辞書に変換します
+
+        Args:
+            rows (Iterable[Any]): id, guild_id, setting_id, fire_at, attempts（と setting）を持つ行
+            settings (Optional[Dict[Tuple[str, int, float], Dict[str, Any]]]): 登録に使った設定。
+                指定した場合は保存したJSONの代わりにこの辞書をそのまま使う
+        """
+        entries = []
+        for row in rows:
+            key = (row.guild_id, row.setting_id, row.fire_at)
+            setting = settings[key] if settings is not None else json.loads(row.setting)
+            entries.append({
+                "id": row.id, "guild_id": row.guild_id, "setting_id": row.setting_id,
+                "fire_at": row.fire_at, "attempts": row.attempts, "setting": setting,
+            })
+        return entries
+
+    @staticmethod
+    def _due_outbox_statement(scope: str, now: float, limit: int):
+        """
+        再送時刻に達した送信待ちの通知を選択するクエリを作成します
+
+        Args:
+            scope (str): 送信を担当するプロセスの範囲
+            now (float): 現在のUNIX時刻
+            limit (int): 取得する最大件数
+        """
+        table = OutboxEntry.__table__
+        return select(table.c.id, table.c.guild_id, table.c.setting_id, table.c.fire_at, table.c.attempts, table.c.setting).where(
+            table.c.scope == scope, table.c.status == "pending", table.c.next_attempt_at <= now
+        ).order_by(table.c.next_attempt_at, table.c.id).limit(limit)
+
+    @staticmethod
+    def _complete_outbox_statements(delivered: Iterable[int], retries: Iterable[Tuple[int, float, str]],
+                                    failures: Iterable[Tuple[int, str]]) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+        """
+        送信結果をアウトボックスに記録するUPDATE文と、そのパラメータのリストを作成します
+
+        すべての更新は pending の行だけを対象にするため、同じ通知が二重に delivered として記録されることはありません。
+
+        Args:
+            delivered (Iterable[int]): 送信に成功した通知のID
+            retries (Iterable[Tuple[int, float, str]]): 再送する (ID, 再送時刻のUNIX時刻, エラー内容)
+            failures (Iterable[Tuple[int, str]]): 再送をあきらめる (ID, エラー内容)
+        """
+        table = OutboxEntry.__table__
+        pending = table.update().where(table.c.id == bindparam("entry_id"), table.c.status == "pending")
+        now = time.time()
+        statements = [
+            (pending.values(status="delivered", delivered_at=now, attempts=table.c.attempts + 1),
+             [{"entry_id": id} for id in delivered]),
+            (pending.values(attempts=table.c.attempts + 1, next_attempt_at=bindparam("next_at"), last_error=bindparam("error")),
+             [{"entry_id": id, "next_at": next_at, "error": error} for id, next_at, error in retries]),
+            (pending.values(status="failed", attempts=table.c.attempts + 1, last_error=bindparam("error")),
+             [{"entry_id": id, "error": error} for id, error in failures]),
+        ]
+        return [(statement, params) for statement, params in statements if params]
+
+    @staticmethod
+    def _lease_dict(lease: SchedulerLease, acquired: bool) -> Dict[str, Any]:
+        """
+        リースのモデルを辞書に変換します
+
+        Args:
+            lease (SchedulerLease): リースモデルのインスタンス
+            acquired (bool): 今回新しく取得したかどうか
+
+        Returns:
+            Dict[str, Any]: リースの辞書
+        """
+        return {
+            "name": lease.name,
+            "holder": lease.holder,
+            "token": lease.token,
+            "expires_at": lease.expires_at,
+            "checked_until": lease.checked_until,
+            "acquired": acquired
+        }
+
+    @staticmethod
+    def _by_guild_statements(guild_ids: Optional[Iterable[str]] = None) -> List[Any]:
+        """
+        複数ギルドの通知設定を選択するクエリを、バインド変数の上限を超えないよう分割して作成します
+
+        ギルドIDで絞り込むため、(guild_id, option, call_time) のインデックスが使われます。
+
+        Args:
+            guild_ids (Optional[Iterable[str]]): 対象のギルドID、Noneの場合はすべてのギルド
+        """
+        if guild_ids is None:
+            return [select(Reminder).order_by(Reminder.id)]
+        ids = list(dict.fromkeys(guild_ids))
+        return [
+            select(Reminder).where(Reminder.guild_id.in_(ids[start:start + IN_CHUNK_SIZE])).order_by(Reminder.id)
+            for start in range(0, len(ids), IN_CHUNK_SIZE)
+        ]
+
+    @staticmethod
+    def _by_shard_statement(shard_count: int, shard_ids: Iterable[int]) -> Any:
+        """
+        指定したシャードに属するギルドの通知設定を選択するクエリを作成します
+
+        Discordのシャーディングの計算式 (guild_id >> 22) % shard_count をSQLで評価します。
+
+        Args:
+            shard_count (int): シャードの総数
+            shard_ids (Iterable[int]): 対象のシャードID
+        """
+        shard_id = cast(Reminder.guild_id, Integer).op(">>")(22) % shard_count
+        return select(Reminder).where(shard_id.in_(list(shard_ids))).order_by(Reminder.id)
+
+    @classmethod
+    def _group_by_guild(cls, settings: Iterable[Reminder]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        通知設定をギルドIDごとにまとめます
+
+        Args:
+            settings (Iterable[Reminder]): 通知設定モデルのインスタンス
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: ギルドIDごとの通知設定の辞書のリスト
+        """
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for setting in settings:
+            grouped.setdefault(setting.guild_id, []).append(cls._to_dict(setting))
+        return grouped
+
+    # 以下の操作は同期・非同期のハンドラで共通の処理です。実行するSQL文を (SQL文) または (SQL文, パラメータ) として
+    # yield すると、ハンドラが同じトランザクションで実行した結果が送り返されます。コミット後にリスナーへ通知する変更は
+    # ChangeEvent として yield し、呼び出し元に返す値は return します。
+
+    def _set_operation(self, guild_id: str, settings: List[Dict[str, str]]) -> Operation:
+        """
+        通知設定を追加します
+
+        ORMのインスタンスを作らずに、挿入した行を RETURNING でまとめて受け取ります。
+
+        Args:
+            guild_id (str): DiscordギルドID
+            settings (List[Dict[str, str]]): 追加する通知設定（SETTING_COLUMNS の列を持つ辞書）
+
+        Returns:
+            int: 追加した件数
+        """
+        table = Reminder.__table__
+        rows = [{**{column: setting[column] for column in self.SETTING_COLUMNS}, "guild_id": guild_id} for setting in settings]
+        result = yield insert(table).returning(*table.c), rows
+        created = [self._to_dict(setting) for setting in result]
+        for statement in self._change_log_statements("set", [(guild_id, setting["id"]) for setting in created]):
+            yield statement
+        for setting in created:
+            yield ChangeEvent("set", guild_id, setting)
+        return len(created)
+
+    def _get_operation(self, guild_id: str, id: str) -> Operation:
+        """
+        特定の通知設定を取得します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            id (str): レコードID
+
+        Returns:
+            Optional[Dict[str, Any]]: 通知設定の辞書、見つからない場合はNone
+        """
+        setting = (yield self._select_one(guild_id, id)).scalars().first()
+        return self._to_dict(setting) if setting else None
+
+    def _get_all_operation(self, guild_id: str) -> Operation:
+        """
+        ギルドのすべての通知設定を取得します
+
+        Args:
+            guild_id (str): DiscordギルドID
+
+        Returns:
+            List[Dict[str, Any]]: 通知設定の辞書のリスト、見つからない場合は空のリスト
+        """
+        result = yield select(Reminder).where(Reminder.guild_id == guild_id).order_by(Reminder.id)
+        return [self._to_dict(setting) for setting in result.scalars().all()]
+
+    def _get_page_operation(self, guild_id: str, limit: int, after_id: Optional[int] = None,
+                            before_id: Optional[int] = None) -> Operation:
+        """
+        ギルドの通知設定を1ページ分だけ、レコードIDの昇順で取得します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            limit (int): 取得する最大件数
+            after_id (Optional[int]): 前のページの最後のID（次のページを取得する場合）
+            before_id (Optional[int]): 次のページの最初のID（前のページを取得する場合）
+
+        Returns:
+            List[Dict[str, Any]]: 通知設定の辞書のリスト
+        """
+        settings = (yield self._page_statement(guild_id, limit, after_id, before_id)).scalars().all()
+        if before_id is not None:
+            settings = settings[::-1]
+        return [self._to_dict(setting) for setting in settings]
+
+    def _count_operation(self, guild_id: str) -> Operation:
+        """
+        ギルドの通知設定の件数を取得します
+
+        Args:
+            guild_id (str): DiscordギルドID
+
+        Returns:
+            int: 通知設定の件数
+        """
+        return (yield select(func.count()).select_from(Reminder).where(Reminder.guild_id == guild_id)).scalar()
+
+    def _get_all_by_guild_operation(self, guild_ids: Optional[Iterable[str]] = None) -> Operation:
+        """
+        複数ギルドの通知設定を取得します
+
+        Args:
+            guild_ids (Optional[Iterable[str]]): 対象のギルドID、Noneの場合はすべてのギルド
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: ギルドIDごとの通知設定の辞書のリスト
+        """
+        settings = []
+        for statement in self._by_guild_statements(guild_ids):
+            settings.extend((yield statement).scalars().all())
+        return self._group_by_guild(settings)
+
+    def _get_all_by_shards_operation(self, shard_count: int, shard_ids: Iterable[int]) -> Operation:
+        """
+        指定したシャードに属するギルドの通知設定を取得します
+
+        Args:
+            shard_count (int): シャードの総数
+            shard_ids (Iterable[int]): 対象のシャードID
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: ギルドIDごとの通知設定の辞書のリスト
+        """
+        return self._group_by_guild((yield self._by_shard_statement(shard_count, shard_ids)).scalars().all())
+
+    def _delete_operation(self, guild_id: str, id: str) -> Operation:
+        """
+        通知設定を削除します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            id (str): レコードID
+        """
+        table = Reminder.__table__
+        deleted = (yield delete(table).where(table.c.guild_id == guild_id, table.c.id == id).returning(table.c.id)).scalar()
+        if deleted is None:
+            return
+        for statement in self._change_log_statements("delete", [(guild_id, deleted)]):
+            yield statement
+        yield ChangeEvent("delete", guild_id, {"id": deleted})
+
+    def _update_operation(self, guild_id: str, id: str, values: Dict[str, Optional[str]]) -> Operation:
+        """
+        通知設定を更新します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            id (str): レコードID
+            values (Dict[str, Optional[str]]): 列名ごとの新しい値。Noneの列は変更しません
+        """
+        table = Reminder.__table__
+        values = {name: value for name, value in values.items() if value is not None}
+        if values:
+            result = yield update(table).where(
+                table.c.guild_id == guild_id, table.c.id == id
+            ).values(**values).returning(*table.c)
+            setting = result.first()
+        else:
+            setting = (yield self._select_one(guild_id, id)).scalars().first()
+        if setting is None:
+            return
+        for statement in self._change_log_statements("update", [(guild_id, setting.id)]):
+            yield statement
+        yield ChangeEvent("update", guild_id, self._to_dict(setting))
+
+    def _get_change_version_operation(self) -> Operation:
+        """
+        最新の変更履歴の version を取得します
+
+        Returns:
+            int: 最新の version（変更履歴がない場合は0）
+        """
+        return (yield select(func.max(ReminderChange.version))).scalar() or 0
+
+    def _get_changes_since_operation(self, version: int) -> Operation:
+        """
+        指定した version より新しい変更を、設定ごとに最新の状態にまとめて取得します
+
+        Args:
+            version (int): 最後に読み込んだ version
+
+        Returns:
+            Optional[Tuple[int, List[Tuple[str, str, Dict[str, Any]]]]]:
+                (最新の version, (イベント名, ギルドID, 設定) のリスト)。
+                必要な変更履歴が削除済みで差分を同期できない場合はNone（全件読み込みが必要）
+        """
+        oldest = (yield select(func.min(ReminderChange.version))).scalar()
+        if oldest is not None and oldest > version + 1:
+            return None
+        changes = (yield self._changes_since_statement(version)).scalars().all()
+        if not changes:
+            return version, []
+        latest = self._collapse_changes(changes)
+        settings = []
+        for statement in self._select_by_ids_statements([setting_id for _, setting_id in latest]):
+            settings.extend((yield statement).scalars().all())
+        return changes[-1].version, self._change_events(latest, settings)
+
+    def _prune_changes_operation(self, retention: float) -> Operation:
+        """
+        保持期間を過ぎた変更履歴を削除します。差分の同期が途切れたことを検出できるよう、最新の1件は残します
+
+        Args:
+            retention (float): 保持期間（秒）
+
+        Returns:
+            int: 削除した件数
+        """
+        latest = (yield select(func.max(ReminderChange.version))).scalar()
+        if latest is None:
+            return 0
+        return (yield delete(ReminderChange).where(
+            ReminderChange.created_at < time.time() - retention, ReminderChange.version < latest
+        )).rowcount
+
+    def _acquire_lease_operation(self, name: str, holder: str, ttl: float,
+                                 checked_until: Optional[float] = None) -> Operation:
+        """
+        リースを取得または更新します
+
+        Args:
+            name (str): リース名
+            holder (str): インスタンスID
+            ttl (float): 有効期間（秒）
+            checked_until (Optional[float]): 更新時に記録する送信済みの時刻（UNIX時刻）
+
+        Returns:
+            Optional[Dict[str, Any]]: 保持しているリース、他のインスタンスが保持している場合はNone
+        """
+        for statement, acquired in self._lease_statements(name, holder, ttl, time.time(), checked_until):
+            if (yield statement).rowcount:
+                lease = (yield select(SchedulerLease).where(SchedulerLease.name == name)).scalar_one()
+                return self._lease_dict(lease, acquired)
+        return None
+
+    def _enqueue_notifications_operation(self, scope: str, notifications: List[Tuple[str, Dict[str, Any], float]],
+                                         retired: Iterable[Tuple[str, Any]] = (), lease: Optional[Dict[str, Any]] = None,
+                                         checked_until: Optional[float] = None) -> Operation:
+        """
+        送信時刻に達した通知をアウトボックスに登録します
+
+        リーダーの場合の送信済みの時刻の記録と、登録した一回限りの通知の削除も同じトランザクションで行います。
+
+        Args:
+            scope (str): 送信を担当するプロセスの範囲
+            notifications (List[Tuple[str, Dict[str, Any], float]]): (ギルドID, 設定, 送信時刻のUNIX時刻) のリスト
+            retired (Iterable[Tuple[str, Any]]): 削除する一回限りの通知の (ギルドID, レコードID) の組
+            lease (Optional[Dict[str, Any]]): acquire_lease で取得したリース（リーダー選出を使う場合）
+            checked_until (Optional[float]): lease に記録する送信済みの時刻（UNIX時刻）
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: 新しく登録した通知（登録済みだった送信時刻の通知は含まない）。
+                リースが他のインスタンスに引き継がれていた場合はNone（何も書き込まない）
+        """
+        retired = list(retired)
+        if lease is not None and not (yield self._fenced_lease_update(lease, checked_until, time.time())).rowcount:
+            return None
+        entries = []
+        if notifications:
+            settings = {(guild_id, int(setting["id"]), fire_at): setting for guild_id, setting, fire_at in notifications}
+            entries = self._outbox_entries((yield self._outbox_insert(scope, notifications)), settings)
+        for statement in self._delete_statements(retired):
+            yield statement
+        for statement in self._change_log_statements("delete", retired):
+            yield statement
+        for guild_id, id in retired:
+            yield ChangeEvent("delete", guild_id, {"id": int(id)})
+        return entries
+
+    def _get_due_outbox_operation(self, scope: str, now: float, limit: int) -> Operation:
+        """
+        再送時刻に達した送信待ちの通知を取得します
+
+        Args:
+            scope (str): 送信を担当するプロセスの範囲
+            now (float): 現在のUNIX時刻
+            limit (int): 取得する最大件数
+
+        Returns:
+            List[Dict[str, Any]]: 送信待ちの通知
+        """
+        return self._outbox_entries((yield self._due_outbox_statement(scope, now, limit)))
+
+    def _complete_outbox_operation(self, delivered: Iterable[int] = (), retries: Iterable[Tuple[int, float, str]] = (),
+                                   failures: Iterable[Tuple[int, str]] = ()) -> Operation:
+        """
+        送信結果をアウトボックスに記録します
+
+        Args:
+            delivered (Iterable[int]): 送信に成功した通知のID
+            retries (Iterable[Tuple[int, float, str]]): 再送する (ID, 再送時刻のUNIX時刻, エラー内容)
+            failures (Iterable[Tuple[int, str]]): 再送をあきらめる (ID, エラー内容)
+        """
+        for statement in self._complete_outbox_statements(delivered, retries, failures):
+            yield statement
+
+    def _prune_outbox_operation(self, retention: float) -> Operation:
+        """
+        保持期間を過ぎた送信済み・送信失敗の通知をアウトボックスから削除します
+
+        Args:
+            retention (float): 保持期間（秒）
+
+        Returns:
+            int: 削除した件数
+        """
+        return (yield delete(OutboxEntry).where(
+            OutboxEntry.status != "pending", OutboxEntry.created_at < time.time() - retention
+        )).rowcount
+
+    def _get_legacy_tables_operation(self) -> Operation:
+        """
+        reminders テーブルへ移行していないギルドごとの通知設定テーブルを検索します
+
+        Returns:
+            Dict[str, str]: テーブル名 -> ギルドID
+        """
+        result = yield text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'setting_time_%'")
+        tables = {}
+        for table_name in result.scalars():
+            match = LEGACY_TABLE_PATTERN.match(table_name)
+            if match:
+                tables[table_name] = match.group(1)
+        return tables
+
+class SQLAlchemyDatabase(DatabaseBase):
+    """
+    元のDatabaseクラスを置き換える、SQLAlchemyを使用したデータベースハンドラクラス
+
+    各メソッドは DatabaseBase の操作を1つのトランザクションで実行します。
+    """
+    def __init__(self, app_name: str, db_name: str = "server-file", storage_profile: Optional[str] = None):
+        """
+        データベース接続を初期化します
+
+        Args:
+            app_name (str): データベースファイルのアプリケーション名プレフィックス
+            db_name (str): データベース名サフィックス
+            storage_profile (Optional[str]): ストレージプロファイル名、Noneの場合は環境変数 DB_STORAGE_PROFILE
+        """
+        super().__init__(app_name, db_name)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        self.storage_profile = apply_storage_profile(self.engine, storage_profile)
         self.Session = sessionmaker(bind=self.engine)
-        self.models = {}  # 動的に作成されたモデルのキャッシュ
 
     def __enter__(self):
         """コンテキストマネージャのenterメソッド"""
@@ -69,32 +941,64 @@ class SQLAlchemyDatabase:
             self.session.rollback()
         self.session.close()
 
-    def get_model(self, guild_id: str) -> Type[Base]:
+    @staticmethod
+    def _execute(session: Session, operation: Operation, events: List[ChangeEvent]) -> Any:
         """
-        特定のギルドのモデルを取得または作成します
+        操作が yield したSQL文をセッションで実行し、操作が返した値を返します
 
         Args:
-            guild_id (str): DiscordギルドID
+            session (Session): 実行するセッション
+            operation (Operation): DatabaseBase の操作
+            events (List[ChangeEvent]): 操作が yield した変更イベントを追加するリスト
+        """
+        result = None
+        try:
+            while True:
+                step = operation.send(result)
+                if isinstance(step, ChangeEvent):
+                    events.append(step)
+                    result = None
+                elif isinstance(step, tuple):
+                    result = session.execute(*step)
+                else:
+                    result = session.execute(step)
+        except StopIteration as stop:
+            return stop.value
+
+    def _run(self, operation: Operation) -> Any:
+        """
+        操作を1つのトランザクションで実行し、コミット後に変更イベントを通知します
+
+        Args:
+            operation (Operation): DatabaseBase の操作
 
         Returns:
-            Type[Base]: ギルド用のSQLAlchemyモデルクラス
+            Any: 操作が返した値
         """
-        if guild_id not in self.models:
-            self.models[guild_id] = create_setting_time_model(guild_id)
-        return self.models[guild_id]
+        self.create_table()
+        events: List[ChangeEvent] = []
+        with self as session:
+            value = self._execute(session, operation, events)
+        for event in events:
+            self._publish(*event)
+        return value
 
-    def create_table(self, guild_id: str) -> None:
+    @DB_QUERY_SECONDS.time(method="create_table")
+    def create_table(self, guild_id: Optional[str] = None) -> None:
         """
-        ギルド用のテーブルが存在しない場合に作成します
+        通知設定テーブルが存在しない場合に作成します
+
+        すべてのギルドで1つのテーブルを共有するため、作成はプロセスごとに1回だけ行います。
 
         Args:
-            guild_id (str): DiscordギルドID
+            guild_id (Optional[str]): 互換性のための引数で使用しません
         """
-        model = self.get_model(guild_id)
-        if not inspect(self.engine).has_table(model.__tablename__):
-            model.__table__.create(self.engine)
+        if not self.schema_ready:
+            Base.metadata.create_all(self.engine)
+            self.schema_ready = True
 
-    def set(self, guild_id: str, channel_id: str, option: str, day: str, week: str, 
+    @DB_QUERY_SECONDS.time(method="set")
+    def set(self, guild_id: str, channel_id: str, option: str, day: str, week: str,
             call_time: str, mention_ids: str, title: str, main_text: str, img: str) -> None:
         """
         新しい通知設定を追加します
@@ -111,99 +1015,132 @@ class SQLAlchemyDatabase:
             main_text (str): 通知内容
             img (str): 画像URL
         """
-        model = self.get_model(guild_id)
-        with self as session:
-            new_setting = model(
-                channel_id=channel_id,
-                option=option,
-                day=day,
-                week=week,
-                call_time=call_time,
-                mention_ids=mention_ids,
-                title=title,
-                main_text=main_text,
-                img=img
-            )
-            session.add(new_setting)
+        setting = {"channel_id": channel_id, "option": option, "day": day, "week": week, "call_time": call_time,
+                   "mention_ids": mention_ids, "title": title, "main_text": main_text, "img": img}
+        self._run(self._set_operation(guild_id, [setting]))
 
-    def get(self, guild_id: str, id: str) -> Optional[Dict[str, Any]]:
+    @DB_QUERY_SECONDS.time(method="set_many")
+    def set_many(self, guild_id: str, settings: List[Dict[str, str]]) -> int:
         """
-        特定の通知設定を取得します
+        複数の通知設定を1つのトランザクションでまとめて追加します
+
+        1件ずつ set を呼び出す場合と異なり、何件追加してもコミットは1回です。
 
         Args:
             guild_id (str): DiscordギルドID
-            id (str): レコードID
+            settings (List[Dict[str, str]]): 追加する通知設定（channel_id, option, day, week, call_time,
+                mention_ids, title, main_text, img を持つ辞書）
 
         Returns:
-            Optional[Dict[str, Any]]: 通知設定の辞書、見つからない場合はNone
+            int: 追加した件数
         """
-        model = self.get_model(guild_id)
-        with self as session:
-            setting = session.query(model).filter(model.id == id).first()
-            if setting:
-                return {
-                    "id": setting.id,
-                    "channel_id": setting.channel_id,
-                    "option": setting.option,
-                    "day": setting.day,
-                    "week": setting.week,
-                    "call_time": setting.call_time,
-                    "mention_ids": setting.mention_ids,
-                    "title": setting.title,
-                    "main_text": setting.main_text,
-                    "img": setting.img
-                }
-            return None
+        if not settings:
+            return 0
+        return self._run(self._set_operation(guild_id, settings))
+
+    @DB_QUERY_SECONDS.time(method="get")
+    def get(self, guild_id: str, id: str) -> Optional[Dict[str, Any]]:
+        """特定の通知設定を取得します"""
+        return self._run(self._get_operation(guild_id, id))
 
+    @DB_QUERY_SECONDS.time(method="get_all")
     def get_all(self, guild_id: str) -> List[Dict[str, Any]]:
+        """ギルドのすべての通知設定を取得します"""
+        return self._run(self._get_all_operation(guild_id))
+
+    @DB_QUERY_SECONDS.time(method="get_page")
+    def get_page(self, guild_id: str, limit: int, after_id: Optional[int] = None,
+                 before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """ギルドの通知設定を1ページ分だけ、レコードIDの昇順で取得します"""
+        return self._run(self._get_page_operation(guild_id, limit, after_id, before_id))
+
+    @DB_QUERY_SECONDS.time(method="count")
+    def count(self, guild_id: str) -> int:
+        """ギルドの通知設定の件数を取得します"""
+        return self._run(self._count_operation(guild_id))
+
+    @DB_QUERY_SECONDS.time(method="get_all_by_guild")
+    def get_all_by_guild(self, guild_ids: Optional[Iterable[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """複数ギルドの通知設定を、ギルドIDごとにまとめて取得します"""
+        return self._run(self._get_all_by_guild_operation(guild_ids))
+
+    @DB_QUERY_SECONDS.time(method="get_all_by_shards")
+    def get_all_by_shards(self, shard_count: int, shard_ids: Iterable[int]) -> Dict[str, List[Dict[str, Any]]]:
+        """指定したシャードに属するギルドの通知設定を、ギルドIDごとにまとめて取得します"""
+        return self._run(self._get_all_by_shards_operation(shard_count, shard_ids))
+
+    @DB_QUERY_SECONDS.time(method="delete")
+    def delete(self, guild_id: str, id: str) -> None:
+        """通知設定を削除します"""
+        self._run(self._delete_operation(guild_id, id))
+
+    @DB_QUERY_SECONDS.time(method="get_change_version")
+    def get_change_version(self) -> int:
         """
-        ギルドのすべての通知設定を取得します
+        最新の変更履歴の version を取得します
 
-        Args:
-            guild_id (str): DiscordギルドID
+        全件読み込みの前に呼び出し、以降は get_changes_since にこの値を渡して差分を同期します。
+        """
+        return self._run(self._get_change_version_operation())
 
-        Returns:
-            List[Dict[str, Any]]: 通知設定の辞書のリスト、見つからない場合は空のリスト
+    @DB_QUERY_SECONDS.time(method="get_changes_since")
+    def get_changes_since(self, version: int) -> Optional[Tuple[int, List[Tuple[str, str, Dict[str, Any]]]]]:
+        """指定した version より新しい変更を、設定ごとに最新の状態にまとめて取得します"""
+        return self._run(self._get_changes_since_operation(version))
+
+    @DB_QUERY_SECONDS.time(method="prune_changes")
+    def prune_changes(self, retention: float) -> int:
+        """保持期間を過ぎた変更履歴を削除します"""
+        return self._run(self._prune_changes_operation(retention))
+
+    @DB_QUERY_SECONDS.time(method="acquire_lease")
+    def acquire_lease(self, name: str, holder: str, ttl: float,
+                      checked_until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """リースを取得または更新します"""
+        return self._run(self._acquire_lease_operation(name, holder, ttl, checked_until))
+
+    @DB_QUERY_SECONDS.time(method="enqueue_notifications")
+    def enqueue_notifications(self, scope: str, notifications: List[Tuple[str, Dict[str, Any], float]],
+                              retired: Iterable[Tuple[str, Any]] = (), lease: Optional[Dict[str, Any]] = None,
+                              checked_until: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
         """
-        model = self.get_model(guild_id)
-        with self as session:
-            settings = session.query(model).all()
-            if settings:
-                return [
-                    {
-                        "id": setting.id,
-                        "channel_id": setting.channel_id,
-                        "option": setting.option,
-                        "day": setting.day,
-                        "week": setting.week,
-                        "call_time": setting.call_time,
-                        "mention_ids": setting.mention_ids,
-                        "title": setting.title,
-                        "main_text": setting.main_text,
-                        "img": setting.img
-                    }
-                    for setting in settings
-                ]
-            return []
+        送信時刻に達した通知をアウトボックスに登録します
 
-    def delete(self, guild_id: str, id: str) -> None:
+        登録後に送信に失敗しても、通知はアウトボックスから再送されます。
         """
-        通知設定を削除します
+        return self._run(self._enqueue_notifications_operation(scope, notifications, retired, lease, checked_until))
 
-        Args:
-            guild_id (str): DiscordギルドID
-            id (str): レコードID
+    @DB_QUERY_SECONDS.time(method="get_due_outbox")
+    def get_due_outbox(self, scope: str, now: float, limit: int) -> List[Dict[str, Any]]:
+        """再送時刻に達した送信待ちの通知を取得します"""
+        return self._run(self._get_due_outbox_operation(scope, now, limit))
+
+    @DB_QUERY_SECONDS.time(method="complete_outbox")
+    def complete_outbox(self, delivered: Iterable[int] = (), retries: Iterable[Tuple[int, float, str]] = (),
+                        failures: Iterable[Tuple[int, str]] = ()) -> None:
+        """送信結果をアウトボックスに1つのトランザクションで記録します"""
+        self._run(self._complete_outbox_operation(delivered, retries, failures))
+
+    @DB_QUERY_SECONDS.time(method="prune_outbox")
+    def prune_outbox(self, retention: float) -> int:
+        """保持期間を過ぎた送信済み・送信失敗の通知をアウトボックスから削除します"""
+        return self._run(self._prune_outbox_operation(retention))
+
+    @DB_QUERY_SECONDS.time(method="get_legacy_tables")
+    def get_legacy_tables(self) -> Dict[str, str]:
         """
-        model = self.get_model(guild_id)
-        with self as session:
-            setting = session.query(model).filter(model.id == id).first()
-            if setting:
-                session.delete(setting)
-
-    def update_setting_time(self, guild_id: str, id: str, channel_id: Optional[str] = None, 
-                           option: Optional[str] = None, day: Optional[str] = None, 
-                           week: Optional[str] = None, call_time: Optional[str] = None, 
-                           mention_ids: Optional[str] = None, title: Optional[str] = None, 
+        reminders テーブルへ移行していないギルドごとの通知設定テーブルを検索します
+
+        Returns:
+            Dict[str, str]: テーブル名 -> ギルドID
+        """
+        return self._run(self._get_legacy_tables_operation())
+
+    @DB_QUERY_SECONDS.time(method="update_setting_time")
+    def update_setting_time(self, guild_id: str, id: str, channel_id: Optional[str] = None,
+                           option: Optional[str] = None, day: Optional[str] = None,
+                           week: Optional[str] = None, call_time: Optional[str] = None,
+                           mention_ids: Optional[str] = None, title: Optional[str] = None,
                            main_text: Optional[str] = None, img: Optional[str] = None) -> None:
         """
         通知設定を更新します
@@ -221,33 +1158,304 @@ class SQLAlchemyDatabase:
             main_text (Optional[str]): 通知内容
             img (Optional[str]): 画像URL
         """
-        model = self.get_model(guild_id)
-        with self as session:
-            setting = session.query(model).filter(model.id == id).first()
-            if setting:
-                if channel_id is not None:
-                    setting.channel_id = channel_id
-                if option is not None:
-                    setting.option = option
-                if day is not None:
-                    setting.day = day
-                if week is not None:
-                    setting.week = week
-                if call_time is not None:
-                    setting.call_time = call_time
-                if mention_ids is not None:
-                    setting.mention_ids = mention_ids
-                if title is not None:
-                    setting.title = title
-                if main_text is not None:
-                    setting.main_text = main_text
-                if img is not None:
-                    setting.img = img
+        values = {"channel_id": channel_id, "option": option, "day": day, "week": week, "call_time": call_time,
+                  "mention_ids": mention_ids, "title": title, "main_text": main_text, "img": img}
+        self._run(self._update_operation(guild_id, id, values))
 
     def close(self) -> None:
         """データベース接続を閉じます"""
         # SQLAlchemyが接続プーリングを処理するため、これは互換性のためのno-opです
         pass
 
+class AsyncSQLAlchemyDatabase(DatabaseBase):
+    """
+    SQLAlchemyDatabaseと同じAPIをコルーチンとして提供する非同期データベースハンドラクラス
+
+    aiosqliteドライバを使用するため、SQLiteの書き込み待ちがイベントループを止めません。
+    set, update_setting_time, delete はバッファに入れ、数ミリ秒の間に届いた書き込みを1つのトランザクションで
+    コミットします（グループコミット）。各呼び出しは、自分の書き込みを含むトランザクションがコミットされた後に戻ります。
+    """
+    def __init__(self, app_name: str, db_name: str = "server-file", storage_profile: Optional[str] = None,
+                 write_delay: Optional[float] = None):
+        """
+        データベース接続を初期化します
+
+        Args:
+            app_name (str): データベースファイルのアプリケーション名プレフィックス
+            db_name (str): データベース名サフィックス
+            storage_profile (Optional[str]): ストレージプロファイル名、Noneの場合は環境変数 DB_STORAGE_PROFILE
+            write_delay (Optional[float]): 書き込みをまとめるために最初の書き込みから待つ時間（秒）、
+                Noneの場合は環境変数 DB_WRITE_DELAY または 0.002
+        """
+        super().__init__(app_name, db_name)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{self.db_path}")
+        self.storage_profile = apply_storage_profile(self.engine.sync_engine, storage_profile)
+        self.Session = sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.write_delay = write_delay if write_delay is not None else float(os.getenv("DB_WRITE_DELAY", "0.002"))
+        self._pending_writes: List[Tuple[WriteOperation, asyncio.Future]] = []  # コミット待ちの書き込み
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator[AsyncSession]:
+        """
+        セッションを開き、正常終了時にコミット、例外時にロールバックします
+
+        コルーチンが並行して実行されるため、セッションはインスタンスに保持せず呼び出しごとに作成します。
+        """
+        async with self.Session() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    @staticmethod
+    async def _execute(session: AsyncSession, operation: Operation, events: List[ChangeEvent]) -> Any:
+        """
+        操作が yield したSQL文をセッションで実行し、操作が返した値を返します
+
+        Args:
+            session (AsyncSession): 実行するセッション
+            operation (Operation): DatabaseBase の操作
+            events (List[ChangeEvent]): 操作が yield した変更イベントを追加するリスト
+        """
+        result = None
+        try:
+            while True:
+                step = operation.send(result)
+                if isinstance(step, ChangeEvent):
+                    events.append(step)
+                    result = None
+                elif isinstance(step, tuple):
+                    result = await session.execute(*step)
+                else:
+                    result = await session.execute(step)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _run(self, operation: Operation) -> Any:
+        """
+        操作を1つのトランザクションで実行し、コミット後に変更イベントを通知します
+
+        Args:
+            operation (Operation): DatabaseBase の操作
+
+        Returns:
+            Any: 操作が返した値
+        """
+        await self.create_table()
+        events: List[ChangeEvent] = []
+        async with self.session_scope() as session:
+            value = await self._execute(session, operation, events)
+        for event in events:
+            self._publish(*event)
+        return value
+
+    async def _write(self, operation: WriteOperation) -> Any:
+        """
+        書き込みをバッファに入れ、コミットされるまで待ちます
+
+        Args:
+            operation (WriteOperation): DatabaseBase の操作を作成する関数。失敗したトランザクションをやり直す場合に再度呼び出されます
+
+        Returns:
+            Any: 操作が返した値
+        """
+        await self.create_table()
+        future = asyncio.get_running_loop().create_future()
+        self._pending_writes.append((operation, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_writes())
+        return await future
+
+    async def _flush_writes(self) -> None:
+        """バッファの書き込みをまとめてコミットし、コミット中に届いた書き込みは次のトランザクションでコミットします"""
+        while self._pending_writes:
+            if self.write_delay > 0:
+                await asyncio.sleep(self.write_delay)
+            batch = self._pending_writes[:WRITE_BATCH_MAX_SIZE]
+            del self._pending_writes[:len(batch)]
+            DB_WRITE_BATCH_SIZE.observe(len(batch))
+
+            try:
+                outcomes = [(result, None) for result in await self._commit_writes([operation for operation, _ in batch])]
+            except Exception as e:
+                if len(batch) == 1:
+                    outcomes = [(None, e)]
+                else:
+                    # 1件の失敗で他の書き込みまで失敗させないよう、1件ずつコミットし直す
+                    logger.warning(f"{len(batch)} 件の書き込みをまとめたコミットに失敗したため、1件ずつやり直します: {e}")
+                    outcomes = []
+                    for operation, _ in batch:
+                        try:
+                            outcomes.append(((await self._commit_writes([operation]))[0], None))
+                        except Exception as error:
+                            outcomes.append((None, error))
+
+            for (_, future), (result, error) in zip(batch, outcomes):
+                if error is None:
+                    value, events = result
+                    for event in events:
+                        self._publish(*event)
+                    if not future.done():
+                        future.set_result(value)
+                elif not future.done():
+                    future.set_exception(error)
+
+    async def _commit_writes(self, operations: List[WriteOperation]) -> List[Tuple[Any, List[ChangeEvent]]]:
+        """書き込みの操作を1つのトランザクションで実行してコミットし、操作ごとに (返した値, 変更イベント) を返します"""
+        outcomes = []
+        async with self.session_scope() as session:
+            for operation in operations:
+                events: List[ChangeEvent] = []
+                outcomes.append((await self._execute(session, operation(), events), events))
+        return outcomes
+
+    @DB_QUERY_SECONDS.time(method="create_table")
+    async def create_table(self, guild_id: Optional[str] = None) -> None:
+        """
+        通知設定テーブルが存在しない場合に作成します
+
+        すべてのギルドで1つのテーブルを共有するため、作成はプロセスごとに1回だけ行います。
+
+        Args:
+            guild_id (Optional[str]): 互換性のための引数で使用しません
+        """
+        if not self.schema_ready:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            self.schema_ready = True
+
+    @DB_QUERY_SECONDS.time(method="set")
+    async def set(self, guild_id: str, channel_id: str, option: str, day: str, week: str,
+                  call_time: str, mention_ids: str, title: str, main_text: str, img: str) -> None:
+        """新しい通知設定を追加します（引数は SQLAlchemyDatabase.set と同じです）"""
+        setting = {"channel_id": channel_id, "option": option, "day": day, "week": week, "call_time": call_time,
+                   "mention_ids": mention_ids, "title": title, "main_text": main_text, "img": img}
+        await self._write(functools.partial(self._set_operation, guild_id, [setting]))
+
+    @DB_QUERY_SECONDS.time(method="set_many")
+    async def set_many(self, guild_id: str, settings: List[Dict[str, str]]) -> int:
+        """
+        複数の通知設定を1つのトランザクションでまとめて追加します
+
+        1件ずつ set を呼び出す場合と異なり、何件追加してもコミットは1回です。
+        """
+        if not settings:
+            return 0
+        return await self._run(self._set_operation(guild_id, settings))
+
+    @DB_QUERY_SECONDS.time(method="get")
+    async def get(self, guild_id: str, id: str) -> Optional[Dict[str, Any]]:
+        """特定の通知設定を取得します"""
+        return await self._run(self._get_operation(guild_id, id))
+
+    @DB_QUERY_SECONDS.time(method="get_all")
+    async def get_all(self, guild_id: str) -> List[Dict[str, Any]]:
+        """ギルドのすべての通知設定を取得します"""
+        return await self._run(self._get_all_operation(guild_id))
+
+    @DB_QUERY_SECONDS.time(method="get_page")
+    async def get_page(self, guild_id: str, limit: int, after_id: Optional[int] = None,
+                       before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """ギルドの通知設定を1ページ分だけ、レコードIDの昇順で取得します"""
+        return await self._run(self._get_page_operation(guild_id, limit, after_id, before_id))
+
+    @DB_QUERY_SECONDS.time(method="count")
+    async def count(self, guild_id: str) -> int:
+        """ギルドの通知設定の件数を取得します"""
+        return await self._run(self._count_operation(guild_id))
+
+    @DB_QUERY_SECONDS.time(method="get_all_by_guild")
+    async def get_all_by_guild(self, guild_ids: Optional[Iterable[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """複数ギルドの通知設定を、ギルドIDごとにまとめて取得します"""
+        return await self._run(self._get_all_by_guild_operation(guild_ids))
+
+    @DB_QUERY_SECONDS.time(method="get_all_by_shards")
+    async def get_all_by_shards(self, shard_count: int, shard_ids: Iterable[int]) -> Dict[str, List[Dict[str, Any]]]:
+        """指定したシャードに属するギルドの通知設定を、ギルドIDごとにまとめて取得します"""
+        return await self._run(self._get_all_by_shards_operation(shard_count, shard_ids))
+
+    @DB_QUERY_SECONDS.time(method="delete")
+    async def delete(self, guild_id: str, id: str) -> None:
+        """通知設定を削除します"""
+        await self._write(functools.partial(self._delete_operation, guild_id, id))
+
+    @DB_QUERY_SECONDS.time(method="get_change_version")
+    async def get_change_version(self) -> int:
+        """
+        最新の変更履歴の version を取得します
+
+        全件読み込みの前に呼び出し、以降は get_changes_since にこの値を渡して差分を同期します。
+        """
+        return await self._run(self._get_change_version_operation())
+
+    @DB_QUERY_SECONDS.time(method="get_changes_since")
+    async def get_changes_since(self, version: int) -> Optional[Tuple[int, List[Tuple[str, str, Dict[str, Any]]]]]:
+        """指定した version より新しい変更を、設定ごとに最新の状態にまとめて取得します"""
+        return await self._run(self._get_changes_since_operation(version))
+
+    @DB_QUERY_SECONDS.time(method="prune_changes")
+    async def prune_changes(self, retention: float) -> int:
+        """保持期間を過ぎた変更履歴を削除します"""
+        return await self._run(self._prune_changes_operation(retention))
+
+    @DB_QUERY_SECONDS.time(method="acquire_lease")
+    async def acquire_lease(self, name: str, holder: str, ttl: float,
+                            checked_until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """リースを取得または更新します"""
+        return await self._run(self._acquire_lease_operation(name, holder, ttl, checked_until))
+
+    @DB_QUERY_SECONDS.time(method="enqueue_notifications")
+    async def enqueue_notifications(self, scope: str, notifications: List[Tuple[str, Dict[str, Any], float]],
+                                    retired: Iterable[Tuple[str, Any]] = (), lease: Optional[Dict[str, Any]] = None,
+                                    checked_until: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        送信時刻に達した通知をアウトボックスに登録します
+
+        登録後に送信に失敗しても、通知はアウトボックスから再送されます。
+        """
+        return await self._run(self._enqueue_notifications_operation(scope, notifications, retired, lease, checked_until))
+
+    @DB_QUERY_SECONDS.time(method="get_due_outbox")
+    async def get_due_outbox(self, scope: str, now: float, limit: int) -> List[Dict[str, Any]]:
+        """再送時刻に達した送信待ちの通知を取得します"""
+        return await self._run(self._get_due_outbox_operation(scope, now, limit))
+
+    @DB_QUERY_SECONDS.time(method="complete_outbox")
+    async def complete_outbox(self, delivered: Iterable[int] = (), retries: Iterable[Tuple[int, float, str]] = (),
+                              failures: Iterable[Tuple[int, str]] = ()) -> None:
+        """送信結果をアウトボックスに1つのトランザクションで記録します"""
+        await self._run(self._complete_outbox_operation(delivered, retries, failures))
+
+    @DB_QUERY_SECONDS.time(method="prune_outbox")
+    async def prune_outbox(self, retention: float) -> int:
+        """保持期間を過ぎた送信済み・送信失敗の通知をアウトボックスから削除します"""
+        return await self._run(self._prune_outbox_operation(retention))
+
+    @DB_QUERY_SECONDS.time(method="get_legacy_tables")
+    async def get_legacy_tables(self) -> Dict[str, str]:
+        """reminders テーブルへ移行していないギルドごとの通知設定テーブルを検索します"""
+        return await self._run(self._get_legacy_tables_operation())
+
+    @DB_QUERY_SECONDS.time(method="update_setting_time")
+    async def update_setting_time(self, guild_id: str, id: str, channel_id: Optional[str] = None,
+                                  option: Optional[str] = None, day: Optional[str] = None,
+                                  week: Optional[str] = None, call_time: Optional[str] = None,
+                                  mention_ids: Optional[str] = None, title: Optional[str] = None,
+                                  main_text: Optional[str] = None, img: Optional[str] = None) -> None:
+        """通知設定を更新します（引数は SQLAlchemyDatabase.update_setting_time と同じです）"""
+        values = {"channel_id": channel_id, "option": option, "day": day, "week": week, "call_time": call_time,
+                  "mention_ids": mention_ids, "title": title, "main_text": main_text, "img": img}
+        await self._write(functools.partial(self._update_operation, guild_id, id, values))
+
+    async def close(self) -> None:
+        """コミット待ちの書き込みをコミットしてから、データベース接続を閉じます"""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.engine.dispose()
+
 # 後方互換性のため
 Database = SQLAlchemyDatabase
+AsyncDatabase = AsyncSQLAlchemyDatabase
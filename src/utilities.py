@@ -1,5 +1,9 @@
-from datetime import datetime
-from typing import List, Dict, Optional, Union, Tuple
+import csv
+import functools
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Dict, Optional, TextIO, Union, Tuple
 import discord
 from discord.app_commands import Choice
 
@@ -14,6 +18,9 @@ FORMAT_WEEK = {
     "sunday": "日",
 }
 
+# Weekday names indexed by datetime.weekday()
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
 # Choices for weekdays in Discord UI
 WEEK_CHOICES = [
     Choice(name="月", value="monday"),
@@ -25,6 +32,9 @@ WEEK_CHOICES = [
     Choice(name="日", value="sunday"),
 ]
 
+# Discord rejects embeds with more fields than this
+EMBED_MAX_FIELDS = 25
+
 def create_embed(color: int, title: str, message: str, img_url: Optional[str] = None) -> discord.Embed:
     """
     Create a Discord embed with the given parameters
@@ -60,9 +70,13 @@ def create_embed_with_fields(color: int, title: str, fields: List[Dict[str, str]
     
     for item in fields:
         field_length = 0
+        # Keep the fields of one item in the same embed when they would exceed the field limit
+        if len(embeds[embed_count].fields) + len(item) > EMBED_MAX_FIELDS and embeds[embed_count].fields:
+            embed_count += 1
+            embeds.append(discord.Embed(title=f"{title}({embed_count + 1})", color=color))
         for name, value in item.items():
             # Check if adding this field would exceed Discord's limit
-            if len(str(value)) + field_length > 800:
+            if len(str(value)) + field_length > 800 or len(embeds[embed_count].fields) >= EMBED_MAX_FIELDS:
                 embed_count += 1
                 field_length = 0
                 embeds.append(discord.Embed(title=f"{title}({embed_count + 1})", color=color))
@@ -141,12 +155,14 @@ def get_day_of_week(date: datetime) -> str:
     Returns:
         str: Day of week (monday, tuesday, etc.)
     """
-    days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-    return days[date.weekday()]
+    return WEEKDAYS[date.weekday()]
 
 def should_send_notification(setting: Dict[str, str], current_time: datetime) -> bool:
     """
     Check if a notification should be sent based on the current time
+
+    Compatibility wrapper around ScheduleRule.matches. Compiled rules are cached by the
+    schedule fields, but hot paths should still compile settings once with compile_setting.
     
     Args:
         setting: The notification setting
@@ -155,99 +171,467 @@ def should_send_notification(setting: Dict[str, str], current_time: datetime) ->
     Returns:
         bool: True if notification should be sent, False otherwise
     """
+    rule = _compile_cached(setting["option"], setting["day"], setting["week"], setting["call_time"])
+    return rule is not None and rule.matches(current_time)
+
+# Kinds of compiled schedule rules
+RULE_DAY = 0
+RULE_WEEK = 1
+RULE_MONTH_DAY = 2
+RULE_MONTH_WEEKDAY = 3
+RULE_ONEDAY = 4
+
+class ScheduleRule:
+    """
+    Schedule of a notification setting with every field pre-parsed to integers
+
+    Settings are compiled once when loaded so that checking a minute only compares integers
+    instead of parsing the stored strings again.
+    """
+    __slots__ = ("kind", "hour", "minute", "second", "weekday", "day", "nth", "month")
+
+    def __init__(self, kind: int, hour: int, minute: int, second: int,
+                 weekday: int = -1, day: int = 0, nth: int = 0, month: int = 0):
+        """
+        Args:
+            kind: One of the RULE_* constants
+            hour: Hour of the notification time
+            minute: Minute of the notification time
+            second: Second of the notification time
+            weekday: Weekday index (0 = Monday) for weekly and nth-weekday rules
+            day: Day of month for monthly and one-time rules
+            nth: Weekday occurrence for nth-weekday rules
+            month: Month for one-time rules
+        """
+        self.kind = kind
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        self.weekday = weekday
+        self.day = day
+        self.nth = nth
+        self.month = month
+
+    def matches_date(self, date: datetime) -> bool:
+        """
+        Check if the rule fires on the given date, ignoring the time of day
+
+        Args:
+            date: Date to check
+
+        Returns:
+            bool: True if the rule fires on that date
+        """
+        kind = self.kind
+        if kind == RULE_DAY:
+            return True
+        elif kind == RULE_WEEK:
+            return date.weekday() == self.weekday
+        elif kind == RULE_MONTH_DAY:
+            return date.day == self.day
+        elif kind == RULE_MONTH_WEEKDAY:
+            weekday = date.weekday()
+            if weekday != self.weekday:
+                return False
+            # Occurrence of the weekday in the month, counting the first one on or after day 1 as 1
+            first_weekday_offset = int((weekday - date.day + 1) % 7 == self.weekday)
+            occurrence = (date.day + (6 if first_weekday_offset else 0)) // 7 + first_weekday_offset
+            return occurrence == self.nth
+        elif kind == RULE_ONEDAY:
+            return date.month == self.month and date.day == self.day
+        return False
+
+    def matches(self, now: datetime) -> bool:
+        """
+        Check if a notification should be sent in the minute of the given time
+
+        Args:
+            now: The current datetime
+
+        Returns:
+            bool: True if notification should be sent, False otherwise
+        """
+        return now.minute == self.minute and now.hour == self.hour and self.matches_date(now)
+
+    def next_time(self, after: datetime) -> Optional[datetime]:
+        """
+        Compute the first minute at or after the given time in which the rule fires
+
+        Args:
+            after: Earliest datetime to consider (seconds are ignored)
+
+        Returns:
+            Optional[datetime]: Start of the next matching minute, or None if the rule never fires
+        """
+        # First candidate: today at the notification minute, or tomorrow if that has already passed
+        base = after.replace(second=0, microsecond=0)
+        first = base.replace(hour=self.hour, minute=self.minute)
+        if first < base:
+            first += timedelta(days=1)
+
+        kind = self.kind
+        if kind == RULE_DAY:
+            return first
+        elif kind == RULE_WEEK:
+            return first + timedelta(days=(self.weekday - first.weekday()) % 7)
+        elif kind == RULE_ONEDAY:
+            for year in (first.year, first.year + 1):
+                try:
+                    candidate = first.replace(year=year, month=self.month, day=self.day)
+                except ValueError:
+                    continue
+                if candidate >= first:
+                    return candidate
+            return None
+
+        # Monthly rules: check each month for up to two years
+        year, month = first.year, first.month
+        for _ in range(25):
+            month_start = first.replace(year=year, month=month, day=1)
+            if kind == RULE_MONTH_WEEKDAY:
+                # Only the days with the requested weekday can match
+                candidate_days = range(1 + (self.weekday - month_start.weekday()) % 7, 32, 7)
+            else:
+                candidate_days = (self.day,)
+
+            for candidate_day in candidate_days:
+                try:
+                    candidate = month_start.replace(day=candidate_day)
+                except ValueError:
+                    continue
+                if candidate >= first and self.matches_date(candidate):
+                    return candidate
+
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        return None
+
+    def next_fire_time(self, after: datetime) -> Optional[datetime]:
+        """
+        Compute the first exact send time, including the stored second, at or after the given time
+
+        Args:
+            after: Earliest datetime to consider
+
+        Returns:
+            Optional[datetime]: The next send time, or None if the rule never fires
+        """
+        start = self.next_time(after)
+        if start is None:
+            return None
+        fire = start + timedelta(seconds=self.second)
+        if fire < after:
+            # The matching minute is the current one but its second has already passed
+            start = self.next_time(start + timedelta(minutes=1))
+            fire = start + timedelta(seconds=self.second) if start is not None else None
+        return fire
+
+def compile_setting(setting: Dict[str, str]) -> Optional[ScheduleRule]:
+    """
+    Parse a notification setting into a ScheduleRule
+
+    Args:
+        setting: The notification setting
+
+    Returns:
+        Optional[ScheduleRule]: The compiled rule, or None if the setting can never fire
+    """
     option = setting["option"]
     day = setting["day"]
     week = setting["week"]
-    call_time = setting["call_time"]
-    
-    # Convert call_time string to time object
+
     try:
-        time_parts = call_time.split(':')
+        time_parts = setting["call_time"].split(':')
         notification_time = datetime.strptime(f"{time_parts[0]}:{time_parts[1]}:{time_parts[2]}", "%H:%M:%S").time()
-    except (ValueError, IndexError):
-        return False
-    
-    # Check if current time matches notification time (within the same minute)
-    current_minute = current_time.strftime("%H:%M")
-    notification_minute = f"{notification_time.hour:02d}:{notification_time.minute:02d}"
-    
-    if current_minute != notification_minute:
-        return False
-    
-    # Check specific conditions based on notification type
-    if option == "day":
-        # Daily notification - always send if time matches
-        return True
-    
-    elif option == "week":
-        # Weekly notification - check day of week
-        current_day_of_week = get_day_of_week(current_time)
-        return week == current_day_of_week
-    
-    elif option == "month":
-        return _check_monthly_notification(day, week, current_time)
-    
-    elif option == "oneday":
-        return _check_onetime_notification(day, current_time)
-    
-    return False
+    except (ValueError, IndexError, AttributeError):
+        return None
+    hour, minute, second = notification_time.hour, notification_time.minute, notification_time.second
+
+    try:
+        if option == "day":
+            return ScheduleRule(RULE_DAY, hour, minute, second)
+
+        elif option == "week":
+            if week not in WEEKDAYS:
+                return None
+            return ScheduleRule(RULE_WEEK, hour, minute, second, weekday=WEEKDAYS.index(week))
+
+        elif option == "month":
+            if week and week != "None":
+                if week not in WEEKDAYS:
+                    return None
+                return ScheduleRule(RULE_MONTH_WEEKDAY, hour, minute, second,
+                                    weekday=WEEKDAYS.index(week), nth=int(day))
+            return ScheduleRule(RULE_MONTH_DAY, hour, minute, second, day=int(day))
+
+        elif option == "oneday":
+            target_date = datetime.strptime(day, "%m/%d")
+            return ScheduleRule(RULE_ONEDAY, hour, minute, second, day=target_date.day, month=target_date.month)
+    except (ValueError, TypeError):
+        return None
 
-def _check_monthly_notification(day: str, week: str, current_time: datetime) -> bool:
+    return None
+
+@functools.lru_cache(maxsize=4096)
+def _compile_cached(option: str, day: str, week: str, call_time: str) -> Optional[ScheduleRule]:
     """
-    Check if a monthly notification should be sent
-    
+    Compile the schedule fields of a setting, reusing the rule for repeated schedules
+
     Args:
+        option: Notification option
         day: Day setting
         week: Week setting
-        current_time: Current datetime
-        
+        call_time: Notification time
+
     Returns:
-        bool: True if notification should be sent, False otherwise
+        Optional[ScheduleRule]: The compiled rule, or None if the setting can never fire
+    """
+    return compile_setting({"option": option, "day": day, "week": week, "call_time": call_time})
+
+def get_next_notification_time(setting: Dict[str, str], after: datetime) -> Optional[datetime]:
     """
-    if week and week != "None":
-        # Monthly on nth weekday (e.g., 2nd Monday)
+    Compute the first minute at or after the given time in which a notification should be sent
+
+    The result follows the same rules as should_send_notification, so a setting fires
+    in exactly the minutes for which should_send_notification returns True.
+
+    Args:
+        setting: The notification setting
+        after: Earliest datetime to consider (seconds are ignored)
+
+    Returns:
+        Optional[datetime]: Start of the next matching minute, or None if the setting never fires
+    """
+    rule = compile_setting(setting)
+    return rule.next_time(after) if rule is not None else None
+
+def shard_id_for_guild(guild_id: Union[str, int], shard_count: int) -> int:
+    """
+    Get the shard that receives the events of a guild, using Discord's sharding formula
+
+    Args:
+        guild_id: Discord guild ID
+        shard_count: Total number of shards
+
+    Returns:
+        int: Shard ID of the guild
+    """
+    return (int(guild_id) >> 22) % shard_count
+
+def parse_shard_ids(value: str, shard_count: int) -> Optional[List[int]]:
+    """
+    Parse a shard ID list such as "0,2,4-7"
+
+    Args:
+        value: Comma separated shard IDs or inclusive ranges
+        shard_count: Total number of shards
+
+    Returns:
+        Optional[List[int]]: Sorted shard IDs, or None if the value is empty (all shards)
+
+    Raises:
+        ValueError: If the value is malformed or a shard ID is outside 0..shard_count-1
+    """
+    if not value.strip():
+        return None
+
+    shard_ids = set()
+    for part in value.split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = (int(bound) for bound in part.split('-', 1))
+            shard_ids.update(range(first, last + 1))
+        else:
+            shard_ids.add(int(part))
+
+    invalid = [shard_id for shard_id in shard_ids if not 0 <= shard_id < shard_count]
+    if invalid or not shard_ids:
+        raise ValueError(f"Shard IDs must be between 0 and {shard_count - 1}: {value}")
+    return sorted(shard_ids)
+
+# Columns of an imported or exported reminder file
+SETTING_FIELDS = ["channel_id", "option", "day", "week", "call_time", "mention_ids", "title", "main_text", "img"]
+
+# Default values used by the creation commands
+DEFAULT_TITLE = "おしらせ"
+DEFAULT_MAIN_TEXT = "時間です"
+
+def _optional_field(value: Any) -> str:
+    """Normalize an empty or missing optional field to the stored "None" string"""
+    if value is None:
+        return "None"
+    value = str(value).strip()
+    return value if value else "None"
+
+def validate_setting(row: Dict[str, Any], default_channel_id: Optional[str] = None) -> Dict[str, str]:
+    """
+    Validate and normalize one imported reminder with the same rules as the creation commands
+
+    Args:
+        row: Reminder fields (see SETTING_FIELDS)
+        default_channel_id: Channel used when the row has no channel_id
+
+    Returns:
+        Dict[str, str]: The reminder ready to be stored (without guild_id and id)
+
+    Raises:
+        ValueError: If a field is missing or invalid (the message is shown to the user)
+    """
+    option = str(row.get("option") or "").strip()
+    channel_id = str(row.get("channel_id") or "").strip() or default_channel_id
+    if not channel_id or not channel_id.isdigit():
+        raise ValueError("channel_id はチャンネルIDの数字で指定してください")
+
+    try:
+        call_time = str(datetime.strptime(str(row.get("call_time") or "").strip(), '%H:%M:%S').time())
+    except ValueError:
+        raise ValueError("call_time は hh:mm:ss の形式で指定してください")
+
+    day = _optional_field(row.get("day"))
+    week = _optional_field(row.get("week"))
+    if option == "day":
+        day, week = "None", "None"
+    elif option == "week":
+        if week not in WEEKDAYS:
+            raise ValueError(f"week は {', '.join(WEEKDAYS)} のいずれかで指定してください")
+        day = "None"
+    elif option == "month":
+        if week != "None" and week not in WEEKDAYS:
+            raise ValueError(f"week は {', '.join(WEEKDAYS)} のいずれかで指定してください")
+        limit = 5 if week != "None" else 31
+        if not day.isdigit() or not 1 <= int(day) <= limit:
+            raise ValueError(f"day は 1 から {limit} の数字で指定してください")
+        day = str(int(day))
+    elif option == "oneday":
         try:
-            target_day = int(day)
-            current_day_of_week = get_day_of_week(current_time)
-            
-            # Check if today is the right weekday
-            if current_day_of_week != week:
-                return False
-            
-            # Calculate which occurrence of this weekday in the month
-            first_day = current_time.replace(day=1)
-            first_weekday_offset = (get_day_of_week(first_day) == week)
-            day_in_month = current_time.day
-            occurrence = (day_in_month + (6 if first_weekday_offset else 0)) // 7 + first_weekday_offset
-            
-            return occurrence == target_day
-        except (ValueError, TypeError):
-            return False
+            month, day_of_month = (int(part) for part in day.split("/"))
+        except ValueError:
+            raise ValueError("day は mm/dd の形式で指定してください")
+        if not (1 <= month <= 12 and 1 <= day_of_month <= 31):
+            raise ValueError("day は mm/dd の形式で指定してください")
+        week = "None"
     else:
-        # Monthly on specific day
-        try:
-            target_day = int(day)
-            return current_time.day == target_day
-        except (ValueError, TypeError):
-            return False
+        raise ValueError("option は day, week, month, oneday のいずれかで指定してください")
+
+    mention_ids = _optional_field(row.get("mention_ids"))
+    if mention_ids != "None" and not mention_ids.isdigit():
+        raise ValueError("mention_ids はロールIDの数字で指定してください")
+
+    setting = {
+        "channel_id": channel_id,
+        "option": option,
+        "day": day,
+        "week": week,
+        "call_time": call_time,
+        "mention_ids": mention_ids,
+        "title": str(row.get("title") or "").strip() or DEFAULT_TITLE,
+        "main_text": str(row.get("main_text") or "") or DEFAULT_MAIN_TEXT,
+        "img": _optional_field(row.get("img")),
+    }
+    if compile_setting(setting) is None:
+        raise ValueError("日付、時間の形式が間違えています")
+    return setting
 
-def _check_onetime_notification(day: str, current_time: datetime) -> bool:
+def load_settings_file(data: bytes, filename: str, default_channel_id: Optional[str] = None,
+                       max_rows: Optional[int] = None) -> Tuple[List[Dict[str, str]], List[str]]:
     """
-    Check if a one-time notification should be sent
-    
+    Parse and validate every reminder in an uploaded CSV or JSON file before anything is stored
+
+    CSV files need a header row with the SETTING_FIELDS columns. JSON files hold an array of
+    objects with the same keys. The format is chosen by the file extension, or by the content
+    when the extension is neither .csv nor .json.
+
     Args:
-        day: Day setting (mm/dd format)
-        current_time: Current datetime
-        
+        data: Raw file content (UTF-8, with or without a BOM)
+        filename: Name of the uploaded file
+        default_channel_id: Channel used for rows without a channel_id
+        max_rows: Maximum number of reminders accepted
+
     Returns:
-        bool: True if notification should be sent, False otherwise
+        Tuple[List[Dict[str, str]], List[str]]: Valid reminders and an error message per invalid row.
+        Nothing should be stored unless the error list is empty.
     """
     try:
-        target_date = datetime.strptime(day, "%m/%d").replace(year=current_time.year)
-        # If the date has already passed this year, try next year
-        if target_date.date() < current_time.date():
-            target_date = target_date.replace(year=current_time.year + 1)
-        
-        return target_date.date() == current_time.date()
-    except (ValueError, TypeError):
-        return False
\ No newline at end of file
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return [], ["ファイルは UTF-8 で保存してください"]
+
+    name = filename.lower()
+    is_json = name.endswith(".json") or (not name.endswith(".csv") and text.lstrip().startswith("["))
+    if is_json:
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            return [], [f"JSONの形式が正しくありません: {e}"]
+        if not isinstance(rows, list):
+            return [], ["JSONは通知設定のオブジェクトの配列にしてください"]
+        # JSON は1件目から数える
+        numbered = enumerate(rows, start=1)
+        label = "{}件目"
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [field for field in ("option", "call_time") if field not in (reader.fieldnames or [])]
+        if missing:
+            return [], [f"CSVのヘッダーに {', '.join(missing)} の列がありません"]
+        # CSV はヘッダーを1行目として数える
+        numbered = enumerate(reader, start=2)
+        label = "{}行目"
+
+    settings = []
+    errors = []
+    for number, row in numbered:
+        if max_rows is not None and len(settings) + len(errors) >= max_rows:
+            errors.append(f"一度に取り込める通知は {max_rows} 件までです")
+            break
+        if not isinstance(row, dict):
+            errors.append(f"{label.format(number)}: 通知設定はオブジェクトで指定してください")
+            continue
+        try:
+            settings.append(validate_setting(row, default_channel_id))
+        except ValueError as e:
+            errors.append(f"{label.format(number)}: {e}")
+    return settings, errors
+
+class SettingsWriter:
+    """
+    Incrementally write reminders as CSV or as a JSON array
+
+    Reminders can be written in several batches (for example one database page at a time), so the
+    whole list never has to be held in memory.
+    """
+    def __init__(self, fp: TextIO, file_format: str = "csv"):
+        """
+        Args:
+            fp: Text stream to write to
+            file_format: "csv" or "json"
+        """
+        if file_format not in ("csv", "json"):
+            raise ValueError(f"Unsupported file format: {file_format}")
+        self.fp = fp
+        self.file_format = file_format
+        self.count = 0
+        if file_format == "csv":
+            self._writer = csv.DictWriter(fp, fieldnames=["id"] + SETTING_FIELDS, extrasaction="ignore")
+            self._writer.writeheader()
+        else:
+            fp.write("[")
+
+    def write(self, settings: Iterable[Dict[str, Any]]) -> None:
+        """
+        Write a batch of reminders
+
+        Args:
+            settings: Reminders as returned by the database
+        """
+        for setting in settings:
+            if self.file_format == "csv":
+                self._writer.writerow(setting)
+            else:
+                entry = {field: setting[field] for field in ["id"] + SETTING_FIELDS}
+                self.fp.write(("\n  " if self.count == 0 else ",\n  ") + json.dumps(entry, ensure_ascii=False))
+            self.count += 1
+
+    def close(self) -> None:
+        """Finish the file (closes the JSON array)"""
+        if self.file_format == "json":
+            self.fp.write("\n]\n" if self.count else "]\n")
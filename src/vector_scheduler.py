@@ -0,0 +1,217 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.utilities import (
+    RULE_DAY, RULE_MONTH_DAY, RULE_MONTH_WEEKDAY, RULE_ONEDAY, RULE_WEEK, compile_setting
+)
+
+# 各列のデータ型
+_COLUMNS = {
+    "kind": np.int8,
+    "hour": np.int8,
+    "minute": np.int8,
+    "second": np.int8,
+    "weekday": np.int8,
+    "day": np.int16,
+    "nth": np.int16,
+    "month": np.int8,
+}
+
+class VectorizedScheduler:
+    """
+    コンパイル済みのスケジュールを列ごとのNumPy配列で保持し、1分ごとの送信判定を
+    1回のブールマスク計算で行うスケジューラ
+
+    NotificationScheduler と同じAPIを持ち、大量の通知設定を扱う場合の代替バックエンドとして使用します。
+    分単位の判定結果は should_send_notification と同じで、秒は送信時刻の範囲で絞り込みます。
+    同じ分の中で何度も呼び出されるため、分ごとのマスクは設定が変更されるまで再利用します。
+    """
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity (int): 配列の初期容量
+        """
+        self._allocate(capacity)
+        self._rows = {}  # (ギルドID, 設定ID) -> 行番号
+        self._free_rows: List[int] = []  # 削除されて再利用できる行番号
+        self._size = 0  # 使用済みの行数
+        self._mask_cache: Optional[Tuple[datetime, np.ndarray]] = None  # (分の開始時刻, その分のマスク)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _allocate(self, capacity: int) -> None:
+        """指定した容量の空の配列を確保します"""
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _COLUMNS.items()}
+        self._active = np.zeros(capacity, dtype=bool)
+        self._items: List[Optional[Tuple[str, Dict[str, Any]]]] = [None] * capacity
+
+    def _grow(self) -> None:
+        """配列の容量を2倍に拡張します"""
+        capacity = len(self._active) * 2
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            self._columns[name] = grown
+        active = np.zeros(capacity, dtype=bool)
+        active[:len(self._active)] = self._active
+        self._active = active
+        self._items.extend([None] * (capacity - len(self._items)))
+
+    def rebuild(self, settings_cache: Dict[str, List[Dict[str, Any]]], after: datetime,
+                fire_times: Optional[Dict[Tuple[str, int], float]] = None) -> None:
+        """
+        設定キャッシュ全体から配列を作り直します
+
+        Args:
+            settings_cache (Dict[str, List[Dict[str, Any]]]): ギルドIDごとの通知設定
+            after (datetime): NotificationScheduler との互換性のための引数（判定は毎分行うため使用しません）
+            fire_times (Optional[Dict[Tuple[str, int], float]]): NotificationScheduler との互換性のための引数
+                （送信時刻を保持しないため使用しません）
+        """
+        values = {name: [] for name in _COLUMNS}
+        items = []
+        for guild_id, settings in settings_cache.items():
+            for setting in settings:
+                rule = compile_setting(setting)
+                if rule is None:
+                    continue
+                for name in _COLUMNS:
+                    values[name].append(getattr(rule, name))
+                items.append((guild_id, setting))
+
+        self._allocate(max(1024, len(items)))
+        for name, dtype in _COLUMNS.items():
+            self._columns[name][:len(items)] = np.array(values[name], dtype=dtype)
+        self._active[:len(items)] = True
+        self._items[:len(items)] = items
+        self._rows = {(guild_id, int(setting["id"])): row for row, (guild_id, setting) in enumerate(items)}
+        self._free_rows = []
+        self._size = len(items)
+        self._mask_cache = None
+
+    def add(self, guild_id: str, setting: Dict[str, Any], after: datetime) -> None:
+        """
+        通知設定を追加します。同じIDの設定が既にある場合は置き換えます
+
+        Args:
+            guild_id (str): DiscordギルドID
+            setting (Dict[str, Any]): 通知設定
+            after (datetime): NotificationScheduler との互換性のための引数（判定は毎分行うため使用しません）
+        """
+        self.remove(guild_id, setting["id"])
+        rule = compile_setting(setting)
+        if rule is None:
+            return
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            if self._size == len(self._active):
+                self._grow()
+            row = self._size
+            self._size += 1
+
+        for name, column in self._columns.items():
+            column[row] = getattr(rule, name)
+        self._active[row] = True
+        self._items[row] = (guild_id, setting)
+        self._rows[(guild_id, int(setting["id"]))] = row
+        self._mask_cache = None
+
+    def fire_times(self) -> Dict[Tuple[str, int], float]:
+        """
+        NotificationScheduler との互換性のためのメソッドです。送信時刻を保持しないため空の辞書を返します
+
+        Returns:
+            Dict[Tuple[str, int], float]: 空の辞書
+        """
+        return {}
+
+    def remove(self, guild_id: str, setting_id: Any) -> None:
+        """
+        通知設定を削除します
+
+        Args:
+            guild_id (str): DiscordギルドID
+            setting_id (Any): 設定ID
+        """
+        row = self._rows.pop((guild_id, int(setting_id)), None)
+        if row is not None:
+            self._active[row] = False
+            self._items[row] = None
+            self._free_rows.append(row)
+            self._mask_cache = None
+
+    def due_mask(self, now: datetime) -> np.ndarray:
+        """
+        現在の分に送信すべき行を示すブールマスクを計算します
+
+        Args:
+            now (datetime): 現在時刻
+
+        Returns:
+            np.ndarray: 使用済みの各行について送信すべきかどうか
+        """
+        size = self._size
+        c = {name: column[:size] for name, column in self._columns.items()}
+        kind = c["kind"]
+        weekday = now.weekday()
+
+        # 第n曜日の判定は現在日付だけで決まるため、ScheduleRule.matches_date と同じ計算をスカラーで行う
+        first_weekday_offset = int((now.day - 1) % 7 == 0)
+        occurrence = (now.day + (6 if first_weekday_offset else 0)) // 7 + first_weekday_offset
+
+        date_mask = (
+            (kind == RULE_DAY)
+            | ((kind == RULE_WEEK) & (c["weekday"] == weekday))
+            | ((kind == RULE_MONTH_DAY) & (c["day"] == now.day))
+            | ((kind == RULE_MONTH_WEEKDAY) & (c["weekday"] == weekday) & (c["nth"] == occurrence))
+            | ((kind == RULE_ONEDAY) & (c["month"] == now.month) & (c["day"] == now.day))
+        )
+        return self._active[:size] & (c["hour"] == now.hour) & (c["minute"] == now.minute) & date_mask
+
+    def _minute_mask(self, minute: datetime) -> np.ndarray:
+        """分のマスクを計算します。直前と同じ分で設定に変更がなければ前回の結果を返します"""
+        if self._mask_cache is not None and self._mask_cache[0] == minute:
+            return self._mask_cache[1]
+        mask = self.due_mask(minute)
+        self._mask_cache = (minute, mask)
+        return mask
+
+    def pop_due(self, now: datetime, since: Optional[datetime] = None) -> List[Tuple[str, Dict[str, Any], datetime]]:
+        """
+        送信時刻が since 以上 now 以下の通知設定を取り出します。送信された1回限りの通知は削除します
+
+        Args:
+            now (datetime): 現在時刻（秒未満は切り捨てます）
+            since (Optional[datetime]): 送信対象とする最も早い送信時刻（省略時は now の分の開始時刻）
+
+        Returns:
+            List[Tuple[str, Dict[str, Any], datetime]]: 送信時刻順の (ギルドID, 設定, 送信時刻) のリスト
+        """
+        now = now.replace(microsecond=0)
+        if since is None:
+            since = now.replace(second=0)
+        last_minute = now.replace(second=0)
+        minute = since.replace(second=0, microsecond=0)
+
+        due = []
+        while minute <= last_minute:
+            first_second = since.second if minute == since.replace(second=0, microsecond=0) else 0
+            last_second = now.second if minute == last_minute else 59
+            mask = self._minute_mask(minute)
+            seconds = self._columns["second"][:len(mask)]
+            rows = np.flatnonzero(mask & (seconds >= first_second) & (seconds <= last_second))
+            for row in rows[np.argsort(seconds[rows], kind="stable")]:
+                guild_id, setting = self._items[row]
+                due.append((guild_id, setting, minute + timedelta(seconds=int(seconds[row]))))
+            minute += timedelta(minutes=1)
+
+        # 1回限りの通知は送信後に削除されるため登録から外す
+        for guild_id, setting, _ in due:
+            if setting["option"] == "oneday":
+                self.remove(guild_id, setting["id"])
+        return due
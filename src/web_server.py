@@ -1,6 +1,9 @@
 import os
+import sys
 import threading
-from flask import Flask
+from flask import Flask, Response
+
+from src.metrics import REGISTRY
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -13,7 +16,18 @@ def home():
 # Define route for health check
 @app.route('/health')
 def health():
-    return "OK", 200
+    # main.py starts this server before importing the bot, and the import does not return while
+    # the bot runs, so look the module up on each request instead of importing it
+    bot = sys.modules.get('src.discord_bot')
+    if bot is None or not hasattr(bot, 'loop_health'):
+        return "STARTING", 503
+    healthy, body = bot.loop_health()
+    return body, 200 if healthy else 503
+
+# Define route for Prometheus metrics
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # Function to run the web server
 def run_web_server():
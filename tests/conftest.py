@@ -0,0 +1,67 @@
+import pytest
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(tmp_path, monkeypatch):
+    """Run each test in its own directory so the ./db files it creates do not leak into other tests"""
+    monkeypatch.chdir(tmp_path)
+
+class FakeClock:
+    """Stand-in for the time module with a clock that only moves when the test advances it"""
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake clock used by the lease queries and the leader elector"""
+    import src.leader
+    import src.sqlalchemy_models
+
+    fake = FakeClock()
+    monkeypatch.setattr(src.sqlalchemy_models, "time", fake)
+    monkeypatch.setattr(src.leader, "time", fake)
+    return fake
+
+@pytest.fixture(scope="session")
+def bot_module(tmp_path_factory):
+    """The bot module, imported without connecting to Discord (it calls client.run at import time)"""
+    import sys
+
+    import discord
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("TOKEN", "test-token")
+        patch.setenv("LOG_DIR", str(tmp_path_factory.mktemp("logs")))
+        patch.setattr(discord.Client, "run", lambda self, *args, **kwargs: None)
+        patch.setattr(discord.AutoShardedClient, "run", lambda self, *args, **kwargs: None)
+        sys.modules.pop("src.discord_bot", None)
+        import src.discord_bot
+    return src.discord_bot
+
+@pytest.fixture
+def bot(bot_module, monkeypatch):
+    """The bot module with a fresh database, settings cache and scheduler for each test"""
+    import asyncio
+
+    from src.scheduler import create_scheduler
+    from src.sqlalchemy_models import AsyncSQLAlchemyDatabase
+
+    db = AsyncSQLAlchemyDatabase("Bot", write_delay=0)
+    db.add_listener(bot_module.on_setting_changed)
+    state = {
+        "db": db, "settings_cache": {}, "scheduler": create_scheduler("heap"), "cache_loaded": False,
+        "pending_changes": None, "cache_version": 0, "last_checked_second": None, "completed_second": None,
+        "outbox_in_flight": set(), "outbox_lock": asyncio.Lock(), "elector": None, "prepared_token": None,
+    }
+    for name, value in state.items():
+        monkeypatch.setattr(bot_module, name, value)
+    bot_module.payload_cache.clear()
+    return bot_module
@@ -0,0 +1,53 @@
+"""Catching up on notifications after the loop stalls"""
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import timezone
+
+from src.metrics import MISSED_SECONDS
+from src.scheduler import create_scheduler
+
+TOKYO = timezone("Asia/Tokyo")
+STALLED_AT = TOKYO.localize(datetime(2024, 3, 1, 10, 0, 0))
+
+def make_setting(id, call_time):
+    return {"id": id, "channel_id": "10", "option": "day", "day": "None", "week": "None", "call_time": call_time,
+            "mention_ids": "None", "title": "t", "main_text": "m", "img": "None"}
+
+SETTINGS = {"1": [make_setting(1, "10:02:00"), make_setting(2, "10:07:30"), make_setting(3, "10:15:00"),
+                  make_setting(4, "10:16:00")]}
+
+@pytest.mark.parametrize("backend", ["heap", "numpy"])
+def test_gap_longer_than_cap_is_cut_and_recorded(bot, monkeypatch, backend):
+    monkeypatch.setattr(bot, "CATCHUP_MAX_MINUTES", 10)
+    monkeypatch.setattr(bot, "last_checked_second", STALLED_AT)
+    scheduler = create_scheduler(backend)
+    scheduler.rebuild(SETTINGS, STALLED_AT + timedelta(seconds=1))
+
+    # The loop comes back 15 minutes later: only the last 10 minutes are sent
+    now = STALLED_AT + timedelta(minutes=15)
+    since = bot.next_unchecked_second(now)
+    assert since == now - timedelta(minutes=10)
+
+    missed = MISSED_SECONDS.get()
+    bot.record_missed_window(since)
+    assert MISSED_SECONDS.get() - missed == 5 * 60 - 1
+
+    due = scheduler.pop_due(now, since)
+    assert [(setting["id"], fire_time) for _, setting, fire_time in due] == [
+        (2, STALLED_AT + timedelta(minutes=7, seconds=30)), (3, now)]
+
+def test_short_gap_is_fully_caught_up(bot, monkeypatch):
+    monkeypatch.setattr(bot, "CATCHUP_MAX_MINUTES", 10)
+    monkeypatch.setattr(bot, "last_checked_second", STALLED_AT)
+    scheduler = create_scheduler("heap")
+    scheduler.rebuild(SETTINGS, STALLED_AT + timedelta(seconds=1))
+
+    now = STALLED_AT + timedelta(minutes=8)
+    since = bot.next_unchecked_second(now)
+    assert since == STALLED_AT + timedelta(seconds=1)
+
+    missed = MISSED_SECONDS.get()
+    bot.record_missed_window(since)
+    assert MISSED_SECONDS.get() == missed
+    assert [setting["id"] for _, setting, _ in scheduler.pop_due(now, since)] == [1, 2]
@@ -0,0 +1,102 @@
+"""Delta sync of the settings cache from the change log"""
+import asyncio
+
+from src.sqlalchemy_models import AsyncSQLAlchemyDatabase, SQLAlchemyDatabase
+
+def setting_args(title, option="day"):
+    return {"channel_id": "10", "option": option, "day": "None", "week": "None", "call_time": "09:00:00",
+            "mention_ids": "None", "title": title, "main_text": "m", "img": "None"}
+
+def test_changes_collapse_to_latest_state():
+    db = SQLAlchemyDatabase("Changes")
+    db.set("1", **setting_args("a"))
+    db.set("1", **setting_args("b"))
+    first, second = [setting["id"] for setting in db.get_all("1")]
+    db.update_setting_time("1", first, title="a2")
+    db.update_setting_time("1", first, title="a3")
+    db.delete("1", second)
+    db.set("2", **setting_args("c"))
+    third = db.get_all("2")[0]["id"]
+
+    version, events = db.get_changes_since(0)
+    assert version == db.get_change_version() == 6
+    # One event per setting with its current row, in the order of the last change
+    assert [(event, guild_id, setting["id"]) for event, guild_id, setting in events] == [
+        ("update", "1", first), ("delete", "1", second), ("set", "2", third)]
+    assert events[0][2]["title"] == "a3"
+
+    # A setting added and removed since the last sync only needs to be removed
+    db.set("1", **setting_args("d"))
+    fourth = db.get_all("1")[-1]["id"]
+    db.delete("1", fourth)
+    assert db.get_changes_since(version) == (8, [("delete", "1", {"id": fourth})])
+    assert db.get_changes_since(8) == (8, [])
+
+def test_pruned_history_requires_full_reload(clock):
+    db = SQLAlchemyDatabase("Prune")
+    db.set("1", **setting_args("a"))
+    setting_id = db.get_all("1")[0]["id"]
+    clock.advance(100)
+    db.update_setting_time("1", setting_id, title="b")
+
+    assert db.prune_changes(50) == 1
+    # A cache at version 0 has missed the pruned change and cannot be patched
+    assert db.get_changes_since(0) is None
+    assert db.get_changes_since(1) == (2, [("update", "1", db.get("1", setting_id))])
+
+    # The latest change is kept so the gap stays detectable
+    clock.advance(1000)
+    assert db.prune_changes(50) == 0
+    assert db.get_change_version() == 2
+
+def test_sync_changes_applies_other_process_writes(bot):
+    async def scenario():
+        await bot.db.set("1", **setting_args("a"))
+        await bot.update_settings_cache()
+        [setting_id] = bot.settings_cache["1"]
+
+        # Another process writes to the same database; its events never reach this process's listener
+        other = AsyncSQLAlchemyDatabase("Bot")
+        await other.update_setting_time("1", setting_id, title="changed")
+        await other.set("2", **setting_args("new"))
+        await bot.sync_changes()
+        synced = {guild_id: {id: setting["title"] for id, setting in settings.items()}
+                  for guild_id, settings in bot.settings_cache.items()}
+        scheduled = set(bot.scheduler.fire_times())
+
+        await other.delete("1", setting_id)
+        await bot.sync_changes()
+        await other.close()
+        return setting_id, synced, scheduled, bot.settings_cache, set(bot.scheduler.fire_times())
+
+    setting_id, synced, scheduled, cache, scheduled_after_delete = asyncio.run(scenario())
+    new_id = setting_id + 1
+    assert synced == {"1": {setting_id: "changed"}, "2": {new_id: "new"}}
+    assert scheduled == {("1", setting_id), ("2", new_id)}
+    assert list(cache) == ["2"] and scheduled_after_delete == {("2", new_id)}
+
+def test_sync_changes_reloads_after_pruned_gap(bot, monkeypatch):
+    async def scenario():
+        await bot.db.set("1", **setting_args("a"))
+        await bot.update_settings_cache()
+
+        other = AsyncSQLAlchemyDatabase("Bot")
+        await other.set("1", **setting_args("b"))
+        await other.set("1", **setting_args("c"))
+        # Everything but the latest change is pruned before this process syncs
+        await other.prune_changes(-1)
+        await other.close()
+
+        reloads = []
+        update_settings_cache = bot.update_settings_cache
+        async def counting_update_settings_cache():
+            reloads.append(True)
+            await update_settings_cache()
+        monkeypatch.setattr(bot, "update_settings_cache", counting_update_settings_cache)
+        await bot.sync_changes()
+        return len(reloads), sorted(setting["title"] for setting in bot.settings_cache["1"].values()), bot.cache_version
+
+    reloads, titles, version = asyncio.run(scenario())
+    assert reloads == 1
+    assert titles == ["a", "b", "c"]
+    assert version == 3
@@ -0,0 +1,65 @@
+"""Concurrent dispatch of due notifications"""
+import asyncio
+
+import discord
+
+from src.dispatcher import NotificationDispatcher, outbox_retry_delay
+
+def notification(id, channel_id):
+    return ("1", {"id": id, "channel_id": channel_id})
+
+class FakeSender:
+    """Async sender that records the order of sends and the peak number of sends in progress"""
+    def __init__(self, delays=None, failing=()):
+        self.delays = delays or {}
+        self.failing = failing
+        self.sent = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, guild_id, setting):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delays.get(setting["id"], 0.01))
+            if setting["id"] in self.failing:
+                raise RuntimeError("send failed")
+            self.sent.append(setting["id"])
+        finally:
+            self.active -= 1
+
+def test_channel_order_is_kept():
+    # The first message in channel "a" is the slowest; the later ones must still wait for it
+    sender = FakeSender(delays={1: 0.05, 2: 0.0, 3: 0.0})
+    notifications = [notification(1, "a"), notification(4, "b"), notification(2, "a"), notification(3, "a")]
+    asyncio.run(NotificationDispatcher(concurrency=4).dispatch(notifications, sender))
+    assert [id for id in sender.sent if id != 4] == [1, 2, 3]
+    # Other channels are not held up by it
+    assert sender.sent.index(4) < sender.sent.index(1)
+
+def test_concurrency_is_capped():
+    sender = FakeSender()
+    notifications = [notification(id, f"channel-{id}") for id in range(20)]
+    asyncio.run(NotificationDispatcher(concurrency=3).dispatch(notifications, sender))
+    assert sorted(sender.sent) == list(range(20))
+    assert sender.peak == 3
+
+def test_failed_send_does_not_stop_its_channel():
+    sender = FakeSender(failing={1})
+    notifications = [notification(1, "a"), notification(2, "a"), notification(3, "b")]
+    asyncio.run(NotificationDispatcher().dispatch(notifications, sender))
+    assert sorted(sender.sent) == [2, 3]
+
+def test_rate_limited_send_waits_for_retry_after():
+    delays = {}
+
+    async def send(guild_id, setting, attempts):
+        try:
+            raise discord.RateLimited(45.0)
+        except Exception as e:
+            delays[setting["id"]] = outbox_retry_delay(e, attempts, 5, 10, 300)
+
+    notifications = [("1", {"id": attempts, "channel_id": "a"}, attempts) for attempts in (1, 4, 5)]
+    asyncio.run(NotificationDispatcher().dispatch(notifications, send))
+    # Never sooner than Retry-After, a longer backoff is kept, and the last attempt gives up
+    assert delays == {1: 45.0, 4: 80.0, 5: None}
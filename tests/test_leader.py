@@ -0,0 +1,101 @@
+"""Lease takeover and fencing of a stale leader"""
+import asyncio
+
+from src.leader import LeaderElector
+from src.sqlalchemy_models import AsyncSQLAlchemyDatabase, SQLAlchemyDatabase
+
+SETTING = {"channel_id": "1", "option": "oneday", "day": "03/01", "week": "None", "call_time": "09:00:00",
+           "mention_ids": "None", "title": "t", "main_text": "m", "img": "None"}
+
+def test_standby_takes_over_expired_lease(clock):
+    db = SQLAlchemyDatabase("Lease")
+    first = db.acquire_lease("scheduler", "a", ttl=10)
+    assert first["acquired"] and first["token"] == 1
+
+    # While the lease is valid, only the holder can renew it
+    clock.advance(5)
+    assert db.acquire_lease("scheduler", "b", ttl=10) is None
+    renewed = db.acquire_lease("scheduler", "a", ttl=10, checked_until=123.0)
+    assert not renewed["acquired"] and renewed["token"] == 1
+
+    clock.advance(11)
+    taken = db.acquire_lease("scheduler", "b", ttl=10)
+    assert taken["acquired"] and taken["holder"] == "b"
+    assert taken["token"] == 2
+    # The new leader resumes after the time recorded by the previous one
+    assert taken["checked_until"] == 123.0
+
+def test_stale_token_is_rejected(clock):
+    db = SQLAlchemyDatabase("Fence")
+    db.set_many("1", [SETTING])
+    setting = db.get_all("1")[0]
+    stale = db.acquire_lease("scheduler", "a", ttl=10)
+    clock.advance(11)
+    current = db.acquire_lease("scheduler", "b", ttl=10)
+
+    # The old leader's enqueue is refused and writes nothing, not even the one-time reminder's deletion
+    notifications = [("1", setting, 100.0)]
+    assert db.enqueue_notifications("scheduler", notifications, [("1", setting["id"])], stale, 200.0) is None
+    assert db.get_due_outbox("scheduler", 1000.0, 10) == []
+    assert db.get("1", setting["id"]) is not None
+
+    entries = db.enqueue_notifications("scheduler", notifications, [("1", setting["id"])], current, 200.0)
+    assert [entry["setting_id"] for entry in entries] == [setting["id"]]
+    assert db.get("1", setting["id"]) is None
+    assert db.acquire_lease("scheduler", "b", ttl=10)["checked_until"] == 200.0
+
+def test_elector_steps_down_after_takeover(clock):
+    async def run():
+        db = AsyncSQLAlchemyDatabase("Elector")
+        leader = LeaderElector(db, "scheduler", "a", ttl=10, renew_interval=3)
+        standby = LeaderElector(db, "scheduler", "b", ttl=10, renew_interval=3)
+
+        assert await leader.heartbeat()
+        assert not await standby.heartbeat()
+        assert leader.is_leader and not standby.is_leader
+
+        # The leader stops renewing: it gives up locally before the lease expires in the database
+        clock.advance(8)
+        assert not leader.is_leader
+        clock.advance(3)
+        assert await standby.heartbeat()
+        assert standby.is_leader and standby.token == leader.token + 1
+
+        # The old leader comes back and finds the lease taken
+        assert not await leader.heartbeat(checked_until=0.0)
+        assert not leader.is_leader and leader.lease is None
+        await db.close()
+
+    asyncio.run(run())
+
+def test_time_loop_pauses_during_take_over(bot, clock, monkeypatch):
+    async def run():
+        elector = LeaderElector(bot.db, bot.lease_name, "a", ttl=10, renew_interval=3)
+        assert await elector.heartbeat()
+        monkeypatch.setattr(bot, "elector", elector)
+        monkeypatch.setattr(bot, "prepared_token", elector.token)
+        monkeypatch.setattr(bot, "cache_loaded", True)
+        assert bot.is_active_leader()
+
+        popped = []
+        monkeypatch.setattr(bot.scheduler, "pop_due", lambda now, since=None: popped.append(now) or [])
+        syncing, release = asyncio.Event(), asyncio.Event()
+        async def sync_changes():
+            syncing.set()
+            await release.wait()
+        monkeypatch.setattr(bot, "sync_changes", sync_changes)
+
+        # The renewal hands back the token this instance already holds; the handover still runs in full
+        handover = asyncio.create_task(bot.take_over(elector.lease))
+        await syncing.wait()
+        paused = not bot.is_active_leader()
+        await bot.time_loop.coro()
+        popped_during_handover = list(popped)
+
+        release.set()
+        await handover
+        return paused, popped_during_handover, bot.is_active_leader()
+
+    paused, popped_during_handover, resumed = asyncio.run(run())
+    assert paused and popped_during_handover == []
+    assert resumed
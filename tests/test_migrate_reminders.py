@@ -0,0 +1,73 @@
+"""Migration of per-guild setting_time_<guild_id> tables"""
+import asyncio
+import os
+import sqlite3
+
+from src.migrate_reminders import migrate
+from src.sqlalchemy_models import SQLAlchemyDatabase
+
+LEGACY_SCHEMA = """CREATE TABLE "setting_time_{guild_id}" (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, channel_id VARCHAR(20) NOT NULL, option VARCHAR(10) NOT NULL,
+    day VARCHAR(10) NOT NULL, week VARCHAR(10) NOT NULL, call_time VARCHAR(10) NOT NULL,
+    mention_ids TEXT NOT NULL, title TEXT NOT NULL, img TEXT NOT NULL, main_text TEXT NOT NULL)"""
+
+def create_legacy_database(path, guilds):
+    """Write a database in the format used before the reminders table, with the given titles per guild"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with sqlite3.connect(path) as conn:
+        for guild_id, titles in guilds.items():
+            conn.execute(LEGACY_SCHEMA.format(guild_id=guild_id))
+            conn.executemany(
+                f'INSERT INTO "setting_time_{guild_id}" (channel_id, option, day, week, call_time, mention_ids, '
+                "title, img, main_text) VALUES ('10', 'day', 'None', 'None', '09:00:00', 'None', ?, 'None', 'm')",
+                [(title,) for title in titles])
+    conn.close()
+
+def table_names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+def test_migrate_moves_rows_and_renames_tables():
+    create_legacy_database("db/Legacy-server-file.db", {"111": ["a", "b"], "222": ["c"]})
+    db = SQLAlchemyDatabase("Legacy")
+    assert db.get_legacy_tables() == {"setting_time_111": "111", "setting_time_222": "222"}
+
+    assert migrate(db) == {"111": 2, "222": 1}
+    assert [setting["title"] for setting in db.get_all("111")] == ["a", "b"]
+    assert [setting["title"] for setting in db.get_all("222")] == ["c"]
+    # Ids are renumbered across the single table
+    assert sorted(setting["id"] for guild_id in ("111", "222") for setting in db.get_all(guild_id)) == [1, 2, 3]
+    assert {"migrated_setting_time_111", "migrated_setting_time_222"} <= table_names(db.db_path)
+    assert db.get_legacy_tables() == {}
+
+    # Running it again copies nothing
+    assert migrate(db) == {}
+    assert len(db.get_all("111")) == 2
+
+def test_migrate_can_drop_legacy_tables():
+    create_legacy_database("db/Drop-server-file.db", {"111": ["a"]})
+    db = SQLAlchemyDatabase("Drop")
+    assert migrate(db, drop_legacy=True) == {"111": 1}
+    assert not any("setting_time_" in name for name in table_names(db.db_path))
+
+def test_bot_refuses_to_start_with_unmigrated_tables(bot, monkeypatch, caplog):
+    closed = []
+    async def close():
+        closed.append(True)
+    monkeypatch.setattr(bot.client, "close", close)
+    started = []
+    monkeypatch.setattr(bot, "start_loops", lambda: started.append(True))
+    monkeypatch.setattr(bot, "WEB_SERVER_MODE", "flask")
+
+    create_legacy_database(bot.db.db_path, {"111": ["a"]})
+    asyncio.run(bot.setup_hook())
+    assert closed and not started
+    assert "setting_time_111" in caplog.text
+
+    migrate(SQLAlchemyDatabase("Bot"))
+    closed.clear()
+    asyncio.run(bot.setup_hook())
+    assert not closed and started
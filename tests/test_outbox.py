@@ -0,0 +1,155 @@
+"""Notification outbox: deduplication, completion and retry backoff"""
+import asyncio
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import discord
+from pytz import timezone
+import pytest
+
+from src.dispatcher import outbox_retry_delay
+from src.sqlalchemy_models import SQLAlchemyDatabase
+
+SETTING = {"id": 1, "channel_id": "10", "option": "day", "day": "None", "week": "None", "call_time": "09:00:00",
+           "mention_ids": "None", "title": "t", "main_text": "m", "img": "None"}
+
+ONETIME = {"channel_id": "10", "option": "oneday", "day": "03/01", "week": "None", "call_time": "09:00:00",
+           "mention_ids": "None", "title": "t", "main_text": "m", "img": "None"}
+
+def http_error(error_class, status, headers=None):
+    response = SimpleNamespace(status=status, reason="", headers=headers or {})
+    return error_class(response, "error")
+
+def test_reenqueue_of_same_occurrence_is_noop():
+    db = SQLAlchemyDatabase("Outbox")
+    first = db.enqueue_notifications("scheduler", [("1", SETTING, 100.0), ("1", SETTING, 160.0)])
+    assert [entry["fire_at"] for entry in first] == [100.0, 160.0]
+
+    # A restarted or catching-up loop enqueues the same send time again: only the new one is returned
+    again = db.enqueue_notifications("scheduler", [("1", SETTING, 100.0), ("1", SETTING, 220.0)])
+    assert [entry["fire_at"] for entry in again] == [220.0]
+    assert len(db.get_due_outbox("scheduler", 1000.0, 10)) == 3
+
+def test_complete_outbox_records_results():
+    db = SQLAlchemyDatabase("Complete")
+    delivered, retried, failed = db.enqueue_notifications(
+        "scheduler", [("1", SETTING, 100.0), ("1", SETTING, 160.0), ("1", SETTING, 220.0)])
+    db.complete_outbox(delivered=[delivered["id"]], retries=[(retried["id"], 500.0, "429")],
+                       failures=[(failed["id"], "403")])
+
+    assert db.get_due_outbox("scheduler", 499.0, 10) == []
+    [due] = db.get_due_outbox("scheduler", 500.0, 10)
+    assert due["id"] == retried["id"] and due["attempts"] == 1 and due["setting"] == SETTING
+
+    # Results for entries that are no longer pending are ignored
+    db.complete_outbox(delivered=[delivered["id"], failed["id"]], retries=[(retried["id"], 900.0, "again")])
+    [due] = db.get_due_outbox("scheduler", 900.0, 10)
+    assert due["attempts"] == 2
+
+def test_retry_delay_backs_off_exponentially():
+    error = RuntimeError("temporary")
+    assert [outbox_retry_delay(error, attempts, 10, 2, 60) for attempts in range(1, 8)] == [2, 4, 8, 16, 32, 60, 60]
+
+@pytest.mark.parametrize("error", [
+    http_error(discord.HTTPException, 429, {"Retry-After": "30"}),
+    discord.RateLimited(30.0),
+])
+def test_retry_delay_waits_for_retry_after(error):
+    assert outbox_retry_delay(error, 1, 5, 2, 300) == 30.0
+    # A longer backoff is kept
+    assert outbox_retry_delay(error, 4, 5, 10, 300) == 80.0
+
+def test_retry_delay_ignores_unparsable_retry_after():
+    assert outbox_retry_delay(http_error(discord.HTTPException, 429, {"Retry-After": "soon"}), 1, 5, 2, 300) == 2.0
+
+def test_retry_delay_gives_up():
+    error = RuntimeError("temporary")
+    assert outbox_retry_delay(error, 4, 5, 2, 300) == 16.0
+    assert outbox_retry_delay(error, 5, 5, 2, 300) is None
+    # Missing permissions or a deleted channel will not succeed on retry
+    assert outbox_retry_delay(http_error(discord.Forbidden, 403), 1, 5, 2, 300) is None
+    assert outbox_retry_delay(http_error(discord.NotFound, 404), 1, 5, 2, 300) is None
+
+class DueScheduler:
+    """Scheduler that returns the given notifications from the next pop_due"""
+    def __init__(self, due):
+        self.due = due
+
+    def pop_due(self, now, since=None):
+        due, self.due = self.due, []
+        return due
+
+def record_sends(bot, monkeypatch, failing=()):
+    """Replace send_notification with one that records the settings it sends"""
+    sent = []
+    async def send_notification(guild_id, setting):
+        sent.append(setting["id"])
+        if setting["id"] in failing:
+            raise RuntimeError("send failed")
+    monkeypatch.setattr(bot, "send_notification", send_notification)
+    return sent
+
+def test_fallback_send_retires_onetime_reminder(bot, monkeypatch):
+    async def scenario():
+        await bot.db.set("1", **ONETIME)
+        setting = (await bot.db.get_all("1"))[0]
+
+        async def enqueue_notifications(*args, **kwargs):
+            raise RuntimeError("database is locked")
+        monkeypatch.setattr(bot.db, "enqueue_notifications", enqueue_notifications)
+        now = datetime.now(timezone("Asia/Tokyo")).replace(microsecond=0)
+        monkeypatch.setattr(bot, "scheduler", DueScheduler([("1", setting, now)]))
+        monkeypatch.setattr(bot, "cache_loaded", True)
+        monkeypatch.setattr(bot, "last_cache_update", now)
+        monkeypatch.setattr(bot, "last_change_sync", time.monotonic())
+        sent = record_sends(bot, monkeypatch)
+
+        await bot.time_loop.coro()
+        return setting, sent, await bot.db.get("1", setting["id"])
+
+    setting, sent, remaining = asyncio.run(scenario())
+    # Sent once without the outbox, and deleted so a reload cannot schedule it again next year
+    assert sent == [setting["id"]]
+    assert remaining is None
+
+def test_complete_outbox_is_retried_before_release(bot, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(bot, "OUTBOX_RECORD_RETRY_DELAY", 0)
+        complete_outbox = bot.db.complete_outbox
+        calls = []
+        async def flaky_complete_outbox(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            await complete_outbox(*args)
+        monkeypatch.setattr(bot.db, "complete_outbox", flaky_complete_outbox)
+        sent = record_sends(bot, monkeypatch)
+
+        entries = await bot.db.enqueue_notifications(bot.lease_name, [("1", {**SETTING, "id": 1}, 100.0)])
+        await bot.deliver_outbox(bot.claim_outbox(entries))
+        await bot.outbox_loop.coro()
+        return sent, len(calls), await bot.db.get_due_outbox(bot.lease_name, time.time(), 10)
+
+    sent, calls, due = asyncio.run(scenario())
+    assert calls == 2
+    assert sent == [1] and due == [] and not bot.outbox_in_flight
+
+def test_unrecorded_deliveries_are_not_resent(bot, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(bot, "OUTBOX_RECORD_RETRY_DELAY", 0)
+        async def complete_outbox(*args):
+            raise RuntimeError("database is locked")
+        monkeypatch.setattr(bot.db, "complete_outbox", complete_outbox)
+        sent = record_sends(bot, monkeypatch, failing={2})
+
+        entries = await bot.db.enqueue_notifications(
+            bot.lease_name, [("1", {**SETTING, "id": 1}, 100.0), ("1", {**SETTING, "id": 2}, 100.0)])
+        await bot.deliver_outbox(bot.claim_outbox(entries))
+        await bot.outbox_loop.coro()
+        return sent
+
+    # The delivered notification stays in flight while it is still pending in the database;
+    # only the one that failed to send is sent again
+    assert sorted(asyncio.run(scenario())) == [1, 2, 2]
+    assert len(bot.outbox_in_flight) == 1
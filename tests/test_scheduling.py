@@ -0,0 +1,110 @@
+"""Compare the schedulers and ScheduleRule with a brute-force check of every candidate time"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import timezone
+
+from src.scheduler import create_scheduler
+from src.utilities import WEEKDAYS, compile_setting, should_send_notification
+
+TZ = timezone('Asia/Tokyo')
+
+# 2024-02-20 to 2024-03-27 covers a leap day, a month boundary and every nth weekday
+START = TZ.localize(datetime(2024, 2, 20, 0, 0, 0))
+DAYS = 36
+
+def make_settings():
+    """Settings of every kind, with call times on the edges of the day and with non-zero seconds"""
+    times = ["00:00:00", "09:30:15", "23:59:59", "12:00:30"]
+    settings = []
+
+    def add(option, day, week, call_time):
+        settings.append({"id": len(settings) + 1, "channel_id": "1", "option": option, "day": day, "week": week,
+                         "call_time": call_time, "mention_ids": "None", "title": "t", "main_text": "m", "img": "None"})
+
+    for call_time in times:
+        add("day", "None", "None", call_time)
+    for index, week in enumerate(WEEKDAYS):
+        add("week", "None", week, times[index % len(times)])
+    for day in (1, 15, 29, 30, 31):
+        add("month", str(day), "None", times[day % len(times)])
+    for nth in range(1, 6):
+        for index, week in enumerate(WEEKDAYS):
+            add("month", str(nth), week, times[(nth + index) % len(times)])
+    for day in ("02/29", "03/01", "03/10", "12/31"):
+        add("oneday", day, "None", "07:45:05")
+    return settings
+
+def brute_force_fires(settings, start, days):
+    """Every (setting id, send time) in the window, checking each day with should_send_notification"""
+    fires = set()
+    for setting in settings:
+        hour, minute, second = (int(part) for part in setting["call_time"].split(":"))
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            candidate = day.replace(hour=hour, minute=minute, second=second)
+            if should_send_notification(setting, candidate):
+                fires.add((setting["id"], candidate))
+    return fires
+
+def brute_force_next(setting, after, horizon_days=800):
+    """First send time at or after the given time, found by checking each day"""
+    hour, minute, second = (int(part) for part in setting["call_time"].split(":"))
+    for offset in range(horizon_days):
+        candidate = (after + timedelta(days=offset)).replace(hour=hour, minute=minute, second=second, microsecond=0)
+        if candidate >= after and should_send_notification(setting, candidate):
+            return candidate
+    return None
+
+@pytest.mark.parametrize("backend", ["heap", "numpy"])
+def test_pop_due_matches_brute_force(backend):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    settings = make_settings()
+    scheduler = create_scheduler(backend)
+    scheduler.rebuild({"1": settings}, START)
+
+    fired = []
+    since = START
+    end = START + timedelta(days=DAYS)
+    while since < end:
+        now = since + timedelta(minutes=59, seconds=59)
+        due = scheduler.pop_due(now, since)
+        fire_times = [fire_time for _, _, fire_time in due]
+        assert fire_times == sorted(fire_times)
+        assert all(since <= fire_time <= now for fire_time in fire_times)
+        fired.extend((int(setting["id"]), fire_time) for _, setting, fire_time in due)
+        since = now + timedelta(seconds=1)
+
+    assert len(fired) == len(set(fired))
+    assert set(fired) == brute_force_fires(settings, START, DAYS)
+
+@pytest.mark.parametrize("backend", ["heap", "numpy"])
+def test_pop_due_skips_times_before_since(backend):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    setting = make_settings()[1]  # day at 09:30:15
+    scheduler = create_scheduler(backend)
+    scheduler.rebuild({"1": [setting]}, START)
+
+    # A stalled loop resumes after the send time: the missed occurrence is not sent
+    resume = START.replace(hour=9, minute=31)
+    assert scheduler.pop_due(resume + timedelta(seconds=30), resume) == []
+    # The next day's occurrence is still scheduled
+    next_day = START + timedelta(days=1)
+    due = scheduler.pop_due(next_day.replace(hour=9, minute=30, second=15), next_day.replace(hour=9, minute=30))
+    assert [(guild_id, fire_time) for guild_id, _, fire_time in due] == [("1", next_day.replace(hour=9, minute=30, second=15))]
+
+def test_next_fire_time_matches_brute_force():
+    rng = random.Random(0)
+    settings = make_settings()
+    afters = [START + timedelta(seconds=rng.randrange(DAYS * 86400)) for _ in range(40)]
+    # Exactly on, and one second after, a send time
+    afters += [START.replace(hour=9, minute=30, second=15), START.replace(hour=9, minute=30, second=16)]
+    for setting in settings:
+        rule = compile_setting(setting)
+        for after in afters:
+            # 02/29 cannot be parsed without a year, so that one-time reminder never fires in either check
+            actual = rule.next_fire_time(after) if rule is not None else None
+            assert actual == brute_force_next(setting, after), (setting, after)
@@ -0,0 +1,69 @@
+"""Validation of imported reminders"""
+import json
+
+import pytest
+
+from src.utilities import DEFAULT_TITLE, load_settings_file, validate_setting
+
+def row(**fields):
+    return {"channel_id": "10", "option": "day", "call_time": "09:00:00", **fields}
+
+def test_validate_setting_normalizes_fields():
+    setting = validate_setting(row(option="month", day="05", week="", title="  "))
+    assert setting["day"] == "5" and setting["week"] == "None"
+    assert setting["title"] == DEFAULT_TITLE
+    assert validate_setting({"option": "day", "call_time": "9:5:0"}, default_channel_id="20")["channel_id"] == "20"
+
+@pytest.mark.parametrize("fields, message", [
+    ({"channel_id": "abc"}, "channel_id"),
+    ({"channel_id": None}, "channel_id"),
+    ({"call_time": "25:00:00"}, "call_time"),
+    ({"call_time": "09:00"}, "call_time"),
+    ({"option": "year"}, "option"),
+    ({"option": "week", "week": "Funday"}, "week"),
+    ({"option": "month", "day": "32"}, "day は 1 から 31"),
+    ({"option": "month", "day": "6", "week": "monday"}, "day は 1 から 5"),
+    ({"option": "oneday", "day": "2024-03-01"}, "mm/dd"),
+    ({"option": "oneday", "day": "13/01"}, "mm/dd"),
+    ({"option": "oneday", "day": "02/30"}, "日付"),
+    ({"mention_ids": "@everyone"}, "mention_ids"),
+])
+def test_validate_setting_rejects_invalid_fields(fields, message):
+    with pytest.raises(ValueError, match=message):
+        validate_setting(row(**fields))
+
+def test_load_csv_reports_every_invalid_row():
+    data = ("option,call_time,channel_id,week\n"
+            "day,09:00:00,10,\n"
+            "week,09:00:00,10,Funday\n"
+            "day,bad,10,\n").encode("utf-8-sig")
+    settings, errors = load_settings_file(data, "reminders.csv")
+    assert len(settings) == 1
+    assert [error.split(":")[0] for error in errors] == ["3行目", "4行目"]
+
+def test_load_json_reports_item_numbers():
+    data = json.dumps([row(), "not an object", row(option="year")]).encode()
+    settings, errors = load_settings_file(data, "reminders.json")
+    assert len(settings) == 1
+    assert errors[0].startswith("2件目") and errors[1].startswith("3件目")
+
+@pytest.mark.parametrize("data, filename, message", [
+    (b"\xff\xfe", "reminders.csv", "UTF-8"),
+    (b"[{", "reminders.json", "JSON"),
+    (b'{"option": "day"}', "reminders.json", "配列"),
+    (b"title,main_text\nx,y\n", "reminders.csv", "option, call_time"),
+])
+def test_load_rejects_malformed_files(data, filename, message):
+    settings, errors = load_settings_file(data, filename)
+    assert settings == []
+    assert len(errors) == 1 and message in errors[0]
+
+def test_load_stops_at_max_rows():
+    data = json.dumps([row()] * 5).encode()
+    settings, errors = load_settings_file(data, "reminders.json", max_rows=3)
+    assert len(settings) == 3
+    assert errors == ["一度に取り込める通知は 3 件までです"]
+
+def test_load_detects_json_without_extension():
+    settings, errors = load_settings_file(json.dumps([row()]).encode(), "upload")
+    assert len(settings) == 1 and errors == []
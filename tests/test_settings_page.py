@@ -0,0 +1,35 @@
+"""/get-settings pages within Discord's embed limits"""
+import asyncio
+
+from src.utilities import EMBED_MAX_FIELDS, create_embed_with_fields
+
+def setting_args(number):
+    return {"channel_id": "10", "option": "day", "day": "None", "week": "None", "call_time": "09:00:00",
+            "mention_ids": "None", "title": f"title {number}", "main_text": "m", "img": "None"}
+
+def test_full_page_fits_embed_field_limit(bot):
+    async def scenario():
+        for number in range(bot.SETTINGS_PAGE_SIZE + 5):
+            await bot.db.set("1", **setting_args(number))
+        view = bot.SettingsPageView("1", 42, await bot.db.count(guild_id="1"))
+        assert await view.load_next()
+        first = view.embeds()
+        await view.load_next(after_id=view.settings[-1]["id"])
+        view.page += 1
+        second = view.embeds()
+        view.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    for embeds in (first, second):
+        assert all(len(embed.fields) <= EMBED_MAX_FIELDS for embed in embeds)
+    # Every setting on the page is shown, with its fields kept in one embed
+    titles = [field.value for embed in first for field in embed.fields if field.name == "title"]
+    assert titles == [f"title {number}" for number in range(bot.SETTINGS_PAGE_SIZE)]
+    assert all(len(embed.fields) % 3 == 0 for embed in first)
+
+def test_embeds_split_at_field_limit():
+    fields = [{"id": str(number), "title": "t", "time": "09:00"} for number in range(20)]
+    embeds = create_embed_with_fields(0x0000ff, "settings", fields)
+    assert [len(embed.fields) for embed in embeds] == [24, 24, 12]
+    assert embeds[1].title == "settings(2)"
@@ -0,0 +1,87 @@
+"""Schedule snapshots and warm start"""
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+from pytz import timezone
+
+from src.schedule_snapshot import SNAPSHOT_FORMAT, load_snapshot, save_snapshot
+from src.scheduler import NotificationScheduler
+from src.utilities import compile_setting
+
+TOKYO = timezone("Asia/Tokyo")
+
+def make_setting(id, call_time="09:00:00"):
+    return {"id": id, "channel_id": "10", "option": "day", "day": "None", "week": "None", "call_time": call_time,
+            "mention_ids": "None", "title": "t", "main_text": "m", "img": "None"}
+
+SETTINGS = {"1": [make_setting(1), make_setting(2, "12:30:00")], "2": [make_setting(3)]}
+
+def test_round_trip():
+    fire_times = {("1", 1): 1000.0, ("2", 3): 2000.0}
+    save_snapshot("snap.json.gz", "scheduler", SETTINGS, 7, 500.0, fire_times, 400.0)
+    snapshot = load_snapshot("snap.json.gz", "scheduler")
+    assert snapshot["settings"] == SETTINGS
+    # Settings without a fire time are recompiled on load
+    assert snapshot["fire_times"] == fire_times
+    assert (snapshot["change_version"], snapshot["checked_until"], snapshot["scheduled_from"]) == (7, 500.0, 400.0)
+
+def test_unusable_snapshots_are_rejected():
+    assert load_snapshot("missing.json.gz", "scheduler") is None
+
+    with open("corrupt.json.gz", "wb") as f:
+        f.write(b"not gzip")
+    assert load_snapshot("corrupt.json.gz", "scheduler") is None
+
+    save_snapshot("snap.json.gz", "scheduler", SETTINGS, 7)
+    # Saved by a process that owned other shards
+    assert load_snapshot("snap.json.gz", "scheduler:4:0,1") is None
+
+    with gzip.open("snap.json.gz", "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    data["format"] = SNAPSHOT_FORMAT - 1
+    with gzip.open("old.json.gz", "wt", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert load_snapshot("old.json.gz", "scheduler") is None
+
+def test_rebuild_reuses_only_fire_times_at_or_after_start():
+    after = TOKYO.localize(datetime(2024, 3, 1, 10, 0, 0))
+    saved = after + timedelta(days=2, seconds=7)  # Not what the rule computes, so reuse is visible
+    stale = after - timedelta(seconds=1)
+    scheduler = NotificationScheduler()
+    scheduler.rebuild(SETTINGS, after, {("1", 1): saved.timestamp(), ("1", 2): stale.timestamp(),
+                                        ("2", 3): after.timestamp()})
+
+    fire_times = scheduler.fire_times()
+    assert fire_times[("1", 1)] == saved.timestamp()
+    assert fire_times[("2", 3)] == after.timestamp()
+    # A fire time before the restart point is recomputed from the rule
+    assert fire_times[("1", 2)] == compile_setting(make_setting(2, "12:30:00")).next_fire_time(after).timestamp()
+
+    # A reused entry is compiled when it fires and then scheduled for its next occurrence
+    assert [setting["id"] for _, setting, _ in scheduler.pop_due(saved, after)] == [3, 2, 1]
+    assert scheduler.fire_times()[("1", 1)] == TOKYO.localize(datetime(2024, 3, 4, 9, 0, 0)).timestamp()
+
+def warm_start_fire_time(bot, monkeypatch, scheduled_after_checked):
+    """Warm start from a snapshot saved just now, returning the restored fire time of setting 1"""
+    checked_until = float(int(time.time()) - 5)
+    fire_at = checked_until + 3 * 86400 + 7
+    save_snapshot("snap.json.gz", bot.lease_name, {"1": [make_setting(1)]}, 3, checked_until,
+                  {("1", 1): fire_at}, checked_until + scheduled_after_checked)
+    monkeypatch.setattr(bot, "SNAPSHOT_PATH", "snap.json.gz")
+    assert bot.warm_start()
+    assert bot.cache_loaded and bot.cache_version == 3
+    assert bot.settings_cache == {"1": {1: make_setting(1)}}
+    assert bot.last_checked_second.timestamp() == checked_until
+    return fire_at, bot.scheduler.fire_times()[("1", 1)]
+
+def test_warm_start_reuses_fire_times(bot, monkeypatch):
+    fire_at, restored = warm_start_fire_time(bot, monkeypatch, 0)
+    assert restored == fire_at
+
+def test_warm_start_recompiles_fire_times_computed_later(bot, monkeypatch):
+    # The fire times were computed from a later point than the one the loop resumes from
+    fire_at, restored = warm_start_fire_time(bot, monkeypatch, 60)
+    assert restored != fire_at
+    assert restored == compile_setting(make_setting(1)).next_fire_time(bot.next_unchecked_second()).timestamp()
@@ -0,0 +1,44 @@
+"""Group commit of concurrent async writes"""
+import asyncio
+
+import pytest
+
+from src.sqlalchemy_models import AsyncSQLAlchemyDatabase
+
+def setting_args(title):
+    return {"channel_id": "10", "option": "day", "day": "None", "week": "None", "call_time": "09:00:00",
+            "mention_ids": "None", "title": title, "main_text": "m", "img": "None"}
+
+def test_failing_write_does_not_fail_its_batch(monkeypatch, caplog):
+    async def scenario():
+        # A long delay puts every write below into the same batch
+        db = AsyncSQLAlchemyDatabase("Batching", write_delay=0.05)
+        for title in ("a", "b", "c"):
+            await db.set("1", **setting_args(title))
+        ids = [setting["id"] for setting in await db.get_all("1")]
+
+        events = []
+        db.add_listener(lambda event, guild_id, setting: events.append((event, setting["id"])))
+
+        update_operation = db._update_operation
+        def failing_update_operation(guild_id, id, values):
+            # The update statement runs before the failure, so it has to be rolled back
+            yield from update_operation(guild_id, id, values)
+            if id == ids[1]:
+                raise RuntimeError("write failed")
+        monkeypatch.setattr(db, "_update_operation", failing_update_operation)
+
+        results = await asyncio.gather(
+            *(db.update_setting_time("1", id, title=f"new-{id}") for id in ids), return_exceptions=True)
+        titles = {setting["id"]: setting["title"] for setting in await db.get_all("1")}
+        await db.close()
+        return ids, results, titles, events
+
+    ids, results, titles, events = asyncio.run(scenario())
+    assert "3 件の書き込みをまとめたコミットに失敗した" in caplog.text
+    assert results[0] is None and results[2] is None
+    with pytest.raises(RuntimeError, match="write failed"):
+        raise results[1]
+    assert titles == {ids[0]: f"new-{ids[0]}", ids[1]: "b", ids[2]: f"new-{ids[2]}"}
+    # Only committed writes are published to listeners
+    assert sorted(events) == [("update", ids[0]), ("update", ids[2])]